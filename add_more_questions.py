@@ -5,6 +5,7 @@ Add more sample questions to database for testing
 
 from app import app
 from models import db, Question
+from question_bank import QUESTION_FIELDS, save_questions
 
 def add_sample_questions():
     """Add more sample questions"""
@@ -114,13 +115,11 @@ def add_sample_questions():
                 stream='JEE'
             ))
         
-        # Add all questions
-        for q in questions:
-            db.session.add(q)
+        # Add all questions, skipping ones already in the bank
+        before = Question.query.count()
+        save_questions([{field: getattr(q, field) for field in QUESTION_FIELDS} for q in questions])
         
-        db.session.commit()
-        
-        print(f"✅ Added {len(questions)} sample questions")
+        print(f"✅ Added {Question.query.count() - before} sample questions")
         print(f"📊 Total questions in database: {Question.query.count()}")
         
         # Show breakdown
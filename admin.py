@@ -6,6 +6,7 @@ Run this script to add questions and resources to the database
 
 from app import app
 from models import db, Question, Resource
+from question_bank import QUESTION_FIELDS, compact_question_bank, save_questions
 import json
 
 def add_question():
@@ -119,14 +120,11 @@ def bulk_add_questions():
         with open(file_path, 'r') as f:
             questions_data = json.load(f)
         
-        added_count = 0
-        for q_data in questions_data:
-            question = Question(**q_data)
-            db.session.add(question)
-            added_count += 1
-        
-        db.session.commit()
-        print(f"Successfully added {added_count} questions!")
+        # Duplicates and near-duplicates of questions in the bank are skipped
+        before = Question.query.count()
+        save_questions([{field: q_data.get(field) for field in QUESTION_FIELDS} for q_data in questions_data])
+        added_count = Question.query.count() - before
+        print(f"Successfully added {added_count} questions! ({len(questions_data) - added_count} duplicates skipped)")
         
     except FileNotFoundError:
         print("File not found.")
@@ -220,6 +218,25 @@ def create_sample_json():
     print("Sample JSON file 'sample_questions.json' created!")
     print("You can modify this file and use it for bulk import.")
 
+def remove_duplicate_questions():
+    """Find near-duplicate questions and delete them after confirmation"""
+    print("\n=== Remove Near-Duplicate Questions ===")
+    
+    duplicates = compact_question_bank()
+    if not duplicates:
+        print("No near-duplicate questions found.")
+        return
+    
+    for duplicate_id, kept_id in list(duplicates.items())[:10]:
+        duplicate, kept = db.session.get(Question, duplicate_id), db.session.get(Question, kept_id)
+        print(f"ID {duplicate_id}: {duplicate.question_text[:60]}...")
+        print(f"  duplicates ID {kept_id}: {kept.question_text[:60]}...")
+    
+    confirm = input(f"\nDelete {len(duplicates)} near-duplicate questions? (y/n): ").lower()
+    if confirm == 'y':
+        compact_question_bank(apply=True)
+        print(f"Removed {len(duplicates)} questions.")
+
 def main():
     """Main admin interface"""
     with app.app_context():
@@ -233,6 +250,7 @@ def main():
             print("4. View Statistics")
             print("5. List Recent Questions")
             print("6. Create Sample JSON")
+            print("7. Remove Near-Duplicate Questions")
             print("0. Exit")
             
             choice = input("\nEnter your choice: ")
@@ -249,6 +267,8 @@ def main():
                 list_questions()
             elif choice == '6':
                 create_sample_json()
+            elif choice == '7':
+                remove_duplicate_questions()
             elif choice == '0':
                 print("Goodbye!")
                 break
@@ -1,15 +1,41 @@
 import random
 import os
-from models import Question, User, TestAttempt
+import threading
+from flask import has_request_context
+from models import db, Question, User, TestAttempt
+from question_pool import question_pool, load_sampled
+from paper_assembly import assemble_paper, build_blueprint, split_by_difficulty
+from question_bank import save_generated_questions
+from question_inventory import question_inventory
+from generation_flights import generation_flights
 from collections import defaultdict
+from functools import partial
 
-# Try to import AI question generator
-try:
-    from ai_question_generator import AIQuestionGenerator
-    AI_GENERATOR_AVAILABLE = True
-except ImportError:
-    AI_GENERATOR_AVAILABLE = False
-    print("AI Question Generator not available. Using database questions only.")
+# The AI question generator (openai, httpx, pdfplumber) is imported on first
+# use rather than with the app, so processes that never generate skip it.
+# Set False to use database questions only.
+AI_GENERATOR_AVAILABLE = True
+_NOT_LOADED = object()
+
+
+def load_ai_generator():
+    """Import and build the AI question generator; None if it is unavailable"""
+    global AI_GENERATOR_AVAILABLE
+    if not AI_GENERATOR_AVAILABLE:
+        return None
+    try:
+        from ai_question_generator import AIQuestionGenerator
+    except ImportError:
+        AI_GENERATOR_AVAILABLE = False
+        print("AI Question Generator not available. Using database questions only.")
+        return None
+    try:
+        generator = AIQuestionGenerator()
+        print("AI Question Generator initialized successfully")
+        return generator
+    except Exception as e:
+        print(f"Failed to initialize AI Generator: {e}")
+        return None
 
 class AdaptiveTestEngine:
     def __init__(self):
@@ -19,48 +45,45 @@ class AdaptiveTestEngine:
             'Advanced': {'Easy': 0.1, 'Medium': 0.4, 'Hard': 0.5}
         }
         
-        # Initialize AI question generator if available
-        self.ai_generator = None
-        if AI_GENERATOR_AVAILABLE:
-            try:
-                self.ai_generator = AIQuestionGenerator()
-                print("AI Question Generator initialized successfully")
-            except Exception as e:
-                print(f"Failed to initialize AI Generator: {e}")
-                self.ai_generator = None
+        # AI question generator, built on first access (see ai_generator)
+        self._ai_generator = _NOT_LOADED
+        self._ai_generator_lock = threading.Lock()
+    
+    @property
+    def ai_generator(self):
+        """The AI question generator, loaded on first access; None if unavailable"""
+        if self._ai_generator is _NOT_LOADED:
+            with self._ai_generator_lock:
+                if self._ai_generator is _NOT_LOADED:
+                    self._ai_generator = load_ai_generator()
+        return self._ai_generator
+    
+    @ai_generator.setter
+    def ai_generator(self, generator):
+        self._ai_generator = generator
     
     def generate_initial_test(self, stream, num_questions=25):
         """Generate initial level detection test using AI or database"""
         subjects = self._get_subjects_for_stream(stream)
         questions_per_subject = num_questions // len(subjects)
         
-        selected_questions = []
-        used_ids = set()  # Track used question IDs to prevent duplicates
-        
-        for subject in subjects:
-            # Get balanced questions across difficulties (more medium and hard)
-            easy_count = int(questions_per_subject * 0.25)  # 25% easy
-            medium_count = int(questions_per_subject * 0.40)  # 40% medium
-            hard_count = questions_per_subject - easy_count - medium_count  # 35% hard
-            
-            # Generate questions for each difficulty
-            for difficulty, count in [('Easy', easy_count), ('Medium', medium_count), ('Hard', hard_count)]:
-                questions = self._generate_questions_ai_or_db(subject, stream, difficulty, count)
-                # Filter out duplicates
-                for q in questions:
-                    if q.id not in used_ids:
-                        selected_questions.append(q)
-                        used_ids.add(q.id)
+        # Get balanced questions across difficulties (more medium and hard):
+        # 25% easy, 40% medium, 35% hard per subject
+        blueprint = build_blueprint(
+            {subject: questions_per_subject for subject in subjects},
+            [('Easy', 0.25), ('Medium', 0.40), ('Hard', 0.35)]
+        )
+        selected_questions = self._assemble_blueprint(stream, blueprint)
         
         random.shuffle(selected_questions)
         return selected_questions[:num_questions]
     
     def generate_adaptive_test(self, user, num_questions=30):
         """Generate adaptive test based on user's weak areas and level using AI"""
-        weak_topics = user.get_weak_topics()
-        user_level = user.level
-        stream = user.stream
-        
+        return self.generate_level_test(user.stream, user.level, num_questions)
+    
+    def generate_level_test(self, stream, user_level, num_questions=30):
+        """Generate an adaptive test for any user of the given stream and level"""
         # Get difficulty distribution based on user level (more challenging)
         if user_level == 'Beginner':
             difficulty_dist = {'Easy': 0.30, 'Medium': 0.45, 'Hard': 0.25}
@@ -69,27 +92,17 @@ class AdaptiveTestEngine:
         else:  # Advanced
             difficulty_dist = {'Easy': 0.10, 'Medium': 0.40, 'Hard': 0.50}
         
-        selected_questions = []
-        used_ids = set()  # Track used question IDs to prevent duplicates
         subjects = self._get_subjects_for_stream(stream)
         
         # Calculate questions per subject
         questions_per_subject = num_questions // len(subjects)
         
+        # Distribute questions by difficulty
+        blueprint = []
         for subject in subjects:
-            # Distribute questions by difficulty
             for difficulty, weight in difficulty_dist.items():
-                difficulty_count = int(questions_per_subject * weight)
-                
-                if difficulty_count > 0:
-                    questions = self._generate_questions_ai_or_db(
-                        subject, stream, difficulty, difficulty_count
-                    )
-                    # Filter out duplicates
-                    for q in questions:
-                        if q.id not in used_ids:
-                            selected_questions.append(q)
-                            used_ids.add(q.id)
+                blueprint.append((subject, difficulty, int(questions_per_subject * weight)))
+        selected_questions = self._assemble_blueprint(stream, blueprint)
         
         random.shuffle(selected_questions)
         return selected_questions[:num_questions]
@@ -180,115 +193,145 @@ class AdaptiveTestEngine:
             return ['Physics', 'Chemistry', 'Mathematics']
         return []
     
-    def _generate_questions_ai_or_db(self, subject, stream, difficulty, count):
+    def _generate_questions_ai_or_db(self, subject, stream, difficulty, count, exclude=None):
         """Generate questions using AI if available, otherwise use database"""
+        return self._assemble_blueprint(stream, [(subject, difficulty, count)], exclude=exclude)
+    
+    def _assemble_blueprint(self, stream, blueprint, exclude=None):
+        """Fill [(subject, difficulty, count), ...] with AI questions where available
+        and the remainder from the database in a single query"""
+        selected_questions = []
+        used_ids = set(exclude or ())  # Track used question IDs to prevent duplicates
+        shortfall = []
+        
+        if question_inventory.enabled:
+            # Prewarmed AI questions; only what the inventory lacks is generated,
+            # within the generator's deadline
+            ai_buckets = question_inventory.take(stream, blueprint, exclude=used_ids)
+            if question_inventory.generate_misses:
+                misses = [(subject, difficulty, count - len(ai_buckets.get((subject, difficulty), [])))
+                          for subject, difficulty, count in blueprint]
+                for key, questions in self._generate_ai_buckets(stream, misses).items():
+                    ai_buckets.setdefault(key, []).extend(questions)
+        else:
+            # One concurrent fan-out covers every bucket of the paper
+            ai_buckets = self._generate_ai_buckets(stream, blueprint)
         
-        if count <= 0:
-            return []
-        
-        # Try AI generation first
-        if self.ai_generator:
-            try:
-                ai_questions = self.ai_generator.generate_questions_with_ai(
-                    subject=subject,
-                    stream=stream,
-                    difficulty=difficulty,
-                    num_questions=count
-                )
-                
-                if ai_questions and len(ai_questions) >= count * 0.7:  # At least 70% success
-                    # Convert dict to Question objects
-                    question_objects = []
-                    for q_data in ai_questions[:count]:  # Take exactly count questions
-                        # Create temporary Question object (not saved to DB)
-                        q = Question(
-                            id=random.randint(100000, 999999),  # Temporary ID
-                            subject=q_data['subject'],
-                            chapter=q_data['chapter'],
-                            topic=q_data['topic'],
-                            difficulty=q_data['difficulty'],
-                            question_text=q_data['question_text'],
-                            option_a=q_data['option_a'],
-                            option_b=q_data['option_b'],
-                            option_c=q_data['option_c'],
-                            option_d=q_data['option_d'],
-                            correct_answer=q_data['correct_answer'],
-                            explanation=q_data.get('explanation', ''),
-                            stream=q_data['stream']
-                        )
-                        question_objects.append(q)
-                    
-                    print(f"✓ Generated {len(question_objects)} AI questions for {subject} ({difficulty})")
-                    
-                    # If we still need more questions, get from database
-                    if len(question_objects) < count:
-                        needed = count - len(question_objects)
-                        db_questions = Question.query.filter_by(
-                            subject=subject,
-                            stream=stream,
-                            difficulty=difficulty
-                        ).limit(needed * 2).all()
-                        
-                        if db_questions:
-                            additional = random.sample(db_questions, min(needed, len(db_questions)))
-                            question_objects.extend(additional)
-                            print(f"✓ Added {len(additional)} database questions for {subject} ({difficulty})")
-                    
-                    return question_objects
-            
-            except Exception as e:
-                print(f"AI generation failed: {e}. Falling back to database.")
-        
-        # Fallback to database questions - GET ALL AVAILABLE, THEN SAMPLE
-        all_questions = Question.query.filter_by(
-            subject=subject,
-            stream=stream,
-            difficulty=difficulty
-        ).all()
-        
-        if all_questions:
-            # Shuffle to ensure randomness
-            random.shuffle(all_questions)
-            # Take up to count questions (no duplicates)
-            selected = all_questions[:min(count, len(all_questions))]
-            print(f"✓ Using {len(selected)} database questions for {subject} ({difficulty})")
-            return selected
-        
-        # If no questions for this exact difficulty, try other difficulties
-        print(f"⚠ No {difficulty} questions for {subject}, trying other difficulties...")
-        all_subject_questions = Question.query.filter_by(
-            subject=subject,
-            stream=stream
-        ).all()
-        
-        if all_subject_questions:
-            random.shuffle(all_subject_questions)
-            selected = all_subject_questions[:min(count, len(all_subject_questions))]
-            print(f"✓ Using {len(selected)} mixed difficulty questions for {subject}")
-            return selected
-        
-        print(f"⚠ No questions available for {subject}")
-        return []
+        for subject, difficulty, count in blueprint:
+            if count <= 0:
+                continue
+            bucket = ai_buckets.get((subject, difficulty), [])
+            added = 0
+            while bucket and added < count:
+                q = bucket.pop(0)
+                if q.id not in used_ids:
+                    selected_questions.append(q)
+                    used_ids.add(q.id)
+                    added += 1
+            # Questions already used elsewhere in the paper come from the database instead
+            if added < count:
+                shortfall.append((subject, difficulty, count - added))
+        
+        if not shortfall:
+            return selected_questions
+        
+        # Fallback to database questions - the whole remaining blueprint in one round trip
+        db_questions = assemble_paper(stream, shortfall, exclude=used_ids)
+        selected_questions.extend(db_questions)
+        
+        requested = sum(count for _, _, count in shortfall)
+        print(f"✓ Using {len(db_questions)}/{requested} database questions across {len(shortfall)} buckets")
+        if len(db_questions) < requested:
+            print(f"⚠ Not enough unused questions for {stream}; paper is {requested - len(db_questions)} short")
+        
+        return selected_questions
+    
+    def _generate_ai_buckets(self, stream, blueprint):
+        """Generate every (subject, difficulty) bucket with AI concurrently;
+        {(subject, difficulty): [Question]}, empty if unavailable. On a request
+        generation stops at the generator's deadline, so a slow API cannot hold
+        up the test; background builds (paper pool, jobs) run without one.
+        Buckets other requests are already generating share their questions."""
+        wanted = [(subject, difficulty, count) for subject, difficulty, count in blueprint if count > 0]
+        if not wanted or not self.ai_generator:
+            return {}
+        deadline = self.ai_generator.deadline if has_request_context() else None
+        if not generation_flights.enabled:
+            return self._generate_and_save(stream, wanted, deadline)
+        
+        try:
+            return generation_flights.run(
+                stream, wanted, lambda buckets: self._generate_and_save(stream, buckets, deadline),
+                timeout=deadline
+            )
+        except Exception as e:
+            print(f"Shared AI generation failed: {e}. Falling back to database.")
+            db.session.rollback()
+            return {}
+    
+    def _generate_and_save(self, stream, buckets, deadline=None):
+        """Generate buckets with AI, then persist them in one write;
+        {(subject, difficulty): [Question]}.
+        
+        Generation stops as soon as every bucket is full. Questions are only
+        collected while the stream runs, so no batch waits on the database,
+        and whatever arrived before a failure or the deadline is kept.
+        """
+        needed = defaultdict(int)
+        for subject, difficulty, count in buckets:
+            needed[(subject, difficulty)] += count
+        ai_buckets = defaultdict(list)
+        pending = []
+        
+        stream_questions = self.ai_generator.iter_questions_for_buckets(stream, buckets, deadline=deadline)
+        try:
+            for key, q_data in stream_questions:
+                if needed.get(key, 0) <= 0:
+                    continue
+                needed[key] -= 1
+                pending.append(q_data)
+                if not any(count > 0 for count in needed.values()):
+                    break
+        except Exception as e:
+            print(f"AI generation failed: {e}. Keeping the questions that arrived.")
+            db.session.rollback()
+        finally:
+            stream_questions.close()  # Cancels batches still running
+        
+        try:
+            for question in save_generated_questions(pending) if pending else []:
+                ai_buckets[(question.subject, question.difficulty)].append(question)
+        except Exception as e:
+            print(f"Saving AI questions failed: {e}. Falling back to database.")
+            db.session.rollback()
+        
+        for (subject, difficulty), questions in ai_buckets.items():
+            print(f"✓ Generated {len(questions)} AI questions for {subject} ({difficulty})")
+        
+        return ai_buckets
     
     def get_chapter_wise_questions(self, stream, subject, chapter, difficulty=None, limit=20):
-        """Get questions for chapter-wise tests"""
-        query = Question.query.filter_by(
-            stream=stream,
-            subject=subject,
-            chapter=chapter
+        """Get questions for chapter-wise tests, sampled uniformly from the whole chapter"""
+        inventory_questions = []
+        if question_inventory.enabled:
+            # Fresh questions generated for this chapter come first
+            levels = [(difficulty, limit)] if difficulty else split_by_difficulty(limit)
+            stocked = question_inventory.take(
+                stream, [(subject, level, count) for level, count in levels], topic=chapter
+            )
+            inventory_questions = [q for questions in stocked.values() for q in questions]
+        
+        draw = partial(question_pool.sample_chapter, stream, subject, chapter, difficulty=difficulty)
+        return inventory_questions + load_sampled(
+            [(draw, limit - len(inventory_questions))], exclude={q.id for q in inventory_questions}
         )
-        
-        if difficulty:
-            query = query.filter_by(difficulty=difficulty)
-        
-        questions = query.limit(limit * 2).all()
-        return random.sample(questions, min(limit, len(questions)))
+    
+    def get_chapter_catalog(self, stream):
+        """Chapters with question counts per difficulty, from the pool index"""
+        return question_pool.chapter_catalog(stream)
     
     def generate_full_paper(self, stream):
         """Generate a full NEET/JEE paper (180 questions, 720 marks) using AI"""
-        selected_questions = []
-        used_ids = set()  # Track used question IDs to prevent duplicates
-        
         if stream == 'NEET':
             # NEET: 45 Physics, 45 Chemistry, 90 Biology = 180 questions
             distribution = {'Physics': 45, 'Chemistry': 45, 'Biology': 90}
@@ -298,22 +341,15 @@ class AdaptiveTestEngine:
         
         print(f"\n🎯 Generating Full {stream} Paper (180 questions, 720 marks)...")
         
+        # Get balanced questions across difficulties (more challenging):
+        # 25% easy, 45% medium, 30% hard
+        blueprint = build_blueprint(distribution)
         for subject, count in distribution.items():
-            # Get balanced questions across difficulties (more challenging)
-            easy_count = int(count * 0.25)  # 25% easy
-            medium_count = int(count * 0.45)  # 45% medium
-            hard_count = count - easy_count - medium_count  # 30% hard
-            
+            easy_count, medium_count, hard_count = [n for _, n in split_by_difficulty(count)]
             print(f"  📚 {subject}: {count} questions (Easy: {easy_count}, Medium: {medium_count}, Hard: {hard_count})")
-            
-            # Generate questions using AI or database
-            for difficulty, diff_count in [('Easy', easy_count), ('Medium', medium_count), ('Hard', hard_count)]:
-                questions = self._generate_questions_ai_or_db(subject, stream, difficulty, diff_count)
-                # Filter out duplicates
-                for q in questions:
-                    if q.id not in used_ids:
-                        selected_questions.append(q)
-                        used_ids.add(q.id)
+        
+        # Generate questions using AI or database
+        selected_questions = self._assemble_blueprint(stream, blueprint)
         
         random.shuffle(selected_questions)
         print(f"✅ Full paper generated: {len(selected_questions)} unique questions\n")
@@ -325,25 +361,17 @@ class AdaptiveTestEngine:
         subject = subject.strip().title()
         
         # Get balanced questions across difficulties (more challenging)
-        easy_count = int(num_questions * 0.25)  # 25% easy
-        medium_count = int(num_questions * 0.45)  # 45% medium
-        hard_count = num_questions - easy_count - medium_count  # 30% hard
+        blueprint = build_blueprint({subject: num_questions})  # 25% easy, 45% medium, 30% hard
+        easy_count, medium_count, hard_count = [count for _, _, count in blueprint]
         
         print(f"\n🎯 Generating {subject} Test for {stream} ({num_questions} questions)...")
         print(f"  Easy: {easy_count}, Medium: {medium_count}, Hard: {hard_count}")
         
-        selected_questions = []
-        used_ids = set()  # Track used question IDs to prevent duplicates
-        
         # Generate questions using AI or database - ENSURE CORRECT SUBJECT
-        for difficulty, count in [('Easy', easy_count), ('Medium', medium_count), ('Hard', hard_count)]:
-            questions = self._generate_questions_ai_or_db(subject, stream, difficulty, count)
-            # Filter out duplicates AND verify subject matches
-            for q in questions:
-                if q.id not in used_ids and q.subject == subject:
-                    selected_questions.append(q)
-                    used_ids.add(q.id)
+        selected_questions = [
+            q for q in self._assemble_blueprint(stream, blueprint) if q.subject == subject
+        ]
         
         random.shuffle(selected_questions)
         print(f"✅ {subject} test generated: {len(selected_questions)} unique questions\n")
-        return selected_questions[:num_questions]
\ No newline at end of file
+        return selected_questions[:num_questions]
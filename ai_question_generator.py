@@ -7,119 +7,631 @@ Extracts content from PDF question banks and generates new questions using AI
 import os
 import json
 import random
-import pdfplumber
+import hashlib
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 from openai import OpenAI
 from typing import List, Dict
 from models import Question
+from pdf_cache import pdf_text_cache
+from pdf_index import chunk_index_store
+from question_parser import PARSERS, parse_response
+from metrics import registry
+from llm_cassette import CassetteTransport
+from batch_tuner import BatchTuner, MAX_TOKENS, fixed_plan
+import pdf_extraction
+
+DEFAULT_MODEL = "gpt-3.5-turbo"  # 10x cheaper than gpt-4
+DEFAULT_OUTPUT_MODE = "text"  # Or "json" for structured output; AI_OUTPUT_MODE overrides
+DEFAULT_MAX_CONCURRENCY = 8  # Override with the AI_MAX_CONCURRENCY environment variable
+REFERENCE_CHARS = 1500  # Reference material per prompt, picked from the chunk index
+INDEX_PAGES = int(os.getenv('PDF_INDEX_PAGES', 200))  # Pages of each PDF to index
+DEFAULT_DEADLINE = 15.0  # seconds a test waits for generation before using what has arrived
+DEFAULT_HEDGE_PERCENTILE = 95  # Hedge batches slower to a first question than this percentile; 0 disables
+HEDGE_INITIAL_DELAY = 5.0  # seconds, until HEDGE_MIN_SAMPLES latencies have been seen
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 500  # Recent first-question latencies the percentile is taken over
+DEFAULT_REQUESTS_PER_MINUTE = 0  # API calls started per minute per generator; 0 is unlimited
+DEFAULT_ADAPTIVE_BATCHES = True  # Tune batch size and max_tokens per bucket; AI_ADAPTIVE_BATCHES=0 disables
+DEFAULT_MULTI_BUCKET = False  # Ask for a subject's difficulties in shared calls; AI_MULTI_BUCKET=1 enables
+MIXED = 'Mixed'  # Difficulty label of calls covering several difficulties
+
+# Per-call telemetry, labelled by bucket; served at /metrics
+LABELS = ('stream', 'subject', 'difficulty')
+GENERATION_CALLS = registry.counter(
+    'ai_generation_calls_total', 'Generation API calls by outcome (ok, error or cancelled)', LABELS + ('outcome',))
+GENERATION_SECONDS = registry.histogram(
+    'ai_generation_seconds', 'Generation call latency, request to last token', LABELS,
+    buckets=(1, 2, 5, 10, 20, 30, 60, 120))
+FIRST_QUESTION_SECONDS = registry.histogram(
+    'ai_generation_first_question_seconds', 'Latency from request to the first parsed question', LABELS,
+    buckets=(0.5, 1, 2, 5, 10, 20, 60))
+PROMPT_TOKENS = registry.counter('ai_generation_prompt_tokens_total', 'Prompt tokens billed', LABELS)
+COMPLETION_TOKENS = registry.counter('ai_generation_completion_tokens_total', 'Completion tokens billed', LABELS)
+QUESTIONS_REQUESTED = registry.counter('ai_generation_questions_requested_total', 'Questions asked for', LABELS)
+QUESTIONS_PARSED = registry.counter('ai_generation_questions_parsed_total', 'Valid questions parsed', LABELS)
+FALLBACKS = registry.counter(
+    'ai_generation_fallbacks_total', 'Buckets handed to the fallback (no_client, low_yield or deadline)',
+    LABELS + ('reason',))
+HEDGES_SENT = registry.counter('ai_generation_hedges_total', 'Duplicate requests sent for straggler batches', LABELS)
+HEDGES_WON = registry.counter('ai_generation_hedges_won_total', 'Hedged batches answered first by the duplicate', LABELS)
+TRUNCATED_CALLS = registry.counter('ai_generation_truncated_total', 'Calls cut off at max_tokens', LABELS)
+
+_http_client = None
+_http_client_key = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client(max_connections=DEFAULT_MAX_CONCURRENCY):
+    """One pooled HTTP client per process, shared by every OpenAI client.
+
+    Keep-alive connections are reused across calls instead of each client
+    opening its own pool. A caller needing a bigger pool, or a forked child,
+    gets a new client; clients already handed out keep working.
+    """
+    global _http_client, _http_client_key
+    with _http_client_lock:
+        pid, size = _http_client_key or (None, 0)
+        if _http_client is None or pid != os.getpid() or size < max_connections:
+            _http_client = httpx.Client(
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections),
+                timeout=httpx.Timeout(60.0, connect=10.0)
+            )
+            _http_client_key = (os.getpid(), max_connections)
+        return _http_client
+
+
+class LatencyWindow:
+    """Percentiles over the most recent latency observations"""
+    
+    def __init__(self, size=HEDGE_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._samples)
+    
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def percentile(self, percent):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+
+class RateLimiter:
+    """Spaces calls evenly at per_minute, allowing bursts of up to burst calls.
+    
+    Each acquire() reserves the next free slot under the lock and sleeps
+    outside it, so waiting threads start in the order they asked. A caller
+    whose slot would come after its deadline gets none and does not wait.
+    """
+    
+    def __init__(self, per_minute, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 60.0 / per_minute
+        self.burst = max(1, burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._next_free = None  # When the next call would start if calls were evenly spaced
+        self._lock = threading.Lock()
+    
+    def acquire(self, expires=None):
+        """Block until a call may start; returns the seconds waited.
+        
+        expires is a deadline on the limiter's clock: if no slot opens by
+        then, returns None at once without taking one.
+        """
+        with self._lock:
+            now = self._clock()
+            next_free = now if self._next_free is None else max(self._next_free, now)
+            start = max(now, next_free - (self.burst - 1) * self.interval)
+            if expires is not None and start >= expires:
+                return None
+            self._next_free = next_free + self.interval
+        wait = start - now
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+def split_mix(counts, sizes):
+    """Share {difficulty: count} out over calls of the given sizes, each call
+    getting the difficulties in proportion: [{difficulty: questions}]"""
+    order = sorted(((i + 0.5) / count, position, difficulty)
+                   for position, (difficulty, count) in enumerate(counts.items()) for i in range(count))
+    mixes = []
+    start = 0
+    for size in sizes:
+        mix = {difficulty: 0 for difficulty in counts}
+        for _, _, difficulty in order[start:start + size]:
+            mix[difficulty] += 1
+        mixes.append({difficulty: n for difficulty, n in mix.items() if n})
+        start += size
+    return mixes
+
+
+class _Batch:
+    """One batch of a fan-out. A hedged batch has two attempts racing; the
+    first to produce a question wins and the other stops at its next chunk."""
+    
+    def __init__(self, key, args):
+        self.key = key
+        self.args = args
+        self.attempts = 0
+        self.running = 0
+        self.started = None  # When the first attempt left the executor queue
+        self.winner = None
+        self.cancelled = False
+        self._lock = threading.Lock()
+    
+    def claim(self, attempt):
+        with self._lock:
+            if self.winner is None:
+                self.winner = attempt
+            return self.winner == attempt
+    
+    def should_stop(self, attempt):
+        return self.cancelled or self.winner not in (None, attempt)
+
 
 class AIQuestionGenerator:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, base_url=None, max_concurrency=None, output_mode=None,
+                 deadline=None, hedge_percentile=None, requests_per_minute=None, transport=None,
+                 adaptive_batches=None, multi_bucket=None):
         """Initialize AI Question Generator"""
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
+        if transport is None and os.getenv('AI_CASSETTE'):
+            transport = CassetteTransport(os.getenv('AI_CASSETTE'), mode=os.getenv('AI_CASSETTE_MODE', 'replay'))
+        if isinstance(transport, CassetteTransport) and transport.mode == 'replay':
+            self.api_key = self.api_key or 'cassette-replay'  # Replays never reach the API
+        self.transport = transport
+        self.max_concurrency = max_concurrency or int(os.getenv('AI_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+        self.model = DEFAULT_MODEL
+        self.output_mode = output_mode or os.getenv('AI_OUTPUT_MODE', DEFAULT_OUTPUT_MODE)
+        if self.output_mode not in PARSERS:
+            raise ValueError(f"Unknown AI output mode {self.output_mode!r}; expected one of {sorted(PARSERS)}")
+        # Budget for generation on the request path; background refills pass none.
+        # 0 turns it off
+        if deadline is None:
+            deadline = float(os.getenv('AI_DEADLINE_SECONDS', DEFAULT_DEADLINE))
+        self.deadline = deadline or None
+        if hedge_percentile is None:
+            hedge_percentile = float(os.getenv('AI_HEDGE_PERCENTILE', DEFAULT_HEDGE_PERCENTILE))
+        self.hedge_percentile = hedge_percentile
+        self.first_question_latency = LatencyWindow()
+        if requests_per_minute is None:
+            requests_per_minute = float(os.getenv('AI_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE))
+        self.rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+        if adaptive_batches is None:
+            adaptive_batches = os.getenv('AI_ADAPTIVE_BATCHES', '1' if DEFAULT_ADAPTIVE_BATCHES else '0') != '0'
+        # Learns tokens per question per bucket; None keeps the fixed plan of batch_tuner.fixed_plan
+        self.batch_tuner = BatchTuner(self.model, requests_per_minute) if adaptive_batches else None
+        if multi_bucket is None:
+            multi_bucket = os.getenv('AI_MULTI_BUCKET', '1' if DEFAULT_MULTI_BUCKET else '0') != '0'
+        # One call per batch of a subject's mixed difficulties instead of one per difficulty
+        self.multi_bucket = multi_bucket
         if self.api_key:
-            self.client = OpenAI(api_key=self.api_key)
+            # base_url=None falls back to OPENAI_BASE_URL, then the public API
+            if transport is not None:
+                http_client = httpx.Client(transport=transport, timeout=httpx.Timeout(60.0, connect=10.0))
+            else:
+                http_client = get_http_client(self.max_concurrency)
+            self.client = OpenAI(api_key=self.api_key, base_url=base_url, http_client=http_client)
         else:
             self.client = None
             print("Warning: No OpenAI API key found. Set OPENAI_API_KEY environment variable.")
         
-        # Cache for extracted PDF content
-        self.pdf_content_cache = {}
-    
-    def extract_pdf_content(self, pdf_path: str, max_pages: int = 50) -> str:
-        """Extract text content from PDF"""
-        if pdf_path in self.pdf_content_cache:
-            return self.pdf_content_cache[pdf_path]
+        # API calls for all batches, subjects and difficulties fan out on this
+        # pool, so at most max_concurrency requests are in flight per generator
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='ai-generation')
         
+        # Extracted PDF text and chunk indexes, shared across instances,
+        # processes and restarts
+        self.pdf_cache = pdf_text_cache
+        self.chunk_indexes = chunk_index_store
+    
+    def extract_pdf_content(self, pdf_path: str, max_pages: int = 50, start_page: int = 0) -> str:
+        """Extract text from a window of PDF pages, through the two-tier text cache"""
         try:
-            content = []
-            with pdfplumber.open(pdf_path) as pdf:
-                # Extract from first max_pages pages
-                for i, page in enumerate(pdf.pages[:max_pages]):
-                    text = page.extract_text()
-                    if text:
-                        content.append(text)
-            
-            full_content = "\n\n".join(content)
-            self.pdf_content_cache[pdf_path] = full_content
-            return full_content
-        
+            pages = self.pdf_cache.get_or_extract_pages(
+                pdf_path,
+                lambda: pdf_extraction.iter_page_texts(pdf_path, start_page=start_page, max_pages=max_pages),
+                start_page=start_page,
+                max_pages=max_pages
+            )
+            return "\n\n".join(text for _, text in pages if text)
         except Exception as e:
             print(f"Error extracting PDF {pdf_path}: {e}")
             return ""
     
+    def iter_pdf_pages(self, pdf_path: str, start_page: int = 0, max_pages: int = None):
+        """Stream (page_number, text) for any page window, extracted in parallel"""
+        return pdf_extraction.iter_page_texts(pdf_path, start_page=start_page, max_pages=max_pages)
+    
+    def get_reference_content(self, pdf_path: str, topic: str, batches: int) -> List[str]:
+        """Reference text for each of a bucket's batches, from the PDF's chunk index"""
+        try:
+            index = self.chunk_indexes.get(pdf_path, max_pages=INDEX_PAGES)
+        except Exception as e:
+            print(f"Error indexing PDF {pdf_path}: {e}")
+            return []
+        return index.reference_texts(topic, batches, REFERENCE_CHARS)
+    
+    def reference_loaded(self, pdf_path: str) -> bool:
+        """Whether the PDF's chunk index is in memory; a cold one is loaded or built in the background"""
+        try:
+            return self.chunk_indexes.get(pdf_path, max_pages=INDEX_PAGES, wait=False) is not None
+        except Exception as e:
+            print(f"Error indexing PDF {pdf_path}: {e}")
+            return False
+    
+    def warm_pdf_cache(self) -> int:
+        """Build each question-bank PDF's chunk index via the text cache; returns PDFs found"""
+        warmed = 0
+        for stream in ['NEET', 'JEE']:
+            for subject in self._get_subjects_for_stream(stream):
+                pdf_path = self._get_pdf_path(subject, stream)
+                if pdf_path and os.path.exists(pdf_path):
+                    self.get_reference_content(pdf_path, None, 1)
+                    warmed += 1
+        return warmed
+    
     def generate_questions_with_ai(
         self, 
         subject: str, 
         stream: str, 
         difficulty: str,
         num_questions: int = 5,
-        topic: str = None
+        topic: str = None,
+        deadline: float = None
     ) -> List[Dict]:
         """Generate questions using AI based on PDF content"""
+        buckets = self.generate_questions_for_buckets(
+            stream, [(subject, difficulty, num_questions)], topic=topic, deadline=deadline
+        )
+        return buckets[(subject, difficulty)]
+    
+    def stream_questions_with_ai(
+        self,
+        subject: str,
+        stream: str,
+        difficulty: str,
+        num_questions: int = 5,
+        topic: str = None,
+        deadline: float = None
+    ):
+        """Yield question dicts one by one as soon as each is fully generated"""
+        for _, question in self.iter_questions_for_buckets(
+            stream, [(subject, difficulty, num_questions)], topic=topic, deadline=deadline
+        ):
+            yield question
+    
+    def generate_questions_for_buckets(self, stream: str, buckets, topic: str = None, deadline: float = None) -> Dict:
+        """Generate questions for [(subject, difficulty, count), ...] in one fan-out.
+        
+        Every batch of every bucket is submitted to the executor at once, so a
+        full paper costs roughly one round trip per max_concurrency batches
+        instead of one per batch. Returns {(subject, difficulty): [question dicts]};
+        buckets where AI produced under 70% of the count use the fallback.
+        With a deadline (seconds) the call returns when it passes, with the
+        questions that have arrived, for the caller to fill the rest.
+        """
+        wanted = self._bucket_counts(buckets)
+        results = {key: [] for key in wanted}
         
         if not self.client:
             print("OpenAI client not initialized. Using fallback method.")
-            return self._generate_fallback_questions(subject, stream, difficulty, num_questions)
+            for subject, difficulty in wanted:
+                FALLBACKS.inc(stream=stream, subject=subject, difficulty=difficulty, reason='no_client')
+            return {
+                (subject, difficulty): self._generate_fallback_questions(subject, stream, difficulty, count)
+                for (subject, difficulty), count in wanted.items()
+            }
+        
+        start = time.monotonic()
+        for key, question in self.iter_questions_for_buckets(stream, buckets, topic=topic, deadline=deadline):
+            results[key].append(question)
+        expired = deadline is not None and time.monotonic() - start >= deadline
         
-        # Get PDF path for the subject
-        pdf_path = self._get_pdf_path(subject, stream)
+        for (subject, difficulty), count in wanted.items():
+            questions = results[(subject, difficulty)]
+            # If we got enough questions, keep them
+            if len(questions) >= count * 0.7:  # At least 70% success
+                results[(subject, difficulty)] = questions[:count]
+                continue
+            
+            if expired:
+                # Out of time: keep what arrived, the caller fills the rest
+                print(f"AI generated {len(questions)}/{count} {subject} ({difficulty}) questions before the deadline.")
+                FALLBACKS.inc(stream=stream, subject=subject, difficulty=difficulty, reason='deadline')
+                continue
+            
+            # Otherwise, use fallback
+            print(f"AI generated only {len(questions)}/{count} {subject} ({difficulty}) questions. Using fallback.")
+            FALLBACKS.inc(stream=stream, subject=subject, difficulty=difficulty, reason='low_yield')
+            results[(subject, difficulty)] = self._generate_fallback_questions(subject, stream, difficulty, count)
         
-        # Extract content from PDF
-        pdf_content = self.extract_pdf_content(pdf_path)
+        return results
+    
+    def iter_questions_for_buckets(self, stream: str, buckets, topic: str = None, deadline: float = None):
+        """Yield ((subject, difficulty), question dict) as questions complete.
         
-        if not pdf_content:
-            print(f"No content extracted from {pdf_path}")
-            return self._generate_fallback_questions(subject, stream, difficulty, num_questions)
+        All batches stream concurrently on the executor and each question is
+        handed over as soon as its block is parsed, in whatever order batches
+        produce them. Yields nothing without an API client.
         
-        # For large batches, generate in chunks of 10
-        all_questions = []
-        batch_size = 10
+        A batch with no question after the hedge delay - the configured
+        percentile of recent first-question latencies - gets a duplicate
+        request; the first attempt to produce a question is kept and the
+        other cancelled. With a deadline (seconds) iteration stops when it
+        passes and unfinished batches are cancelled; reference content then
+        only comes from chunk indexes already loaded, since building one can
+        take longer than the deadline.
+        """
+        if not self.client:
+            return
         
-        for i in range(0, num_questions, batch_size):
-            batch_count = min(batch_size, num_questions - i)
+        expires = time.monotonic() + deadline if deadline is not None else None
+        completed = queue.Queue()
+        pending = set()
+        for subject, difficulty, plan in self._plan_calls(stream, self._bucket_counts(buckets)):
+            # Large buckets are split into batches, each with its own
+            # reference material from the subject's PDF
+            pdf_path = self._get_pdf_path(subject, stream)
+            if expires is None or self.reference_loaded(pdf_path):
+                references = self.get_reference_content(pdf_path, topic, len(plan))
+            else:
+                print(f"Index of {pdf_path} is not loaded yet; generating without reference content")
+                references = [''] * len(plan)
             
-            # Create prompt for AI
-            prompt = self._create_generation_prompt(
-                subject, stream, difficulty, batch_count, topic, pdf_content
-            )
+            if not references:
+                print(f"No content extracted from {pdf_path}")
+                continue
             
+            for (mix, max_tokens), reference in zip(plan, references):
+                batch = _Batch((subject, difficulty), (subject, stream, difficulty, sum(mix.values()), topic, reference,
+                                                       pdf_path, max_tokens, mix if difficulty == MIXED else None))
+                self._start_attempt(completed, batch, expires)
+                pending.add(batch)
+        
+        hedge_delay = self.hedge_delay()
+        try:
+            # Attempts put ('question', batch, question) for each question,
+            # then ('done', batch, attempt) once they are finished
+            while pending:
+                now = time.monotonic()
+                if expires is not None and now >= expires:
+                    print(f"AI generation deadline passed with {len(pending)} batches unfinished")
+                    return
+                waits = [expires - now] if expires is not None else []
+                if hedge_delay is not None:
+                    waits.extend(batch.started + hedge_delay - now for batch in pending if self._hedgeable(batch))
+                try:
+                    kind, batch, payload = completed.get(timeout=max(0, min(waits)) if waits else None)
+                except queue.Empty:
+                    now = time.monotonic()
+                    for batch in pending:
+                        if hedge_delay is not None and self._hedgeable(batch) and now >= batch.started + hedge_delay:
+                            HEDGES_SENT.inc(stream=stream, subject=batch.key[0], difficulty=batch.key[1])
+                            self._start_attempt(completed, batch, expires)
+                    continue
+                
+                if kind == 'question':
+                    # Questions of a mixed batch go to the bucket of their labelled difficulty
+                    yield (batch.key[0], payload['difficulty']), payload
+                    continue
+                batch.running -= 1
+                if batch in pending and (batch.winner == payload or batch.running == 0):
+                    pending.remove(batch)
+                    if batch.winner == 2:
+                        HEDGES_WON.inc(stream=stream, subject=batch.key[0], difficulty=batch.key[1])
+        finally:
+            for batch in pending:
+                batch.cancelled = True
+    
+    def _plan_calls(self, stream, wanted):
+        """[(subject, difficulty, [(mix, max_tokens)])]: the calls generating wanted buckets.
+        
+        mix is {difficulty: questions} for one call. In multi-bucket mode the
+        difficulties of a subject share calls, whose difficulty is MIXED.
+        """
+        groups = {}
+        for (subject, difficulty), count in wanted.items():
+            mixed = self.multi_bucket and sum(1 for other, _ in wanted if other == subject) > 1
+            groups.setdefault((subject, MIXED if mixed else difficulty), {})[difficulty] = count
+        concurrency = max(1, self.max_concurrency // len(groups)) if groups else 1
+        calls = []
+        for (subject, difficulty), counts in groups.items():
+            plan = self.plan_batches(stream, subject, difficulty, sum(counts.values()), concurrency)
+            mixes = split_mix(counts, [questions for questions, _ in plan])
+            calls.append((subject, difficulty, [(mix, max_tokens) for mix, (_, max_tokens) in zip(mixes, plan)]))
+        return calls
+    
+    def plan_batches(self, stream, subject, difficulty, count, concurrency=1):
+        """[(questions, max_tokens)] for the calls generating count questions of a bucket"""
+        if self.batch_tuner is None:
+            return fixed_plan(count)
+        return self.batch_tuner.plan((stream, subject, difficulty), count, concurrency)
+    
+    def hedge_delay(self):
+        """Seconds without a first question after which a batch is hedged, or None"""
+        if not self.hedge_percentile:
+            return None
+        if len(self.first_question_latency) < HEDGE_MIN_SAMPLES:
+            return HEDGE_INITIAL_DELAY
+        return self.first_question_latency.percentile(self.hedge_percentile)
+    
+    @staticmethod
+    def _hedgeable(batch):
+        return batch.attempts == 1 and batch.started is not None and batch.winner is None
+    
+    def _start_attempt(self, completed, batch, expires):
+        batch.attempts += 1
+        batch.running += 1
+        self.executor.submit(self._run_attempt, completed, batch, batch.attempts, expires)
+    
+    def _run_attempt(self, completed, batch, attempt, expires):
+        started = time.monotonic()
+        if batch.started is None:
+            batch.started = started
+        try:
+            if batch.should_stop(attempt):
+                return
+            timeout = max(1.0, expires - started) if expires is not None else None
+            for question in self._generate_batch(*batch.args, should_stop=lambda: batch.should_stop(attempt),
+                                                 timeout=timeout):
+                if batch.winner is None and batch.claim(attempt):
+                    self.first_question_latency.observe(time.monotonic() - started)
+                if batch.winner == attempt:
+                    completed.put(('question', batch, question))
+                # A losing attempt stops itself at its next chunk
+        finally:
+            completed.put(('done', batch, attempt))
+    
+    @staticmethod
+    def _bucket_counts(buckets) -> Dict:
+        wanted = {}
+        for subject, difficulty, count in buckets:
+            wanted[(subject, difficulty)] = wanted.get((subject, difficulty), 0) + count
+        return wanted
+    
+    def _generate_batch(self, subject, stream, difficulty, batch_count, topic, reference, pdf_path=None,
+                        max_tokens=MAX_TOKENS, mix=None, should_stop=None, timeout=None):
+        """Stream one API call for batch_count questions, yielding each as it completes.
+        With a mix ({difficulty: questions}) the call asks for several
+        difficulties and each question carries the one it is labelled with.
+        Errors end the batch early, keeping questions already yielded; so does
+        should_stop() returning True between chunks. timeout bounds the request.
+        Each question dict carries its provenance (model, prompt_hash, source_pdf).
+        Completed calls are reported to the batch tuner."""
+        # Create prompt for AI
+        prompt = self._create_generation_prompt(
+            subject, stream, difficulty, batch_count, topic, reference, mix
+        )
+        messages = [
+            {
+                "role": "system",
+                "content": f"You are an expert {stream} exam question generator. Generate high-quality multiple-choice questions based on the provided content."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+        prompt_hash = hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+        if mix:
+            parser = PARSERS[self.output_mode](subject, stream, None, difficulties=tuple(mix))
+        else:
+            parser = PARSERS[self.output_mode](subject, stream, difficulty)
+        options = {'response_format': {'type': 'json_object'}} if self.output_mode == 'json' else {}
+        expires = time.monotonic() + timeout if timeout is not None else None
+        if self.rate_limiter is not None and self.rate_limiter.acquire(expires) is None:
+            print(f"No request slot for {subject} ({difficulty}) before the deadline")
+            return
+        if expires is not None:
+            options['timeout'] = max(1.0, expires - time.monotonic())
+        model = self.model
+        generated = 0
+        labels = {'stream': stream, 'subject': subject, 'difficulty': difficulty}
+        QUESTIONS_REQUESTED.inc(batch_count, **labels)
+        start = time.monotonic()
+        first_token = None
+        received = 0  # Characters, for servers that do not report usage
+        usage = None
+        finish_reason = None
+        outcome = 'error'
+        
+        def emit(question):
+            nonlocal generated
+            if not generated:
+                FIRST_QUESTION_SECONDS.observe(time.monotonic() - start, **labels)
+            generated += 1
+            return self._add_provenance(question, model, prompt_hash, pdf_path)
+        
+        try:
             try:
                 # Call OpenAI API (using gpt-3.5-turbo for cost efficiency)
                 response = self.client.chat.completions.create(
-                    model="gpt-3.5-turbo",  # 10x cheaper than gpt-4
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": f"You are an expert {stream} exam question generator. Generate high-quality multiple-choice questions based on the provided content."
-                        },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
-                    ],
+                    model=self.model,
+                    messages=messages,
                     temperature=0.8,  # Higher for more variety
-                    max_tokens=3000
+                    max_tokens=max_tokens,
+                    stream=True,
+                    # The last chunk then reports the token usage of the call
+                    extra_body={'stream_options': {'include_usage': True}},
+                    **options
                 )
-                
-                # Parse AI response
-                questions_text = response.choices[0].message.content
-                questions = self._parse_ai_response(questions_text, subject, stream, difficulty)
-                
-                all_questions.extend(questions)
-                print(f"  ✓ Generated batch {i//batch_size + 1}: {len(questions)} questions")
+                try:
+                    for chunk in response:
+                        if should_stop is not None and should_stop():
+                            outcome = 'cancelled'
+                            return
+                        model = chunk.model or model
+                        usage = self._record_usage(getattr(chunk, 'usage', None), labels) or usage
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        finish_reason = choice.finish_reason or finish_reason
+                        if choice.delta.content:
+                            received += len(choice.delta.content)
+                            if first_token is None:
+                                first_token = time.monotonic() - start
+                        for question in parser.feed(choice.delta.content or ''):
+                            yield emit(question)
+                finally:
+                    response.close()
             
             except Exception as e:
-                print(f"Error calling OpenAI API (batch {i//batch_size + 1}): {e}")
-                # Continue with next batch or use fallback
-                continue
-        
-        # If we got enough questions, return them
-        if len(all_questions) >= num_questions * 0.7:  # At least 70% success
-            return all_questions[:num_questions]
-        
-        # Otherwise, use fallback
-        print(f"AI generated only {len(all_questions)}/{num_questions} questions. Using fallback.")
-        return self._generate_fallback_questions(subject, stream, difficulty, num_questions)
+                print(f"Error calling OpenAI API ({subject} {difficulty} batch): {e}")
+                return
+            
+            # The last question may not be followed by a separator
+            for question in parser.close():
+                yield emit(question)
+            outcome = 'ok'
+            truncated = finish_reason == 'length'
+            if truncated:
+                TRUNCATED_CALLS.inc(**labels)
+            if self.batch_tuner is not None:
+                self.batch_tuner.observe(
+                    (stream, subject, difficulty), batch_count, max_tokens, generated,
+                    (usage or {}).get('completion_tokens') or received // 4, truncated,
+                    prompt_tokens=(usage or {}).get('prompt_tokens'), first_token_seconds=first_token,
+                    seconds=time.monotonic() - start
+                )
+            print(f"  ✓ Generated {subject} ({difficulty}) batch: {generated} questions"
+                  + (f" (cut off at {max_tokens} tokens)" if truncated else ""))
+        finally:
+            GENERATION_CALLS.inc(outcome=outcome, **labels)
+            GENERATION_SECONDS.observe(time.monotonic() - start, **labels)
+            QUESTIONS_PARSED.inc(generated, **labels)
+    
+    @staticmethod
+    def _record_usage(usage, labels):
+        """Count a usage report's tokens; returns it as a dict, or None"""
+        if not usage:
+            return None
+        if not isinstance(usage, dict):
+            usage = usage.model_dump() if hasattr(usage, 'model_dump') else vars(usage)
+        PROMPT_TOKENS.inc(usage.get('prompt_tokens') or 0, **labels)
+        COMPLETION_TOKENS.inc(usage.get('completion_tokens') or 0, **labels)
+        return usage
+    
+    @staticmethod
+    def _add_provenance(question, model, prompt_hash, pdf_path) -> Dict:
+        question['model'] = model
+        question['prompt_hash'] = prompt_hash
+        question['source_pdf'] = pdf_path
+        return question
     
     def _create_generation_prompt(
         self, 
@@ -128,31 +640,56 @@ class AIQuestionGenerator:
         difficulty: str,
         num_questions: int,
         topic: str,
-        pdf_content: str
+        pdf_content: str,
+        mix: Dict = None
     ) -> str:
-        """Create prompt for AI question generation"""
+        """Create prompt for AI question generation; mix asks for {difficulty: count}"""
         
-        # Limit PDF content to avoid token limits (use first 3000 chars as sample)
-        content_sample = pdf_content[:3000]
+        # pdf_content is reference material already picked for this batch;
+        # cap it to keep prompt tokens down
+        content_sample = pdf_content[:REFERENCE_CHARS]
         
         topic_instruction = f" focusing on the topic: {topic}" if topic else ""
+        mix_instruction = ""
+        if mix:
+            difficulty = ', '.join(f'{count} {level}' for level, count in mix.items())
+            mix_instruction = f"\n7. Label each question's DIFFICULTY as one of: {', '.join(mix)}"
+        
+        if content_sample:
+            source = f"Based on the following {stream} {subject} question bank content, generate"
+            reference_section = f"\nREFERENCE CONTENT:\n{content_sample}\n"
+        else:
+            source = f"For the {stream} {subject} question bank, generate"
+            reference_section = ""
         
-        prompt = f"""Based on the following {stream} {subject} question bank content, generate {num_questions} NEW multiple-choice questions{topic_instruction}.
+        prompt = f"""{source} {num_questions} NEW multiple-choice questions{topic_instruction}.
 
 DIFFICULTY LEVEL: {difficulty}
-
-REFERENCE CONTENT:
-{content_sample}
-
+{reference_section}
 REQUIREMENTS:
 1. Generate {num_questions} completely NEW questions (not from the reference)
 2. Each question should have 4 options (A, B, C, D)
 3. Indicate the correct answer
 4. Provide a brief explanation
 5. Match the style and difficulty of {stream} {subject} exams
-6. Difficulty level: {difficulty}
+6. Difficulty level: {difficulty}{mix_instruction}
+
+{self._format_instructions(num_questions, mix)}"""
+        
+        return prompt
+    
+    def _format_instructions(self, num_questions: int, mix: Dict = None) -> str:
+        """Response format section of the prompt for the output mode"""
+        levels = '/'.join(mix) if mix else ''
+        difficulty_line = f"DIFFICULTY: [{levels}]\n" if mix else ''
+        if self.output_mode == 'json':
+            difficulty_key = f' "difficulty": "{levels}",' if mix else ''
+            return f"""RESPOND WITH A JSON OBJECT ONLY, EXACTLY IN THIS SHAPE:
+{{"questions": [{{"question": "...", "options": {{"A": "...", "B": "...", "C": "...", "D": "..."}}, "answer": "A",{difficulty_key} "explanation": "...", "topic": "...", "chapter": "..."}}]}}
 
-FORMAT YOUR RESPONSE EXACTLY AS:
+The questions array must hold all {num_questions} questions."""
+        
+        return f"""FORMAT YOUR RESPONSE EXACTLY AS:
 ---
 QUESTION 1:
 [Question text here]
@@ -161,14 +698,12 @@ B) [Option B]
 C) [Option C]
 D) [Option D]
 ANSWER: [A/B/C/D]
-EXPLANATION: [Brief explanation]
+{difficulty_line}EXPLANATION: [Brief explanation]
 TOPIC: [Specific topic name]
 CHAPTER: [Chapter name]
 ---
 
 Generate all {num_questions} questions following this exact format."""
-        
-        return prompt
     
     def _parse_ai_response(
         self, 
@@ -178,76 +713,7 @@ Generate all {num_questions} questions following this exact format."""
         difficulty: str
     ) -> List[Dict]:
         """Parse AI-generated questions from response text"""
-        
-        questions = []
-        
-        # Split by question separator
-        question_blocks = response_text.split('---')
-        
-        for block in question_blocks:
-            if not block.strip() or 'QUESTION' not in block:
-                continue
-            
-            try:
-                # Extract question components
-                lines = block.strip().split('\n')
-                
-                question_text = ""
-                options = {'A': '', 'B': '', 'C': '', 'D': ''}
-                correct_answer = ""
-                explanation = ""
-                topic = "General"
-                chapter = "General"
-                
-                for line in lines:
-                    line = line.strip()
-                    
-                    if line.startswith('QUESTION'):
-                        continue
-                    elif line.startswith('A)'):
-                        options['A'] = line[2:].strip()
-                    elif line.startswith('B)'):
-                        options['B'] = line[2:].strip()
-                    elif line.startswith('C)'):
-                        options['C'] = line[2:].strip()
-                    elif line.startswith('D)'):
-                        options['D'] = line[2:].strip()
-                    elif line.startswith('ANSWER:'):
-                        correct_answer = line.replace('ANSWER:', '').strip()
-                    elif line.startswith('EXPLANATION:'):
-                        explanation = line.replace('EXPLANATION:', '').strip()
-                    elif line.startswith('TOPIC:'):
-                        topic = line.replace('TOPIC:', '').strip()
-                    elif line.startswith('CHAPTER:'):
-                        chapter = line.replace('CHAPTER:', '').strip()
-                    elif not any(line.startswith(x) for x in ['A)', 'B)', 'C)', 'D)', 'ANSWER', 'EXPLANATION', 'TOPIC', 'CHAPTER']):
-                        if question_text:
-                            question_text += " " + line
-                        else:
-                            question_text = line
-                
-                # Validate question
-                if question_text and all(options.values()) and correct_answer:
-                    questions.append({
-                        'subject': subject,
-                        'chapter': chapter,
-                        'topic': topic,
-                        'difficulty': difficulty,
-                        'question_text': question_text,
-                        'option_a': options['A'],
-                        'option_b': options['B'],
-                        'option_c': options['C'],
-                        'option_d': options['D'],
-                        'correct_answer': correct_answer.upper()[0],  # Get first letter
-                        'explanation': explanation,
-                        'stream': stream
-                    })
-            
-            except Exception as e:
-                print(f"Error parsing question block: {e}")
-                continue
-        
-        return questions
+        return parse_response(response_text, subject, stream, difficulty, self.output_mode)
     
     def _get_pdf_path(self, subject: str, stream: str) -> str:
         """Get PDF path for subject and stream"""
@@ -291,7 +757,7 @@ Generate all {num_questions} questions following this exact format."""
         subjects = self._get_subjects_for_stream(stream)
         questions_per_subject = num_questions // len(subjects)
         
-        all_questions = []
+        buckets = []
         
         for subject in subjects:
             # Determine difficulty distribution
@@ -307,16 +773,12 @@ Generate all {num_questions} questions following this exact format."""
             else:
                 difficulties = ['Medium'] * questions_per_subject
             
-            # Generate questions for each difficulty
             for difficulty in set(difficulties):
-                count = difficulties.count(difficulty)
-                questions = self.generate_questions_with_ai(
-                    subject=subject,
-                    stream=stream,
-                    difficulty=difficulty,
-                    num_questions=count
-                )
-                all_questions.extend(questions)
+                buckets.append((subject, difficulty, difficulties.count(difficulty)))
+        
+        # Generate questions for every subject and difficulty concurrently
+        generated = self.generate_questions_for_buckets(stream, buckets)
+        all_questions = [q for questions in generated.values() for q in questions]
         
         # Shuffle questions
         random.shuffle(all_questions)
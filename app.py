@@ -3,6 +3,13 @@ from flask_login import LoginManager, login_user, logout_user, login_required, c
 from werkzeug.security import generate_password_hash, check_password_hash
 from models import db, User, Question, TestAttempt, Resource
 from ai_engine import AdaptiveTestEngine
+from paper_pool import PaperPool
+from job_queue import job_queue
+from question_inventory import question_inventory
+from question_bank import near_duplicates
+from generation_flights import generation_flights
+from cat_engine import CATSession, level_for_ability
+from metrics import registry as metrics_registry
 from config import config
 import os
 import secrets
@@ -22,6 +29,65 @@ login_manager.login_view = 'login'
 # Initialize AI engine
 ai_engine = AdaptiveTestEngine()
 
+def build_paper(stream, test_type, level):
+    """Build one paper for the pre-generated paper pool"""
+    if test_type == 'full_paper':
+        return ai_engine.generate_full_paper(stream)
+    return ai_engine.generate_level_test(stream, level, num_questions=30)
+
+# Ready-made full papers and adaptive tests, refilled in the background
+paper_pool = PaperPool(build_paper, app)
+
+# Durable background jobs, run by worker.py
+job_queue.init_app(app)
+
+# Prewarmed AI questions per (stream, subject, difficulty, topic)
+question_inventory.init_app(app)
+
+# Near-duplicate index over the bank, built in the background from the first request
+near_duplicates.init_app(app)
+
+# Concurrent identical generation requests share one API call
+generation_flights.init_app(app)
+
+@job_queue.task(priority=10)
+def analyze_test_attempt(attempt_id):
+    """Update the user's weak/strong topics and level from a submitted test"""
+    test_attempt = db.session.get(TestAttempt, attempt_id)
+    if test_attempt is None:
+        return None
+    analysis = ai_engine.analyze_test_performance(test_attempt.user, test_attempt)
+    db.session.commit()
+    return analysis
+
+@job_queue.periodic(60 * 60)
+def sweep_expired_reset_tokens():
+    """Clear password reset tokens that have expired"""
+    cleared = User.query.filter(User.reset_token_expiry < datetime.utcnow()).update(
+        {'reset_token': None, 'reset_token_expiry': None}, synchronize_session=False
+    )
+    db.session.commit()
+    return {'cleared': cleared}
+
+@job_queue.periodic(6 * 60 * 60)
+def warm_pdf_cache():
+    """Extract the question-bank PDFs through the shared text cache and build their chunk indexes"""
+    if ai_engine.ai_generator is None:
+        return {'warmed': 0}
+    return {'warmed': ai_engine.ai_generator.warm_pdf_cache()}
+
+@job_queue.periodic(10 * 60, timeout=30 * 60)
+def refill_question_inventory(buckets=None):
+    """Generate AI questions for inventory buckets below their low-water mark"""
+    if ai_engine.ai_generator is None:
+        return {'generated': 0, 'buckets': 0}
+    return question_inventory.refill(ai_engine.ai_generator, buckets)
+
+@job_queue.periodic(24 * 60 * 60)
+def prune_finished_jobs():
+    """Delete finished jobs past the retention period"""
+    return {'deleted': job_queue.prune()}
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -217,21 +283,15 @@ def test_start(test_type):
 @login_required
 def take_test(test_type):
     """Start the actual test"""
-    # Clear any previous test session data
-    session.pop('test_questions', None)
-    session.pop('test_type', None)
-    session.pop('test_start_time', None)
-    session.pop('test_duration', None)
-    
     # Generate questions based on test type
     if test_type == 'initial':
         questions = ai_engine.generate_initial_test(current_user.stream, num_questions=25)
         duration = 60
     elif test_type == 'adaptive':
-        questions = ai_engine.generate_adaptive_test(current_user, num_questions=30)
+        questions = paper_pool.pop(current_user.stream, 'adaptive', current_user.level)
         duration = 30  # 30 minutes for adaptive test
     elif test_type == 'full_paper':
-        questions = ai_engine.generate_full_paper(current_user.stream)
+        questions = paper_pool.pop(current_user.stream, 'full_paper')
         duration = 180  # 3 hours for full paper
     elif test_type.startswith('subject_'):
         subject = test_type.replace('subject_', '').replace('_', ' ')
@@ -241,6 +301,33 @@ def take_test(test_type):
         questions = ai_engine.generate_adaptive_test(current_user)
         duration = 60
     
+    return render_test(questions, test_type, duration)
+
+@app.route('/chapters')
+@login_required
+def chapters():
+    """List chapter tests for the user's stream"""
+    catalog = ai_engine.get_chapter_catalog(current_user.stream)
+    return render_template('chapters.html', catalog=catalog)
+
+@app.route('/chapter_test/<subject>/<path:chapter>')
+@login_required
+def chapter_test(subject, chapter):
+    """Start a chapter-wise test"""
+    difficulty = request.args.get('difficulty') or None
+    questions = ai_engine.get_chapter_wise_questions(
+        current_user.stream, subject, chapter, difficulty=difficulty, limit=20
+    )
+    return render_test(questions, 'chapter', 30, title=f'{chapter} ({subject})')
+
+def render_test(questions, test_type, duration, title=None):
+    """Store the test in the session and render it"""
+    # Clear any previous test session data
+    session.pop('test_questions', None)
+    session.pop('test_type', None)
+    session.pop('test_start_time', None)
+    session.pop('test_duration', None)
+    
     # Check if we have enough questions
     if not questions or len(questions) == 0:
         flash('Not enough questions available in the database. Please contact administrator.')
@@ -255,7 +342,7 @@ def take_test(test_type):
     # Render template with cache control headers
     response = app.make_response(render_template('test_enhanced.html',
                          questions=questions,
-                         test_type=test_type.replace('_', ' ').title(),
+                         test_type=title or test_type.replace('_', ' ').title(),
                          duration=duration))
     
     # Prevent browser caching
@@ -347,9 +434,10 @@ def submit_test():
         
         db.session.commit()
         
-        # Analyze performance and update user profile
-        analysis = ai_engine.analyze_test_performance(current_user, test_attempt)
+        # Analyze performance and update user profile in the background
+        job = job_queue.enqueue('analyze_test_attempt', {'attempt_id': test_attempt.id})
         db.session.commit()
+        analysis = job.get_result() if job.status == 'done' else None
         
         # Clear session data
         session.pop('test_questions', None)
@@ -360,6 +448,7 @@ def submit_test():
         return render_template('test_results.html', 
                              test_attempt=test_attempt,
                              analysis=analysis,
+                             analysis_pending=analysis is None,
                              correct=correct_answers,
                              wrong=wrong_answers,
                              unattempted=unattempted,
@@ -381,6 +470,108 @@ def submit_test():
         flash('An error occurred while submitting your test. Please try again.')
         return redirect(url_for('dashboard'))
 
+@app.route('/cat_test')
+@login_required
+def cat_test():
+    """Start an item-by-item computerized adaptive test"""
+    cat = CATSession(
+        current_user.stream,
+        ai_engine._get_subjects_for_stream(current_user.stream),
+        min_questions=app.config['CAT_MIN_QUESTIONS'],
+        max_questions=app.config['CAT_MAX_QUESTIONS']
+    )
+    session['cat_session'] = cat.to_dict()
+    session['cat_answers'] = {}
+    session['test_start_time'] = datetime.now().isoformat()
+    return redirect(url_for('cat_question'))
+
+@app.route('/cat_test/question', methods=['GET', 'POST'])
+@login_required
+def cat_question():
+    """Score the previous answer and show the next most informative question"""
+    if 'cat_session' not in session:
+        flash('No active test found. Please start a new test.')
+        return redirect(url_for('dashboard'))
+    
+    cat = CATSession.from_dict(session['cat_session'])
+    answers = session.get('cat_answers', {})
+    
+    if request.method == 'POST' and cat.current is not None:
+        question = db.session.get(Question, cat.current)
+        if question:
+            answer = request.form.get(f'question_{question.id}')
+            cat.record_answer(question, answer)
+            if answer:
+                answers[str(question.id)] = answer
+        else:
+            cat.current = None
+    
+    if cat.current is None:
+        if cat.is_finished() or cat.next_question_id() is None:
+            session['cat_answers'] = answers
+            return finish_cat_test(cat, answers)
+    
+    question = db.session.get(Question, cat.current)
+    session['cat_session'] = cat.to_dict()
+    session['cat_answers'] = answers
+    
+    return render_template('cat_test.html',
+                         question=question,
+                         number=len(cat.responses) + 1,
+                         max_questions=cat.max_questions)
+
+def finish_cat_test(cat, answers):
+    """Record a finished adaptive session and set the user's level from ability"""
+    question_ids = [question_id for question_id, _, _, _ in cat.responses]
+    correct_answers = sum(1 for _, _, _, correct in cat.responses if correct)
+    unattempted = len(question_ids) - len(answers)
+    wrong_answers = len(question_ids) - correct_answers - unattempted
+    
+    # Same marking as other tests: +4 for correct, -1 for wrong
+    final_score = (correct_answers * 4) - (wrong_answers * 1)
+    max_score = len(question_ids) * 4
+    start_time = datetime.fromisoformat(session['test_start_time'])
+    
+    test_attempt = TestAttempt(
+        user_id=current_user.id,
+        test_type='level_check',
+        score=final_score,
+        total_questions=len(question_ids),
+        time_taken=int((datetime.now() - start_time).total_seconds() / 60)
+    )
+    test_attempt.set_questions_attempted(question_ids)
+    test_attempt.set_answers_given(answers)
+    db.session.add(test_attempt)
+    
+    theta, _ = cat.ability()
+    if question_ids:
+        current_user.level = level_for_ability(theta)
+    db.session.commit()
+    
+    analysis = {}
+    if question_ids:
+        job = job_queue.enqueue('analyze_test_attempt', {'attempt_id': test_attempt.id})
+        db.session.commit()
+        analysis = job.get_result() if job.status == 'done' else None
+    
+    session.pop('cat_session', None)
+    session.pop('cat_answers', None)
+    session.pop('test_start_time', None)
+    
+    if not question_ids:
+        flash('Not enough questions available in the database. Please contact administrator.')
+        return redirect(url_for('dashboard'))
+    
+    return render_template('test_results.html',
+                         test_attempt=test_attempt,
+                         analysis=analysis,
+                         analysis_pending=analysis is None,
+                         correct=correct_answers,
+                         wrong=wrong_answers,
+                         unattempted=unattempted,
+                         final_score=final_score,
+                         max_score=max_score)
+
 @app.route('/resources')
 @login_required
 def resources():
@@ -436,6 +627,18 @@ def profile():
         flash('An error occurred while loading your profile. Please try again.')
         return redirect(url_for('dashboard'))
 
+@app.route('/metrics')
+def metrics():
+    """Generation telemetry in the Prometheus text format, or JSON with ?format=json"""
+    token = app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return 'Unauthorized', 401
+    # Merge in the snapshots of worker processes, where most generation runs
+    collected = metrics_registry.collect()
+    if request.args.get('format') == 'json':
+        return jsonify(collected.to_dict())
+    return collected.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
@@ -0,0 +1,171 @@
+"""
+Adaptive batch sizing and max_tokens for AI generation calls
+How many questions to ask for per call, and how many completion tokens to
+allow, depends on how long a bucket's questions run: Biology one-liners fit
+twenty to a call, long JEE Mathematics items get cut off at ten. BatchTuner
+learns completion tokens per question, the truncation rate and the share of
+requested questions that parse of each (stream, subject, difficulty) from
+the calls it observes, and the model's time to first token and per-token time
+across all of them. From those it plans each bucket's batches: the batch size
+that delivers valid questions fastest with its share of the concurrency, and
+a max_tokens that covers the batch with headroom, within the model's output
+and context limits.
+
+Until a bucket has been seen WARMUP_CALLS times it gets the fixed
+BATCH_SIZE / MAX_TOKENS calls used before tuning.
+"""
+
+import math
+import threading
+
+BATCH_SIZE = 10  # Questions per call until a bucket has been observed
+MAX_TOKENS = 3000  # Completion tokens allowed per call until then
+WARMUP_CALLS = 2
+MIN_BATCH = 1
+MAX_BATCH = 20  # Longer lists drift from the format and repeat themselves
+FRAME_TOKENS = 60  # Separators and preamble around the questions
+HEADROOM = 1.2  # max_tokens over the expected tokens of a batch
+MAX_HEADROOM = 2.0
+TRUNCATION_STEP = 1.25  # Headroom grows this much after a truncated call...
+RELAX_STEP = 0.98  # ...and shrinks back towards HEADROOM after clean ones
+SMOOTHING = 0.3  # Weight of the newest observation in the moving averages
+SHORTER_FIRST = 1.05  # Prefer fewer calls unless more finish this much sooner
+HIGH_TRUNCATION = 0.3  # Above this truncation rate batches are capped below the sizes that were cut off
+
+# Context window and output limit (tokens); unknown models get the smallest
+MODEL_LIMITS = {
+    'gpt-3.5-turbo': (16385, 4096),
+    'gpt-4': (8192, 4096),
+    'gpt-4o-mini': (128000, 16384),
+    'gpt-4o': (128000, 16384),
+}
+DEFAULT_LIMITS = (8192, 4096)
+
+# Priors, until calls have been timed
+PROMPT_TOKENS = 900
+FIRST_TOKEN_SECONDS = 1.0
+SECONDS_PER_TOKEN = 0.01
+
+
+def fixed_plan(count):
+    """[(questions, max_tokens)] in BATCH_SIZE calls, as before tuning"""
+    return [(min(BATCH_SIZE, count - i), MAX_TOKENS) for i in range(0, count, BATCH_SIZE)]
+
+
+def _average(current, sample):
+    return sample if current is None else current + SMOOTHING * (sample - current)
+
+
+class _BucketStats:
+    """What the calls of one (stream, subject, difficulty) have shown"""
+
+    def __init__(self):
+        self.calls = 0
+        self.tokens_per_question = None
+        self.truncation_rate = 0.0
+        self.yield_rate = 1.0  # Valid questions parsed per question requested
+        self.batch_size = None  # Questions requested per call
+        self.headroom = HEADROOM
+
+    def valid_rate(self, size):
+        """Share of size requested questions expected to come back valid.
+
+        Cut-off calls are assumed to be the longer ones, so the truncation rate
+        seen at the usual batch size scales with the size asked for.
+        """
+        truncation = min(1.0, self.truncation_rate * size / self.batch_size) if self.batch_size else 0.0
+        return self.yield_rate * (1 - truncation)
+
+
+class BatchTuner:
+    """Learns from generation calls and plans the batches of a bucket.
+
+    plan() returns [(questions, max_tokens)] per call; observe() is fed the
+    outcome of every completed call.
+    """
+
+    def __init__(self, model, requests_per_minute=0):
+        self.context_window, self.max_output = MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+        self.call_interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self.prompt_tokens = PROMPT_TOKENS
+        self.first_token_seconds = FIRST_TOKEN_SECONDS
+        self.seconds_per_token = SECONDS_PER_TOKEN
+        self._buckets = {}  # (stream, subject, difficulty) -> _BucketStats
+        self._lock = threading.Lock()
+
+    def stats(self, key):
+        with self._lock:
+            return self._buckets.setdefault(key, _BucketStats())
+
+    def observe(self, key, requested, max_tokens, questions, completion_tokens, truncated, prompt_tokens=None,
+                first_token_seconds=None, seconds=None):
+        """Record a finished call: what it asked for, valid questions parsed, tokens billed,
+        whether it hit max_tokens"""
+        stats = self.stats(key)
+        with self._lock:
+            stats.calls += 1
+            # Cut off although max_tokens covered the estimate: the estimate needs more room
+            covered = (stats.tokens_per_question is not None
+                       and max_tokens - FRAME_TOKENS >= requested * stats.tokens_per_question)
+            if completion_tokens and (questions or truncated):
+                # A truncated call's partial question counts against the rest: errs long
+                stats.tokens_per_question = _average(stats.tokens_per_question,
+                                                     completion_tokens / max(1, questions))
+            stats.truncation_rate = _average(stats.truncation_rate, 1.0 if truncated else 0.0)
+            if requested:
+                stats.yield_rate = _average(stats.yield_rate, min(1.0, questions / requested))
+                stats.batch_size = _average(stats.batch_size, requested)
+            if truncated and covered:
+                stats.headroom = min(MAX_HEADROOM, stats.headroom * TRUNCATION_STEP)
+            elif not truncated:
+                stats.headroom = max(HEADROOM, stats.headroom * RELAX_STEP)
+            if prompt_tokens:
+                self.prompt_tokens = _average(self.prompt_tokens, prompt_tokens)
+            if first_token_seconds is not None:
+                self.first_token_seconds = _average(self.first_token_seconds, first_token_seconds)
+                if seconds is not None and completion_tokens:
+                    per_token = max(0.0, seconds - first_token_seconds) / completion_tokens
+                    self.seconds_per_token = _average(self.seconds_per_token, per_token)
+
+    def plan(self, key, count, concurrency=1):
+        """[(questions, max_tokens)] for the calls generating count questions.
+
+        concurrency is the share of the executor this bucket can expect.
+        """
+        if count <= 0:
+            return []
+        stats = self.stats(key)
+        if stats.calls < WARMUP_CALLS or stats.tokens_per_question is None:
+            return fixed_plan(count)
+
+        per_question = stats.tokens_per_question * stats.headroom
+        output_room = min(self.max_output, self.context_window - self.prompt_tokens) - FRAME_TOKENS
+        largest = max(MIN_BATCH, min(MAX_BATCH, count, int(output_room // per_question)))
+        if stats.truncation_rate > HIGH_TRUNCATION and stats.batch_size:
+            largest = max(MIN_BATCH, min(largest, int(stats.batch_size * (1 - stats.truncation_rate))))
+
+        best = None  # (batch size, expected seconds for count valid questions)
+        for size in range(largest, MIN_BATCH - 1, -1):
+            valid_rate = stats.valid_rate(size)
+            if valid_rate <= 0:
+                continue
+            seconds = self._expected_seconds(count, size, stats.tokens_per_question, concurrency) / valid_rate
+            if best is None or seconds * SHORTER_FIRST < best[1]:
+                best = (size, seconds)
+        if best is None:
+            best = (MIN_BATCH, None)
+
+        calls = math.ceil(count / best[0])
+        plan = []
+        for i in range(calls):
+            questions = count // calls + (1 if i < count % calls else 0)
+            max_tokens = min(self.max_output, math.ceil(questions * per_question) + FRAME_TOKENS)
+            plan.append((questions, max_tokens))
+        return plan
+
+    def _expected_seconds(self, count, size, tokens_per_question, concurrency):
+        """Time to generate count questions in calls of size, concurrency at a time"""
+        calls = math.ceil(count / size)
+        waves = math.ceil(calls / max(1, concurrency))
+        call_seconds = self.first_token_seconds + size * tokens_per_question * self.seconds_per_token
+        return max(waves * call_seconds, calls * self.call_interval)
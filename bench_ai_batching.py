@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark fixed against adaptive batch sizing and max_tokens
+
+Generates buckets of short questions (NEET Biology) and of long ones (JEE
+Mathematics, explanations padded to about 400 tokens) from the local OpenAI
+stub, which streams at a fixed token rate and cuts completions off at the
+request's max_tokens. Compares the fixed 10-question / 3000-token calls with
+the batch tuner after its warm-up. Reports valid questions per second, the
+share of calls cut off, and API calls per bucket.
+
+Usage:
+    python bench_ai_batching.py --runs 5
+"""
+
+import argparse
+import time
+from ai_question_generator import AIQuestionGenerator, TRUNCATED_CALLS
+from openai_stub import OpenAIStubServer
+
+BUCKETS = [('NEET', 'Biology', 'Easy'), ('JEE', 'Mathematics', 'Hard')]
+PADDING = {'Biology': 0, 'Mathematics': 1500}  # Extra explanation characters per question
+WARMUP_RUNS = 3
+
+
+def run(label, adaptive, runs, count, concurrency, token_rate):
+    with OpenAIStubServer(latency=0.3, padding=PADDING, token_rate=token_rate) as stub:
+        generator = AIQuestionGenerator(api_key='bench-key', base_url=stub.base_url, max_concurrency=concurrency,
+                                        hedge_percentile=0, adaptive_batches=adaptive)
+        generator.get_reference_content = lambda pdf_path, topic, batches: ['Reference text'] * batches
+        for stream, subject, difficulty in BUCKETS:
+            labels = {'stream': stream, 'subject': subject, 'difficulty': difficulty}
+            for _ in range(WARMUP_RUNS):
+                list(generator.iter_questions_for_buckets(stream, [(subject, difficulty, count)]))
+            requests = len(stub.requests)
+            truncated = TRUNCATED_CALLS.value(**labels)
+            questions = 0
+            start = time.monotonic()
+            for _ in range(runs):
+                questions += sum(1 for _ in generator.iter_questions_for_buckets(stream, [(subject, difficulty, count)]))
+            seconds = time.monotonic() - start
+            calls = len(stub.requests) - requests
+            print(f"{label:<9} | {subject:<12} | {questions / seconds:>11.1f} | {questions / runs:>9.1f} | "
+                  f"{(TRUNCATED_CALLS.value(**labels) - truncated) / calls:>8.0%} | {calls / runs:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='buckets generated per configuration')
+    parser.add_argument('--count', type=int, default=40, help='questions per bucket')
+    parser.add_argument('--concurrency', type=int, default=8, help='API calls in flight at once')
+    parser.add_argument('--token-rate', type=float, default=2000, help='tokens the stub streams per second')
+    args = parser.parse_args()
+
+    print(f"{args.runs} buckets of {args.count} questions, {args.concurrency} calls at a time, "
+          f"{args.token_rate:.0f} tokens/s\n")
+    print(f"{'batching':<9} | {'subject':<12} | {'questions/s':>11} | {'questions':>9} | {'cut off':>8} | "
+          f"{'calls':>9}")
+    print('-' * 72)
+    run('fixed', False, args.runs, args.count, args.concurrency, args.token_rate)
+    run('adaptive', True, args.runs, args.count, args.concurrency, args.token_rate)
+
+
+if __name__ == '__main__':
+    main()
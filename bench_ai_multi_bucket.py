@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Benchmark multi-bucket generation: one call per subject instead of one per difficulty
+
+Generates whole papers (generate_test_questions, NEET and JEE, initial and
+adaptive) from the local OpenAI stub, which answers after a fixed latency
+and streams at a fixed token rate. Compares a call per (subject,
+difficulty) with calls covering a subject's difficulties together, without
+and with a request rate limit. Reports API calls and prompt tokens per paper,
+seconds per paper and questions per paper.
+
+Usage:
+    python bench_ai_multi_bucket.py --papers 4
+"""
+
+import argparse
+import statistics
+import time
+from ai_question_generator import AIQuestionGenerator
+from openai_stub import OpenAIStubServer
+
+PAPERS = [('NEET', 'initial'), ('NEET', 'adaptive'), ('JEE', 'initial'), ('JEE', 'adaptive')]
+QUESTIONS_PER_PAPER = 30
+
+
+def run(label, multi_bucket, papers, requests_per_minute, token_rate):
+    with OpenAIStubServer(latency=0.3, token_rate=token_rate) as stub:
+        generator = AIQuestionGenerator(api_key='bench-key', base_url=stub.base_url, max_concurrency=8,
+                                        hedge_percentile=0, requests_per_minute=requests_per_minute,
+                                        multi_bucket=multi_bucket)
+        generator.get_reference_content = lambda pdf_path, topic, batches: [
+            f'{pdf_path} reference section {i} ' * 40 for i in range(batches)
+        ]
+        seconds = []
+        questions = 0
+        for i in range(papers):
+            stream, test_type = PAPERS[i % len(PAPERS)]
+            start = time.monotonic()
+            questions += len(generator.generate_test_questions(stream, test_type, QUESTIONS_PER_PAPER))
+            seconds.append(time.monotonic() - start)
+        prompt_tokens = sum(len(request['messages'][-1]['content']) // 4 for request in stub.requests)
+
+    print(f"{label:<24} | {len(stub.requests) / papers:>5.1f} | {prompt_tokens / papers:>13.0f} | "
+          f"{statistics.mean(seconds):>7.2f} | {questions / papers:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--papers', type=int, default=4, help='papers per configuration')
+    parser.add_argument('--requests-per-minute', type=float, default=120, help='rate limit of the last two runs')
+    parser.add_argument('--token-rate', type=float, default=2000, help='tokens the stub streams per second')
+    args = parser.parse_args()
+
+    print(f"{args.papers} papers of {QUESTIONS_PER_PAPER} questions, 8 calls at a time, "
+          f"{args.token_rate:.0f} tokens/s\n")
+    print(f"{'calls':<24} | {'calls':>5} | {'prompt tokens':>13} | {'s/paper':>7} | {'questions':>9}")
+    print('-' * 72)
+    run('per difficulty', False, args.papers, 0, args.token_rate)
+    run('multi-bucket', True, args.papers, 0, args.token_rate)
+    limit = f'{args.requests_per_minute:.0f}/min'
+    run(f'per difficulty, {limit}', False, args.papers, args.requests_per_minute, args.token_rate)
+    run(f'multi-bucket, {limit}', True, args.papers, args.requests_per_minute, args.token_rate)
+
+
+if __name__ == '__main__':
+    main()
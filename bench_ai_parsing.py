@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark AI response parsing: throughput and yield
+
+Builds a corpus of responses shaped like chat model output - well-formed ones
+in the prompted format, ones that drift from it (markdown emphasis, '(A)' or
+'a.' labels, answers as 'Option C' or option text, headers without
+separators, answers only in the explanation) and ones cut off by max_tokens -
+plus structured-output responses. Compares the original split/startswith
+parser with the compiled state machine, and the JSON parser on its corpus.
+Yield is valid questions per response; every response holds 10 questions.
+
+Usage:
+    python bench_ai_parsing.py --responses 2000
+"""
+
+import argparse
+import json
+import random
+import time
+from question_parser import parse_response
+
+QUESTIONS_PER_RESPONSE = 10
+STEMS = ['A body of mass {n} kg is moving with uniform velocity. What is the net force on it?',
+         'Which of the following statements about enzyme {n} is correct?',
+         'The hybridization of the central atom in compound {n} is',
+         'If f(x) = x^{n} + 1, the derivative at x = 1 is']
+OPTIONS = ['Zero', 'Equal to its weight', 'sp3', 'It is denatured above 40 C', '{n} N', 'Cannot be determined']
+
+
+def legacy_parse(response_text, subject='Physics', stream='NEET', difficulty='Easy'):
+    """The original parser: split on '---', then a startswith chain per line"""
+    questions = []
+    for block in response_text.split('---'):
+        if not block.strip() or 'QUESTION' not in block:
+            continue
+        try:
+            lines = block.strip().split('\n')
+            question_text = ""
+            options = {'A': '', 'B': '', 'C': '', 'D': ''}
+            correct_answer = ""
+            explanation = ""
+            topic = "General"
+            chapter = "General"
+            for line in lines:
+                line = line.strip()
+                if line.startswith('QUESTION'):
+                    continue
+                elif line.startswith('A)'):
+                    options['A'] = line[2:].strip()
+                elif line.startswith('B)'):
+                    options['B'] = line[2:].strip()
+                elif line.startswith('C)'):
+                    options['C'] = line[2:].strip()
+                elif line.startswith('D)'):
+                    options['D'] = line[2:].strip()
+                elif line.startswith('ANSWER:'):
+                    correct_answer = line.replace('ANSWER:', '').strip()
+                elif line.startswith('EXPLANATION:'):
+                    explanation = line.replace('EXPLANATION:', '').strip()
+                elif line.startswith('TOPIC:'):
+                    topic = line.replace('TOPIC:', '').strip()
+                elif line.startswith('CHAPTER:'):
+                    chapter = line.replace('CHAPTER:', '').strip()
+                elif not any(line.startswith(x) for x in ['A)', 'B)', 'C)', 'D)', 'ANSWER', 'EXPLANATION', 'TOPIC', 'CHAPTER']):
+                    question_text = question_text + " " + line if question_text else line
+            if question_text and all(options.values()) and correct_answer:
+                questions.append({
+                    'subject': subject, 'chapter': chapter, 'topic': topic, 'difficulty': difficulty,
+                    'question_text': question_text, 'option_a': options['A'], 'option_b': options['B'],
+                    'option_c': options['C'], 'option_d': options['D'],
+                    'correct_answer': correct_answer.upper()[0], 'explanation': explanation, 'stream': stream
+                })
+        except Exception:
+            continue
+    return questions
+
+
+def make_question(rng, n):
+    options = [option.format(n=n) for option in rng.sample(OPTIONS, 4)]
+    return {
+        'question': rng.choice(STEMS).format(n=n),
+        'options': dict(zip('ABCD', options)),
+        'answer': rng.choice('ABCD'),
+        'explanation': f'Working through case {n} gives the stated option.',
+        'topic': 'Topic %d' % (n % 7),
+        'chapter': 'Chapter %d' % (n % 5)
+    }
+
+
+def well_formed_block(q, number):
+    return (f"QUESTION {number}:\n{q['question']}\n"
+            + ''.join(f"{letter}) {text}\n" for letter, text in q['options'].items())
+            + f"ANSWER: {q['answer']}\nEXPLANATION: {q['explanation']}\n"
+            f"TOPIC: {q['topic']}\nCHAPTER: {q['chapter']}")
+
+
+def drifted_block(q, number, rng):
+    """One block with a random mix of the deviations chat models make"""
+    header = rng.choice([f"QUESTION {number}:\n{q['question']}", f"**Question {number}:** {q['question']}",
+                         f"{number}. {q['question']}", f"Q{number}. {q['question']}"])
+    label = rng.choice(['{}) ', '({}) ', '{}. ', '{}) '])
+    lower = rng.random() < 0.3
+    options = ''.join(label.format(letter.lower() if lower else letter) + text + '\n'
+                      for letter, text in q['options'].items())
+    answer = rng.choice([f"ANSWER: {q['answer']}", f"**Answer:** ({q['answer']})",
+                         f"Correct Answer: Option {q['answer']}", f"ANSWER: {q['options'][q['answer']]}",
+                         None])
+    explanation = q['explanation'] + rng.choice(['', '\nThis follows from the definition.'])
+    if answer is None:
+        explanation += f" The correct answer is {q['answer']}."
+    lines = [header, options.rstrip('\n')]
+    if answer:
+        lines.append(answer)
+    lines.append(rng.choice(['EXPLANATION: ', '**Explanation:** ', 'Solution: ']) + explanation)
+    lines.append(f"TOPIC: {q['topic']}\nCHAPTER: {q['chapter']}")
+    return '\n'.join(lines)
+
+
+def build_corpus(responses, seed=0):
+    rng = random.Random(seed)
+    corpus = {'well-formed': [], 'drifted': [], 'truncated': [], 'json': [], 'json truncated': []}
+    n = 0
+    for _ in range(responses):
+        questions = [make_question(rng, n + i) for i in range(QUESTIONS_PER_RESPONSE)]
+        n += QUESTIONS_PER_RESPONSE
+
+        blocks = [well_formed_block(q, i) for i, q in enumerate(questions, 1)]
+        text = '---\n' + '\n---\n'.join(blocks) + '\n---'
+        corpus['well-formed'].append(text)
+        corpus['truncated'].append(text[:rng.randrange(len(text) // 2, len(text))])
+
+        drifted = [drifted_block(q, i, rng) for i, q in enumerate(questions, 1)]
+        separator = rng.choice(['\n---\n', '\n\n'])
+        corpus['drifted'].append('Here are the questions you asked for.\n\n' + separator.join(drifted)
+                                 + '\n\nLet me know if you need more.')
+
+        payload = json.dumps({'questions': questions}, indent=1)
+        corpus['json'].append(payload)
+        corpus['json truncated'].append(payload[:rng.randrange(len(payload) // 2, len(payload))])
+    return corpus
+
+
+def measure(parse, texts):
+    start = time.perf_counter()
+    questions = sum(len(parse(text)) for text in texts)
+    seconds = time.perf_counter() - start
+    megabytes = sum(len(text) for text in texts) / 1e6
+    return len(texts) / seconds, megabytes / seconds, questions / len(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--responses', type=int, default=2000, help='responses per corpus')
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.responses)
+    parsers = {
+        'legacy': legacy_parse,
+        'state machine': lambda text: parse_response(text, 'Physics', 'NEET', 'Easy'),
+        'json': lambda text: parse_response(text, 'Physics', 'NEET', 'Easy', mode='json'),
+    }
+    runs = [('well-formed', 'legacy'), ('well-formed', 'state machine'),
+            ('drifted', 'legacy'), ('drifted', 'state machine'),
+            ('truncated', 'legacy'), ('truncated', 'state machine'),
+            ('json', 'json'), ('json truncated', 'json')]
+
+    print(f"{args.responses} responses per corpus, {QUESTIONS_PER_RESPONSE} questions each\n")
+    print(f"{'corpus':<15} | {'parser':<13} | {'responses/s':>11} | {'MB/s':>6} | {'yield':>5}")
+    print('-' * 64)
+    for corpus_name, parser_name in runs:
+        per_second, mb_per_second, yield_ = measure(parsers[parser_name], corpus[corpus_name])
+        print(f"{corpus_name:<15} | {parser_name:<13} | {per_second:>11.0f} | {mb_per_second:>6.1f} | {yield_:>5.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark the generation pipeline offline from a recorded cassette
+
+Runs generate_test_questions - fan-out, streaming, parsing - with every API
+call answered by a CassetteTransport, so no API key or network is needed and
+each run sends the same responses. Without an existing cassette one is
+recorded first from the local stub server (or from the real API with
+--record-live). Replays with the recorded timing and with zero latency, which
+isolates the pipeline's own overhead. Reports seconds per test and questions
+per second.
+
+Usage:
+    python bench_ai_pipeline.py --tests 20
+    python bench_ai_pipeline.py --cassette data/cassettes/live.jsonl.gz --record-live
+"""
+
+import argparse
+import os
+import statistics
+import time
+from ai_question_generator import AIQuestionGenerator
+from llm_cassette import CassetteTransport
+from openai_stub import OpenAIStubServer
+
+DEFAULT_CASSETTE = os.path.join('data', 'cassettes', 'bench_pipeline.jsonl.gz')
+STREAMS = ['NEET', 'JEE']
+TEST_TYPES = ['initial', 'adaptive']
+QUESTIONS_PER_TEST = 30
+
+
+def make_generator(transport, base_url=None, api_key=None):
+    generator = AIQuestionGenerator(api_key=api_key, base_url=base_url, max_concurrency=8, hedge_percentile=0,
+                                    transport=transport)
+    # Fixed reference text, so prompts (and cassette keys) are the same on every run
+    generator.get_reference_content = lambda pdf_path, topic, batches: [
+        f'{pdf_path} reference section {i}' for i in range(batches)
+    ]
+    return generator
+
+
+def run_tests(generator):
+    return sum(len(generator.generate_test_questions(stream, test_type, QUESTIONS_PER_TEST))
+               for stream in STREAMS for test_type in TEST_TYPES)
+
+
+def record(path, live):
+    transport = CassetteTransport(path, mode='record')
+    if live:
+        run_tests(make_generator(transport))
+        return
+    # A little latency per call and between question blocks, for realistic timing
+    with OpenAIStubServer(latency=0.2, stream_delay=0.02) as stub:
+        run_tests(make_generator(transport, stub.base_url, api_key='bench-key'))
+
+
+def replay(label, path, tests, latency):
+    transport = CassetteTransport(path, latency=latency)
+    generator = make_generator(transport)
+    seconds = []
+    questions = 0
+    for _ in range(tests):
+        start = time.monotonic()
+        questions += run_tests(generator)
+        seconds.append((time.monotonic() - start) / (len(STREAMS) * len(TEST_TYPES)))
+    print(f"{label:<18} | {statistics.mean(seconds):>7.3f} | {max(seconds):>7.3f} | "
+          f"{questions / sum(seconds) / (len(STREAMS) * len(TEST_TYPES)):>10.0f} | {transport.misses:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tests', type=int, default=10, help='replays of the four test types')
+    parser.add_argument('--cassette', default=DEFAULT_CASSETTE, help='cassette to replay, recorded if missing')
+    parser.add_argument('--record-live', action='store_true', help='record from the real API (needs OPENAI_API_KEY)')
+    args = parser.parse_args()
+
+    if args.record_live or not os.path.exists(args.cassette):
+        print(f"Recording {args.cassette} from {'the API' if args.record_live else 'the local stub'}...")
+        record(args.cassette, args.record_live)
+
+    print(f"\n{args.tests} replays of {len(STREAMS) * len(TEST_TYPES)} tests of {QUESTIONS_PER_TEST} questions\n")
+    print(f"{'timing':<18} | {'s/test':>7} | {'max s':>7} | {'questions/s':>10} | {'misses':>6}")
+    print('-' * 60)
+    replay('recorded', args.cassette, args.tests, None)
+    replay('zero latency', args.cassette, args.tests, 0)
+
+
+if __name__ == '__main__':
+    main()
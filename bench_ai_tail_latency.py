@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark test-start latency against a heavy-tailed API: hedging and deadlines
+
+Runs repeated three-bucket fan-outs (like one adaptive test) against the local
+OpenAI stub, where most calls are fast but a few stall for seconds. Compares
+plain fan-out, hedged requests, and hedged requests with a deadline. Reports
+latency percentiles, questions obtained (the rest would come from the
+database) and API requests per fan-out.
+
+Usage:
+    python bench_ai_tail_latency.py --runs 100
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from ai_question_generator import AIQuestionGenerator
+from openai_stub import OpenAIStubServer
+
+BUCKETS = [('Physics', 'Medium', 10), ('Chemistry', 'Medium', 10), ('Biology', 'Medium', 10)]
+WARMUP_RUNS = 10
+
+
+def heavy_tailed(stub, seed, slow_fraction, slow_seconds):
+    """Delay a random slow_fraction of requests by slow_seconds, the rest by 50-150 ms"""
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    complete = stub.complete
+
+    def delayed_complete(body, number=0):
+        with lock:
+            delay = slow_seconds if rng.random() < slow_fraction else rng.uniform(0.05, 0.15)
+        time.sleep(delay)
+        return complete(body, number)
+    stub.complete = delayed_complete
+
+
+def run(label, runs, hedge_percentile, deadline, slow_fraction, slow_seconds):
+    with OpenAIStubServer() as stub:
+        heavy_tailed(stub, 0, slow_fraction, slow_seconds)
+        generator = AIQuestionGenerator(api_key='bench-key', base_url=stub.base_url, max_concurrency=16,
+                                        hedge_percentile=hedge_percentile)
+        generator.get_reference_content = lambda pdf_path, topic, batches: ['Reference text'] * batches
+        # Untimed warm-up, so the hedge delay comes from observed latencies
+        for _ in range(WARMUP_RUNS):
+            generator.generate_questions_for_buckets('NEET', BUCKETS, deadline=deadline)
+        warmup_requests = len(stub.requests)
+        latencies = []
+        obtained = []
+        for _ in range(runs):
+            start = time.monotonic()
+            results = generator.generate_questions_for_buckets('NEET', BUCKETS, deadline=deadline)
+            latencies.append(time.monotonic() - start)
+            obtained.append(sum(len(questions) for questions in results.values()))
+        requests = (len(stub.requests) - warmup_requests) / runs
+
+    cuts = statistics.quantiles(latencies, n=100)
+    print(f"{label:<20} | {cuts[49]:>6.2f} | {cuts[94]:>6.2f} | {cuts[98]:>6.2f} | {max(latencies):>6.2f} | "
+          f"{statistics.mean(obtained):>9.1f} | {requests:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=100, help='fan-outs per configuration')
+    parser.add_argument('--slow-fraction', type=float, default=0.03, help='share of calls that stall')
+    parser.add_argument('--slow-seconds', type=float, default=3.0, help='how long a stalled call takes')
+    parser.add_argument('--deadline', type=float, default=1.0, help='deadline for the last configuration')
+    args = parser.parse_args()
+
+    print(f"{args.runs} fan-outs of {len(BUCKETS)} batches; {args.slow_fraction:.0%} of calls stall "
+          f"for {args.slow_seconds}s\n")
+    print(f"{'configuration':<20} | {'p50 s':>6} | {'p95 s':>6} | {'p99 s':>6} | {'max s':>6} | "
+          f"{'questions':>9} | {'requests':>8}")
+    print('-' * 80)
+    tail = (args.slow_fraction, args.slow_seconds)
+    run('plain', args.runs, 0, None, *tail)
+    run('hedged (p95)', args.runs, 95, None, *tail)
+    run(f'hedged + {args.deadline:g}s limit', args.runs, 95, args.deadline, *tail)
+
+
+if __name__ == '__main__':
+    main()
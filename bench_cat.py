@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Simulate level classification: fixed initial test vs computerized adaptive test
+
+Simulated students with a known ability answer according to the Rasch model.
+The fixed test uses the initial test's 6/9/9 Easy/Medium/Hard mix and 60%/80%
+score thresholds; the CAT uses cat_engine's selection and stopping rules with
+an unlimited bank. Reports classification accuracy against the true level and
+the number of questions asked.
+
+Usage:
+    python bench_cat.py --students 5000
+"""
+
+import argparse
+import random
+import statistics
+from cat_engine import (CATSession, difficulty_parameter, level_for_ability,
+                        nearest_difficulty, probability_correct, selection_target)
+
+FIXED_TEST_MIX = ['Easy'] * 6 + ['Medium'] * 9 + ['Hard'] * 9
+
+
+def answer(theta, difficulty, rng):
+    return rng.random() < probability_correct(theta, difficulty_parameter(difficulty))
+
+
+def fixed_test_level(theta, rng):
+    correct = sum(answer(theta, difficulty, rng) for difficulty in FIXED_TEST_MIX)
+    fraction = correct / len(FIXED_TEST_MIX)
+    if fraction >= 0.8:
+        return 'Advanced', len(FIXED_TEST_MIX)
+    if fraction >= 0.6:
+        return 'Intermediate', len(FIXED_TEST_MIX)
+    return 'Beginner', len(FIXED_TEST_MIX)
+
+
+def cat_level(theta, rng, **options):
+    cat = CATSession('NEET', ['Physics', 'Chemistry', 'Biology'], **options)
+    while not cat.is_finished():
+        difficulty = nearest_difficulty(selection_target(cat.ability()[0]))
+        cat.responses.append([len(cat.responses), 'Physics', difficulty, answer(theta, difficulty, rng)])
+    return level_for_ability(cat.ability()[0]), len(cat.responses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    abilities = [rng.gauss(0.8, 1.0) for _ in range(args.students)]
+
+    for name, run in [('fixed 24-question test', fixed_test_level), ('adaptive (CAT)', cat_level)]:
+        hits = 0
+        lengths = []
+        for theta in abilities:
+            level, length = run(theta, rng)
+            hits += level == level_for_ability(theta)
+            lengths.append(length)
+        print(f"{name:<24} accuracy {hits / len(abilities):6.1%}   "
+              f"questions mean {statistics.mean(lengths):5.1f}  max {max(lengths)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark full paper assembly latency against question bank size
+
+Compares the old per-bucket path (load every row of a bucket, shuffle in Python),
+the pool index path (sample ids in memory, one IN query) and the windowed SQL
+path (one ROW_NUMBER() OVER (PARTITION BY subject, difficulty) statement).
+
+Usage:
+    python bench_paper_assembly.py
+    python bench_paper_assembly.py --sizes 10000 100000 1000000 --repeats 30
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from flask import Flask
+from models import db, Question
+from question_pool import question_pool
+from paper_assembly import assemble_paper, assemble_paper_windowed, build_blueprint
+
+STREAMS = {
+    'NEET': ['Physics', 'Chemistry', 'Biology'],
+    'JEE': ['Physics', 'Chemistry', 'Mathematics']
+}
+NEET_DISTRIBUTION = {'Physics': 45, 'Chemistry': 45, 'Biology': 90}
+
+
+def create_bank(db_path, size):
+    """Create a question table holding `size` synthetic questions"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    buckets = [(stream, subject, difficulty)
+               for stream, subjects in STREAMS.items()
+               for subject in subjects
+               for difficulty in ('Easy', 'Medium', 'Hard')]
+
+    conn = sqlite3.connect(db_path)
+    rows = []
+    for i in range(size):
+        stream, subject, difficulty = buckets[i % len(buckets)]
+        rows.append((subject, f'Chapter {i % 20}', f'Topic {i % 50}', difficulty,
+                     f'Synthetic question {i} ' + 'x' * 120, 'A', 'B', 'C', 'D', 'A',
+                     'Synthetic explanation ' + 'y' * 80, stream))
+        if len(rows) == 50000:
+            _insert(conn, rows)
+            rows = []
+    if rows:
+        _insert(conn, rows)
+    conn.commit()
+    conn.close()
+    return app
+
+
+def _insert(conn, rows):
+    conn.executemany(
+        'INSERT INTO question (subject, chapter, topic, difficulty, question_text, option_a, '
+        'option_b, option_c, option_d, correct_answer, explanation, stream) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows
+    )
+
+
+def assemble_per_bucket(stream, blueprint):
+    """The original approach: one query per bucket loading the whole bucket"""
+    selected = []
+    used_ids = set()
+    for subject, difficulty, count in blueprint:
+        questions = Question.query.filter_by(subject=subject, stream=stream, difficulty=difficulty).all()
+        random.shuffle(questions)
+        for q in questions[:count]:
+            if q.id not in used_ids:
+                selected.append(q)
+                used_ids.add(q.id)
+    return selected
+
+
+def measure(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+        db.session.expunge_all()
+    timings.sort()
+    p99_index = min(len(timings) - 1, int(round(0.99 * (len(timings) - 1))))
+    return statistics.median(timings), timings[p99_index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--legacy-repeats', type=int, default=3,
+                        help='repeats for the slow per-bucket path')
+    args = parser.parse_args()
+
+    blueprint = build_blueprint(NEET_DISTRIBUTION)
+    print(f"NEET full paper blueprint: {sum(c for _, _, c in blueprint)} questions in {len(blueprint)} buckets\n")
+    print(f"{'bank size':>10} | {'method':<12} | {'p50 ms':>9} | {'p99 ms':>9}")
+    print('-' * 50)
+
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'bench.db')
+            app = create_bank(db_path, size)
+            with app.app_context():
+                question_pool.invalidate()
+                start = time.perf_counter()
+                question_pool.count('NEET', 'Physics')
+                build_ms = (time.perf_counter() - start) * 1000
+
+                results = [
+                    ('per-bucket', measure(lambda: assemble_per_bucket('NEET', blueprint), args.legacy_repeats)),
+                    ('pool index', measure(lambda: assemble_paper('NEET', blueprint), args.repeats)),
+                    ('windowed', measure(lambda: assemble_paper_windowed('NEET', blueprint), args.repeats)),
+                ]
+                for method, (p50, p99) in results:
+                    print(f"{size:>10} | {method:<12} | {p50:>9.2f} | {p99:>9.2f}")
+                print(f"{'':>10} | {'index build':<12} | {build_ms:>9.2f} | {'(once)':>9}")
+                db.session.remove()
+        question_pool.invalidate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark for parallel PDF page extraction
+Writes a multi-hundred-page text PDF, then reports pages per second of
+pdf_extraction.iter_page_texts for each worker count.
+
+    python bench_pdf_extraction.py --pages 400 --workers 1 2 4
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from pdf_extraction import iter_page_texts, page_count
+
+WORDS = ['velocity', 'acceleration', 'momentum', 'enzyme', 'mitosis', 'photosynthesis',
+         'equilibrium', 'oxidation', 'integral', 'derivative', 'matrix', 'vector',
+         'electron', 'isotope', 'refraction', 'resistance', 'capacitor', 'genome']
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_sample_pdf(path, pages=300, lines_per_page=40, seed=0):
+    """Write a plain text PDF (Helvetica, one question-like line per row)"""
+    rng = random.Random(seed)
+    objects = [None, None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    kids = []
+    for number in range(pages):
+        lines = [f"Q{number + 1}.{row + 1} " + ' '.join(rng.choice(WORDS) for _ in range(9))
+                 for row in range(lines_per_page)]
+        data = ('BT /F1 10 Tf 14 TL 40 800 Td '
+                + ' '.join(f'({_escape(line)}) Tj T*' for line in lines)
+                + ' ET').encode('latin-1')
+        content = add(b'<< /Length %d >>\nstream\n' % len(data) + data + b'\nendstream')
+        kids.append(add(
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content} 0 R >>'.encode()
+        ))
+
+    objects[0] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(f"{kid} 0 R" for kid in kids)}] /Count {len(kids)} >>'.encode()
+
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b'%010d 00000 n \n' % offset)
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return path
+
+
+def measure(pdf_path, workers, max_pages):
+    start = time.perf_counter()
+    first = None
+    pages = 0
+    for _ in iter_page_texts(pdf_path, max_pages=max_pages, workers=workers):
+        if first is None:
+            first = time.perf_counter() - start
+        pages += 1
+    return pages, time.perf_counter() - start, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark parallel PDF page extraction')
+    parser.add_argument('--pages', type=int, default=400)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--max-pages', type=int, default=None, help='window size (default: whole PDF)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = write_sample_pdf(os.path.join(tmp, 'bank.pdf'), pages=args.pages)
+        print(f"Sample PDF: {page_count(pdf_path)} pages, {os.path.getsize(pdf_path) / 1e6:.1f} MB, {os.cpu_count()} CPUs\n")
+        print(f"{'workers':>8} {'pages':>6} {'seconds':>8} {'pages/s':>8} {'first page ms':>14}")
+        for workers in args.workers:
+            measure(pdf_path, workers, 2 * 8 * workers)  # Start the pool outside the timing
+            pages, seconds, first = measure(pdf_path, workers, args.max_pages)
+            print(f"{workers:>8} {pages:>6} {seconds:>8.2f} {pages / seconds:>8.1f} {first * 1000:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark near-duplicate detection: LSH index vs pairwise comparison
+
+Builds a bank of distinct synthetic questions, then checks a stream of new
+questions against it - half of them rewordings of bank questions (changed
+wording, case and punctuation, reordered options), half new. Compares the
+MinHash/LSH index with an exact Jaccard scan over the bank's feature sets.
+Reports time per check and how many rewordings each method flags.
+
+Usage:
+    python bench_question_dedup.py --bank 5000 --checks 1000
+"""
+
+import argparse
+import random
+import time
+from question_dedup import NearDuplicateIndex, THRESHOLD, normalize, shingles
+
+STEMS = ['Which of the following statements about the {} is correct?',
+         'What is the primary function of the {} in this system?',
+         'Which property of the {} explains the observed behaviour?',
+         'Identify the incorrect statement regarding the {} given below.',
+         'The {} is best described as',
+         'Why does the {} change when heated?',
+         'Match the {} with its characteristic.',
+         'Assertion: the {} is stable. Reason: it has a closed structure.',
+         'Which of these is not a feature of the {}?',
+         'How many distinct forms of the {} are possible?',
+         'Select the correct order of steps involving the {}.',
+         'In which case is the {} fully consumed?']
+QUALIFIERS = ['in a living cell', 'at room temperature', 'in an ideal circuit', 'under standard conditions',
+              'in the given diagram', 'during the reaction', 'in equilibrium', 'in the human body']
+WORDS = ['energy', 'charge', 'membrane', 'bond', 'field', 'pressure', 'current', 'protein', 'acid', 'wave']
+
+
+def vocabulary(rng, size=2000):
+    """Made-up words standing in for the terms that make questions differ"""
+    return [''.join(rng.choice('bcdfghklmnprstvz') + rng.choice('aeiou') for _ in range(rng.randint(2, 4)))
+            for _ in range(size)]
+
+
+def make_question(rng, vocab):
+    term = ' '.join(rng.sample(vocab, 2))
+    detail = ' '.join(rng.sample(vocab, 6))
+    text = f'{rng.choice(STEMS).format(term)} Consider the {detail} {rng.choice(QUALIFIERS)}.'
+    options = [' '.join(rng.sample(WORDS, 3)) for _ in range(4)]
+    q_data = {'stream': 'NEET', 'subject': 'Biology', 'question_text': text}
+    q_data.update({f'option_{letter}': option for letter, option in zip('abcd', options)})
+    return q_data
+
+
+def reword(q_data, rng):
+    text = q_data['question_text'].replace('Which of the following', 'Which one of the following')
+    text = text.replace('What is', "What's").replace('.', ' .')
+    options = [q_data[f'option_{letter}'] for letter in 'abcd']
+    rng.shuffle(options)
+    copy = dict(q_data, question_text=text.upper() if rng.random() < 0.5 else text)
+    copy.update({f'option_{letter}': option for letter, option in zip('abcd', options)})
+    return copy
+
+
+def features(q_data):
+    result = shingles(q_data['question_text'])
+    result.update(f"option:{normalize(q_data[f'option_{letter}'])}" for letter in 'abcd')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bank', type=int, default=5000, help='questions in the bank')
+    parser.add_argument('--checks', type=int, default=1000, help='new questions checked')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocab = vocabulary(rng)
+    bank = []
+    seen = set()
+    while len(bank) < args.bank:
+        q_data = make_question(rng, vocab)
+        key = (q_data['question_text'], tuple(q_data[f'option_{letter}'] for letter in 'abcd'))
+        if key not in seen:
+            seen.add(key)
+            bank.append(q_data)
+    checks = [reword(rng.choice(bank), rng) if i % 2 == 0 else make_question(rng, vocab) for i in range(args.checks)]
+
+    index = NearDuplicateIndex()
+    start = time.perf_counter()
+    for i, q_data in enumerate(bank):
+        index.add(i, q_data)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lsh_flags = sum(index.find(q_data) is not None for q_data in checks[0::2])
+    lsh_new_flags = sum(index.find(q_data) is not None for q_data in checks[1::2])
+    lsh_ms = (time.perf_counter() - start) * 1000 / len(checks)
+
+    bank_features = [features(q_data) for q_data in bank]
+    scanned = checks[:min(len(checks), 200)]  # The scan is slow; time a sample
+    start = time.perf_counter()
+    scan_results = []
+    for q_data in scanned:
+        wanted = features(q_data)
+        scan_results.append(any(len(wanted & other) / len(wanted | other) >= THRESHOLD for other in bank_features))
+    scan_ms = (time.perf_counter() - start) * 1000 / len(scanned)
+    scan_flags = sum(scan_results[0::2])
+
+    print(f"Bank of {args.bank} questions, {args.checks} checks (half rewordings of bank questions)\n")
+    print(f"LSH index build: {build_seconds * 1000:.0f} ms ({build_seconds * 1e6 / args.bank:.0f} us/question)")
+    print(f"{'method':<14} | {'ms/check':>8} | {'rewordings flagged':>18} | {'new flagged':>11}")
+    print('-' * 62)
+    print(f"{'LSH index':<14} | {lsh_ms:>8.3f} | {lsh_flags / len(checks[0::2]):>18.1%} | "
+          f"{lsh_new_flags / len(checks[1::2]):>11.1%}")
+    print(f"{'pairwise scan':<14} | {scan_ms:>8.3f} | {scan_flags / len(scanned[0::2]):>18.1%} | "
+          f"{sum(scan_results[1::2]) / len(scanned[1::2]):>11.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Offline bulk question generation
+Fills the question bank ahead of exam season from a target matrix of
+(stream, subject, difficulty, topic) cells, each with a number of new
+questions wanted. Every cell of a (stream, topic) fans out concurrently on the
+generator, under its requests-per-minute limit, and questions are saved to the
+bank (with dedup) as they stream in. Progress is checkpointed to a JSON file
+after every save, so an interrupted run resumes where it stopped.
+
+Usage:
+    python bulk_generate.py --count 500 --requests-per-minute 300
+    python bulk_generate.py --matrix matrix.json --checkpoint data/exam_season.json
+    OPENAI_API_KEY=stub python bulk_generate.py --base-url http://127.0.0.1:8001/v1 --count 20
+"""
+
+import argparse
+import json
+import os
+from collections import defaultdict
+from sqlalchemy import func
+from models import db, Question
+from question_bank import save_generated_questions
+from question_inventory import ANY_TOPIC, STREAM_SUBJECTS
+from question_pool import DIFFICULTIES
+
+DEFAULT_CHECKPOINT = os.path.join('data', 'bulk_generation.json')
+ROUND_SIZE = 200  # Most questions asked for per cell in one fan-out
+SAVE_EVERY = 10  # Questions of a cell buffered before they are written to the bank
+REQUEST_BUDGET = 3  # A cell gives up after asking for this many times its count
+
+
+def build_matrix(streams=None, subjects=None, difficulties=None, topics=None, count=100):
+    """{(stream, subject, difficulty, topic): count} for every combination.
+
+    Subjects default to each stream's own; topics to ANY_TOPIC.
+    """
+    matrix = {}
+    for stream in streams or STREAM_SUBJECTS:
+        for subject in subjects or STREAM_SUBJECTS[stream]:
+            for difficulty in difficulties or DIFFICULTIES:
+                for topic in topics or [ANY_TOPIC]:
+                    matrix[(stream, subject, difficulty, topic)] = count
+    return matrix
+
+
+def load_matrix(path):
+    """Read a matrix from a JSON list of {stream, subject, difficulty, topic, count}"""
+    with open(path) as f:
+        cells = json.load(f)
+    matrix = {}
+    for cell in cells:
+        key = (cell['stream'], cell['subject'], cell['difficulty'], cell.get('topic') or ANY_TOPIC)
+        matrix[key] = matrix.get(key, 0) + int(cell['count'])
+    return matrix
+
+
+class Checkpoint:
+    """Per-cell progress of a bulk run, kept in a JSON file.
+
+    Each cell records the questions asked for, the new questions saved and
+    the duplicates dropped. save() writes a temporary file and renames it over
+    the old one, so a crash never leaves a truncated checkpoint.
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT):
+        self.path = path
+        self.cells = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.cells = json.load(f).get('cells', {})
+
+    @staticmethod
+    def key(cell):
+        return '|'.join(cell)
+
+    def cell(self, cell):
+        return self.cells.setdefault(self.key(cell), {'requested': 0, 'saved': 0, 'duplicates': 0})
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f'{self.path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'cells': self.cells}, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+def bulk_generate(generator, matrix, checkpoint, round_size=ROUND_SIZE):
+    """Generate until every cell of the matrix has its count of new questions.
+
+    Runs rounds of one fan-out per (stream, topic), each asking for what its
+    cells still lack (at most round_size per cell). A cell stops once it has
+    asked for REQUEST_BUDGET times its count, and the run stops early if a
+    whole round saves nothing. Needs an app context.
+    Returns {'saved': n, 'duplicates': n, 'unfinished': [cells short of their count]}.
+    """
+    totals = {'saved': 0, 'duplicates': 0}
+    while True:
+        rounds = defaultdict(list)  # (stream, topic) -> [(subject, difficulty, count)]
+        for cell, count in sorted(matrix.items()):
+            state = checkpoint.cell(cell)
+            wanted = min(count - state['saved'], count * REQUEST_BUDGET - state['requested'], round_size)
+            if wanted > 0:
+                stream, subject, difficulty, topic = cell
+                rounds[(stream, topic)].append((subject, difficulty, wanted))
+        if not rounds:
+            break
+
+        saved = 0
+        for (stream, topic), buckets in rounds.items():
+            result = _run_round(generator, stream, topic, buckets, checkpoint)
+            saved += result['saved']
+            totals['saved'] += result['saved']
+            totals['duplicates'] += result['duplicates']
+        if not saved:
+            print("Bulk generation: a whole round saved no new questions, stopping")
+            break
+
+    totals['unfinished'] = [cell for cell, count in sorted(matrix.items()) if checkpoint.cell(cell)['saved'] < count]
+    return totals
+
+
+def _run_round(generator, stream, topic, buckets, checkpoint):
+    """One fan-out for a (stream, topic), saving each cell's questions as they arrive"""
+    for subject, difficulty, count in buckets:
+        # Counted up front, so a crash mid-round still spends the budget
+        checkpoint.cell((stream, subject, difficulty, topic))['requested'] += count
+    checkpoint.save()
+
+    result = {'saved': 0, 'duplicates': 0}
+    buffers = defaultdict(list)
+
+    def flush(key):
+        questions_data = buffers.pop(key, [])
+        if not questions_data:
+            return
+        high_water = db.session.query(func.max(Question.id)).scalar() or 0
+        new_ids = {question.id for question in save_generated_questions(questions_data) if question.id > high_water}
+        state = checkpoint.cell((stream, key[0], key[1], topic))
+        state['saved'] += len(new_ids)
+        state['duplicates'] += len(questions_data) - len(new_ids)
+        checkpoint.save()
+        result['saved'] += len(new_ids)
+        result['duplicates'] += len(questions_data) - len(new_ids)
+
+    print(f"Bulk generation: {stream} {topic or 'any topic'}, "
+          f"{sum(count for _, _, count in buckets)} questions over {len(buckets)} cells")
+    for key, q_data in generator.iter_questions_for_buckets(stream, buckets, topic=topic or None):
+        if topic:
+            q_data['chapter'] = topic  # Keep topic questions in their chapter's catalog
+        buffers[key].append(q_data)
+        if len(buffers[key]) >= SAVE_EVERY:
+            flush(key)
+    for key in list(buffers):
+        flush(key)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--matrix', help='JSON list of {stream, subject, difficulty, topic, count}')
+    parser.add_argument('--streams', nargs='+', choices=sorted(STREAM_SUBJECTS), help='default: all')
+    parser.add_argument('--subjects', nargs='+', help="default: each stream's subjects")
+    parser.add_argument('--difficulties', nargs='+', choices=DIFFICULTIES, help='default: all')
+    parser.add_argument('--topics', nargs='+', help='default: any topic')
+    parser.add_argument('--count', type=int, default=100, help='new questions wanted per cell')
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT, help='progress file, resumed if it exists')
+    parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+    parser.add_argument('--concurrency', type=int, default=None, help='API calls in flight at once')
+    parser.add_argument('--requests-per-minute', type=float, default=None, help='API calls started per minute')
+    parser.add_argument('--base-url', default=None, help='OpenAI-compatible endpoint, e.g. the local stub')
+    parser.add_argument('--multi-bucket', action='store_true',
+                        help="ask for a subject's difficulties in shared calls, spending fewer requests")
+    args = parser.parse_args()
+
+    if args.matrix:
+        matrix = load_matrix(args.matrix)
+    else:
+        matrix = build_matrix(args.streams, args.subjects, args.difficulties, args.topics, args.count)
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = Checkpoint(args.checkpoint)
+
+    from app import app
+    from ai_question_generator import AIQuestionGenerator
+    # Offline runs have no deadline and never hedge: duplicate requests only spend the rate limit
+    generator = AIQuestionGenerator(base_url=args.base_url, max_concurrency=args.concurrency,
+                                    hedge_percentile=0, requests_per_minute=args.requests_per_minute,
+                                    multi_bucket=args.multi_bucket or None)
+    if generator.client is None:
+        parser.error('no OpenAI API key; set OPENAI_API_KEY')
+
+    with app.app_context():
+        db.create_all()
+        result = bulk_generate(generator, matrix, checkpoint)
+
+    print(f"\nSaved {result['saved']} new questions ({result['duplicates']} duplicates dropped)")
+    for cell in result['unfinished']:
+        print(f"  short: {' / '.join(part or 'any topic' for part in cell)} "
+              f"({checkpoint.cell(cell)['saved']}/{matrix[cell]})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Computerized adaptive testing (CAT)
+Rasch-model ability estimation with maximum-information item selection. Items
+are picked one at a time from the question pool index: each step bisects the
+sorted difficulty levels for the one that best separates the current estimate
+from the nearest level cut point, then samples one unused question from it.
+"""
+
+import math
+from bisect import bisect_left
+from question_pool import question_pool
+
+# Rasch difficulty (b) for each difficulty label, sorted by b
+DIFFICULTY_PARAMETERS = [('Easy', -1.0), ('Medium', 0.0), ('Hard', 1.0)]
+_DIFFICULTY_VALUES = [b for _, b in DIFFICULTY_PARAMETERS]
+
+# Ability cut points between levels. They sit where the initial test's 60% and
+# 80% score thresholds fall for its 25/40/35 Easy/Medium/Hard mix.
+LEVEL_CUTS = [(0.57, 'Beginner'), (1.66, 'Intermediate')]
+TOP_LEVEL = 'Advanced'
+
+# Quadrature grid for the posterior over ability, standard normal prior
+_GRID = [i / 10.0 for i in range(-40, 41)]
+_PRIOR = [math.exp(-theta * theta / 2) for theta in _GRID]
+
+
+def probability_correct(theta, b):
+    """Rasch model probability of a correct answer"""
+    return 1.0 / (1.0 + math.exp(b - theta))
+
+
+def estimate_ability(responses):
+    """EAP ability estimate and posterior SD from [(b, correct), ...]"""
+    posterior = list(_PRIOR)
+    for b, correct in responses:
+        for i, theta in enumerate(_GRID):
+            p = probability_correct(theta, b)
+            posterior[i] *= p if correct else (1.0 - p)
+
+    total = sum(posterior)
+    theta_hat = sum(theta * weight for theta, weight in zip(_GRID, posterior)) / total
+    variance = sum((theta - theta_hat) ** 2 * weight for theta, weight in zip(_GRID, posterior)) / total
+    return theta_hat, math.sqrt(variance)
+
+
+def level_for_ability(theta):
+    """Map an ability estimate to Beginner/Intermediate/Advanced"""
+    for cut, level in LEVEL_CUTS:
+        if theta < cut:
+            return level
+    return TOP_LEVEL
+
+
+def nearest_difficulty(theta):
+    """Difficulty label whose b is closest to theta (maximum Rasch information)"""
+    position = bisect_left(_DIFFICULTY_VALUES, theta)
+    if position == 0:
+        return DIFFICULTY_PARAMETERS[0][0]
+    if position == len(_DIFFICULTY_VALUES):
+        return DIFFICULTY_PARAMETERS[-1][0]
+    below, above = DIFFICULTY_PARAMETERS[position - 1], DIFFICULTY_PARAMETERS[position]
+    return below[0] if theta - below[1] <= above[1] - theta else above[0]
+
+
+def selection_target(theta):
+    """Item difficulty that best tells the current estimate from the nearest cut point.
+
+    The session only has to decide a level, i.e. which side of a cut the
+    ability lies. The Rasch item whose chance of a correct answer differs most
+    between an examinee at theta and one at the cut sits halfway between them;
+    once the estimate reaches a cut this is the most informative item there.
+    """
+    cut = min((cut for cut, _ in LEVEL_CUTS), key=lambda cut: abs(cut - theta))
+    return (theta + cut) / 2
+
+
+def difficulty_parameter(difficulty):
+    return dict(DIFFICULTY_PARAMETERS).get(difficulty, 0.0)
+
+
+class CATSession:
+    """State of one adaptive session; serialisable to and from the Flask session"""
+
+    def __init__(self, stream, subjects, responses=None, current=None,
+                 min_questions=8, max_questions=20, se_target=0.3, confidence_z=1.28):
+        self.stream = stream
+        self.subjects = subjects
+        # [[question_id, subject, difficulty, correct], ...]
+        self.responses = responses or []
+        self.current = current
+        self.min_questions = min_questions
+        self.max_questions = max_questions
+        self.se_target = se_target
+        self.confidence_z = confidence_z
+
+    def to_dict(self):
+        return {
+            'stream': self.stream,
+            'subjects': self.subjects,
+            'responses': self.responses,
+            'current': self.current,
+            'min_questions': self.min_questions,
+            'max_questions': self.max_questions,
+            'se_target': self.se_target,
+            'confidence_z': self.confidence_z
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def ability(self):
+        return estimate_ability(
+            [(difficulty_parameter(difficulty), correct) for _, _, difficulty, correct in self.responses]
+        )
+
+    def is_finished(self):
+        """Stop once the level is settled or the estimate is precise enough"""
+        answered = len(self.responses)
+        if answered >= self.max_questions:
+            return True
+        if answered < self.min_questions:
+            return False
+
+        theta, se = self.ability()
+        if se <= self.se_target:
+            return True
+        # Whole confidence interval falls inside one level
+        low, high = theta - self.confidence_z * se, theta + self.confidence_z * se
+        return level_for_ability(low) == level_for_ability(high)
+
+    def next_question_id(self):
+        """Choose the most informative unused item, rotating through subjects"""
+        theta, _ = self.ability()
+        target = nearest_difficulty(selection_target(theta))
+        used_ids = {question_id for question_id, _, _, _ in self.responses}
+
+        # Content balancing: rotate subjects, skipping any that have run dry.
+        # The pool falls back to the next nearest difficulty when a level is empty.
+        for offset in range(len(self.subjects)):
+            subject = self.subjects[(len(self.responses) + offset) % len(self.subjects)]
+            picked = question_pool.sample(self.stream, subject, target, 1, exclude=used_ids)
+            if picked:
+                self.current = picked[0]
+                return picked[0]
+
+        self.current = None
+        return None
+
+    def record_answer(self, question, answer):
+        """Score the current item and add it to the response history"""
+        correct = answer is not None and answer == question.correct_answer
+        self.responses.append([question.id, question.subject, question.difficulty, correct])
+        self.current = None
+        return correct
@@ -19,6 +19,40 @@ class Config:
     DEFAULT_TEST_DURATION = 60  # minutes
     INITIAL_TEST_QUESTIONS = 25
     ADAPTIVE_TEST_QUESTIONS = 30
+    CAT_MIN_QUESTIONS = 8  # Item-by-item adaptive test stops between these
+    CAT_MAX_QUESTIONS = 20
+    
+    # Pre-generated paper pool (full papers and adaptive tests)
+    PAPER_POOL_ENABLED = True
+    PAPER_POOL_LOW_WATER = 2  # Refill when fewer ready papers than this
+    PAPER_POOL_TARGET = 4  # Papers kept ready per (stream, test type, level)
+    PAPER_POOL_REFILL_INTERVAL = 60  # seconds between background checks
+    
+    # Prewarmed AI question inventory (question_inventory.py)
+    QUESTION_INVENTORY_ENABLED = True
+    QUESTION_INVENTORY_LOW_WATER = 20  # Refill buckets holding fewer unserved questions
+    QUESTION_INVENTORY_TARGET = 60  # Unserved questions kept per bucket
+    QUESTION_INVENTORY_GENERATE_MISSES = True  # Generate what a take comes up short, within AI_DEADLINE_SECONDS
+    
+    # Near-duplicate index over the bank (question_bank.py)
+    NEAR_DUPLICATE_WARM = True  # Build it in the background from the first request
+    
+    # Single-flight AI generation on the request path (generation_flights.py)
+    SINGLE_FLIGHT_ENABLED = True
+    SINGLE_FLIGHT_POLL_INTERVAL = 0.05  # seconds between checks on another process's flight
+    SINGLE_FLIGHT_RESULT_GRACE = 2.0  # seconds a finished flight's questions go to late arrivals
+    
+    # Background job queue (worker.py)
+    JOB_QUEUE_EAGER = False  # True runs jobs inline, without workers
+    JOB_WORKERS = 2  # Worker processes started by run.py / worker.py
+    JOB_POLL_INTERVAL = 1.0  # seconds an idle worker waits before polling again
+    JOB_VISIBILITY_TIMEOUT = 300  # seconds before a claimed job can be reclaimed
+    JOB_MAX_ATTEMPTS = 3
+    JOB_RETRY_BACKOFF = 10  # seconds, doubled after each failed attempt
+    JOB_RETENTION_DAYS = 7  # Finished jobs older than this are pruned
+    
+    # Generation telemetry served at /metrics (metrics.py)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Bearer token required when set
     
     # AI Engine configuration
     WEAK_TOPIC_THRESHOLD = 0.6  # Below 60% accuracy
@@ -47,6 +81,10 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    PAPER_POOL_ENABLED = False
+    QUESTION_INVENTORY_ENABLED = False
+    NEAR_DUPLICATE_WARM = False
+    JOB_QUEUE_EAGER = True
 
 # Configuration dictionary
 config = {
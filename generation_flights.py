@@ -0,0 +1,255 @@
+"""
+Single-flight AI generation
+When many students start a test at once, their identical (stream, subject,
+difficulty) generation requests share one API call instead of each paying
+for their own. Within a process, later callers wait on the first caller's
+flight. Across processes, a lease row in the generation_lease table names the
+process generating a bucket; the others poll the row for the question ids it
+publishes. Callers whose flight fails or outlasts their timeout get nothing
+for that bucket and fill it from the database, as they would without AI.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, GenerationLease
+from question_pool import load_questions
+
+LEASE_MARGIN = 5  # seconds a lease outlives its flight's timeout before others may take over
+UNBOUNDED_LEASE = 10 * 60  # seconds a lease lasts for a flight without a timeout
+ACQUIRE_ATTEMPTS = 3
+
+LEAD, FOLLOW, DONE = 'lead', 'follow', 'done'
+
+
+class _Flight:
+    """A bucket being generated by a thread of this process"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.question_ids = []
+
+
+class GenerationFlights:
+    """In-process flights plus the cross-process lease table"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._flights = {}  # (stream, subject, difficulty) -> _Flight
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('SINGLE_FLIGHT_ENABLED', True)
+        app.config.setdefault('SINGLE_FLIGHT_POLL_INTERVAL', 0.05)  # seconds
+        app.config.setdefault('SINGLE_FLIGHT_RESULT_GRACE', 2.0)  # seconds
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['SINGLE_FLIGHT_ENABLED']
+
+    def run(self, stream, buckets, generate, timeout):
+        """Generate [(subject, difficulty, count)] buckets, sharing calls in flight.
+
+        generate(buckets) generates and saves the buckets this caller leads,
+        returning {(subject, difficulty): [Question]}. Buckets another caller
+        is already generating wait up to timeout seconds for its questions
+        instead; with timeout None, as long as the flight runs. Returns
+        {(subject, difficulty): [Question]}.
+        """
+        expires = time.monotonic() + timeout if timeout is not None else None
+        led = []
+        waiting = {}
+        with self._lock:
+            for subject, difficulty, count in buckets:
+                flight = self._flights.get((stream, subject, difficulty))
+                if flight is None:
+                    self._flights[(stream, subject, difficulty)] = _Flight()
+                    led.append((subject, difficulty, count))
+                else:
+                    waiting[(subject, difficulty)] = flight
+
+        question_ids = {}
+        try:
+            leases = {}
+            remote = {}
+            states = self._acquire_all([self._key(stream, subject, difficulty) for subject, difficulty, _ in led], timeout)
+            for subject, difficulty, count in led:
+                state, value = states[self._key(stream, subject, difficulty)]
+                if state == LEAD:
+                    leases[(subject, difficulty)] = value
+                elif state == FOLLOW:
+                    remote[(subject, difficulty)] = value
+                else:
+                    question_ids[(subject, difficulty)] = value
+
+            generating = [bucket for bucket in led if bucket[:2] in leases]
+            if generating:
+                generated = {}
+                try:
+                    generated = generate(generating)
+                finally:
+                    for key in leases:
+                        question_ids[key] = [question.id for question in generated.get(key, [])]
+                    # Publishing commits, which expires the generated rows; they
+                    # are loaded again below with the other buckets, in one query
+                    self._publish({self._key(stream, *key): (flight_id, question_ids[key])
+                                   for key, flight_id in leases.items()})
+
+            for key, flight_id in remote.items():
+                question_ids[key] = self._wait_for_lease(self._key(stream, *key), flight_id, expires)
+        finally:
+            with self._lock:
+                for subject, difficulty, _ in led:
+                    flight = self._flights.pop((stream, subject, difficulty))
+                    flight.question_ids = question_ids.get((subject, difficulty), [])
+                    flight.done.set()
+
+        for key, flight in waiting.items():
+            if flight.done.wait(None if expires is None else max(0, expires - time.monotonic())):
+                question_ids[key] = flight.question_ids
+
+        loaded = {question.id: question for question in load_questions(
+            [question_id for ids in question_ids.values() for question_id in ids])}
+        return {key: [loaded[question_id] for question_id in ids if question_id in loaded]
+                for key, ids in question_ids.items() if ids}
+
+    @staticmethod
+    def _key(stream, subject, difficulty):
+        return f'{stream}|{subject}|{difficulty}'
+
+    def _lease_values(self, flight_id, timeout):
+        return {'flight': flight_id, 'holder': f"{socket.gethostname()}-{os.getpid()}",
+                'finished_at': None, 'question_ids': None,
+                'expires_at': datetime.utcnow() + timedelta(
+                    seconds=(UNBOUNDED_LEASE if timeout is None else timeout) + LEASE_MARGIN)}
+
+    def _acquire_all(self, keys, timeout):
+        """{key: state} for many buckets in one transaction; see _acquire.
+
+        Buckets whose lease changes hands meanwhile are settled one by one.
+        """
+        if not keys:
+            return {}
+        now = datetime.utcnow()
+        grace = timedelta(seconds=self.app.config['SINGLE_FLIGHT_RESULT_GRACE'])
+        table = GenerationLease.__table__  # Core statements: this runs on every test start
+        leases = {lease.key: lease for lease in db.session.execute(
+            select(table.c.key, table.c.flight, table.c.expires_at, table.c.finished_at, table.c.question_ids)
+            .where(table.c.key.in_(keys))
+        )}
+        states = {}
+        fresh = []
+        for key in keys:
+            lease = leases.get(key)
+            if lease is None:
+                fresh.append(key)
+            elif lease.finished_at is None and lease.expires_at > now:
+                states[key] = (FOLLOW, lease.flight)
+            elif lease.finished_at is not None and lease.finished_at > now - grace:
+                states[key] = (DONE, json.loads(lease.question_ids) if lease.question_ids else [])
+            else:
+                flight_id = uuid.uuid4().hex
+                taken = db.session.execute(
+                    update(table)
+                    .where(table.c.key == key, table.c.flight == lease.flight)
+                    .values(**self._lease_values(flight_id, timeout))
+                ).rowcount
+                if taken:
+                    states[key] = (LEAD, flight_id)
+        try:
+            if fresh:
+                flight_ids = {key: uuid.uuid4().hex for key in fresh}
+                db.session.execute(insert(table), [
+                    dict(key=key, **self._lease_values(flight_ids[key], timeout)) for key in fresh
+                ])
+                states.update((key, (LEAD, flight_ids[key])) for key in fresh)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Another process inserted one first
+            states = {key: state for key, state in states.items() if state[0] != LEAD}
+        for key in keys:
+            if key not in states:
+                states[key] = self._acquire(key, timeout)
+        return states
+
+    def _acquire(self, key, timeout):
+        """(LEAD, flight id), (FOLLOW, another process's flight id) or (DONE, question ids)"""
+        grace = timedelta(seconds=self.app.config['SINGLE_FLIGHT_RESULT_GRACE'])
+        flight_id = uuid.uuid4().hex
+        for _ in range(ACQUIRE_ATTEMPTS):
+            now = datetime.utcnow()
+            lease_values = self._lease_values(flight_id, timeout)
+            lease = db.session.get(GenerationLease, key, populate_existing=True)
+            if lease is None:
+                try:
+                    db.session.execute(insert(GenerationLease).values(key=key, **lease_values))
+                    db.session.commit()
+                    return LEAD, flight_id
+                except IntegrityError:
+                    db.session.rollback()
+                    continue  # Inserted by another process since; look again
+            if lease.finished_at is None and lease.expires_at > now:
+                return FOLLOW, lease.flight
+            if lease.finished_at is not None and lease.finished_at > now - grace:
+                return DONE, lease.get_question_ids()
+
+            # Finished a while ago, or its holder died: take it over unless another process just did
+            taken = db.session.execute(
+                update(GenerationLease)
+                .where(GenerationLease.key == key, GenerationLease.flight == lease.flight)
+                .values(**lease_values)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if taken:
+                return LEAD, flight_id
+        # Lost every race for the lease; generate without sharing
+        return LEAD, None
+
+    def _publish(self, flights):
+        """Hand finished flights' question ids, {key: (flight id, ids)}, to the processes waiting on them"""
+        finished_at = datetime.utcnow()
+        rows = [{'lease_key': key, 'lease_flight': flight_id, 'ids': json.dumps(question_ids)}
+                for key, (flight_id, question_ids) in flights.items() if flight_id is not None]
+        if not rows:
+            return
+        table = GenerationLease.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.key == bindparam('lease_key'), table.c.flight == bindparam('lease_flight'))
+            .values(finished_at=finished_at, question_ids=bindparam('ids')),
+            rows
+        )
+        db.session.commit()
+
+    def _wait_for_lease(self, key, flight_id, expires):
+        """Question ids another process publishes for its flight; [] if it fails or expires first"""
+        poll_interval = self.app.config['SINGLE_FLIGHT_POLL_INTERVAL']
+        while expires is None or time.monotonic() < expires:
+            lease = db.session.execute(
+                select(GenerationLease.flight, GenerationLease.finished_at,
+                       GenerationLease.expires_at, GenerationLease.question_ids)
+                .where(GenerationLease.key == key)
+            ).first()
+            db.session.commit()  # End the read, so the next poll sees new commits
+            if lease is None or lease.flight != flight_id:
+                return []
+            if lease.finished_at is not None:
+                return json.loads(lease.question_ids) if lease.question_ids else []
+            if lease.expires_at < datetime.utcnow():
+                return []  # The holder died
+            time.sleep(poll_interval if expires is None else min(poll_interval, max(0, expires - time.monotonic())))
+        return []
+
+
+# Process-wide flights; init_app is called in app.py
+generation_flights = GenerationFlights()
@@ -6,6 +6,7 @@ Creates tables and populates with sample questions and resources
 
 from app import app
 from models import db, Question, Resource
+from question_bank import save_questions
 import json
 
 def create_sample_questions():
@@ -192,10 +193,8 @@ def create_sample_questions():
                     neet_biology_questions + jee_physics_questions + 
                     jee_chemistry_questions + jee_math_questions)
     
-    # Add questions to database
-    for q_data in all_questions:
-        question = Question(**q_data)
-        db.session.add(question)
+    # Add questions to database; re-running skips questions already there
+    save_questions(all_questions)
     
     # Create additional questions for better test variety
     create_additional_questions()
@@ -259,9 +258,7 @@ def create_additional_questions():
     
     all_additional = additional_neet + additional_jee
     
-    for q_data in all_additional:
-        question = Question(**q_data)
-        db.session.add(question)
+    save_questions(all_additional)
 
 def create_sample_resources():
     """Create sample resources (textbooks and past papers)"""
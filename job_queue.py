@@ -0,0 +1,219 @@
+"""
+Durable background job queue
+Jobs are rows in the app's own database, so no external broker is needed.
+Request handlers enqueue work inside their own transaction and return; worker
+processes (worker.py) claim jobs with an atomic UPDATE that also sets a
+visibility timeout. A job whose worker dies is claimable again once its lease
+runs out. Failures are retried with exponential backoff up to max_attempts.
+"""
+
+import json
+import traceback
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_, select, update
+from models import db, Job
+
+TaskSpec = namedtuple('TaskSpec', ['func', 'priority', 'max_attempts', 'timeout'])
+
+
+class JobQueue:
+    """Task registry plus enqueue/claim/run operations on the job table"""
+
+    def __init__(self, app=None):
+        self.tasks = {}
+        self.periodic_tasks = {}  # task name -> interval in seconds
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('JOB_QUEUE_EAGER', False)  # Run jobs inline at enqueue time
+        app.config.setdefault('JOB_WORKERS', 2)
+        app.config.setdefault('JOB_POLL_INTERVAL', 1.0)  # seconds an idle worker sleeps
+        app.config.setdefault('JOB_VISIBILITY_TIMEOUT', 300)  # seconds
+        app.config.setdefault('JOB_MAX_ATTEMPTS', 3)
+        app.config.setdefault('JOB_RETRY_BACKOFF', 10)  # seconds, doubled per attempt
+        app.config.setdefault('JOB_RETENTION_DAYS', 7)
+
+    def task(self, name=None, priority=0, max_attempts=None, timeout=None):
+        """Register a function as a task; its keyword arguments form the payload"""
+        def decorator(func):
+            self.tasks[name or func.__name__] = TaskSpec(func, priority, max_attempts, timeout)
+            return func
+        return decorator
+
+    def periodic(self, interval, name=None, **options):
+        """Register a task that the worker pool enqueues every interval seconds"""
+        def decorator(func):
+            task_name = name or func.__name__
+            self.periodic_tasks[task_name] = interval
+            return self.task(task_name, **options)(func)
+        return decorator
+
+    def enqueue(self, task_name, payload=None, priority=None, delay=0):
+        """Add a job to the caller's session.
+
+        The job becomes visible to workers when the caller commits, so it is
+        enqueued atomically with whatever the caller wrote. In eager mode the
+        session is committed and the job runs before this returns.
+        """
+        spec = self.tasks[task_name]
+        job = Job(
+            task=task_name,
+            priority=spec.priority if priority is None else priority,
+            max_attempts=spec.max_attempts or self.app.config['JOB_MAX_ATTEMPTS'],
+            run_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+        job.set_payload(payload or {})
+        db.session.add(job)
+
+        if self.app.config['JOB_QUEUE_EAGER']:
+            job.status = 'running'
+            job.attempts = 1
+            job.locked_by = 'eager'
+            db.session.commit()
+            self.run_job(job)
+        return job
+
+    def claim(self, worker_name):
+        """Atomically lease the next runnable job, or return None"""
+        now = datetime.utcnow()
+        claimable = or_(
+            and_(Job.status == 'queued', Job.run_at <= now),
+            and_(Job.status == 'running', Job.locked_until < now)  # Lease expired
+        )
+        next_id = (
+            select(Job.id)
+            .where(claimable)
+            .order_by(Job.priority.desc(), Job.run_at, Job.id)
+            .limit(1)
+            .scalar_subquery()
+        )
+        # The outer condition is re-checked by the UPDATE, so two workers
+        # racing for the same row cannot both claim it
+        statement = (
+            update(Job)
+            .where(Job.id == next_id, claimable)
+            .values(
+                status='running',
+                attempts=Job.attempts + 1,
+                locked_by=worker_name,
+                locked_until=now + timedelta(seconds=self.app.config['JOB_VISIBILITY_TIMEOUT'])
+            )
+            .returning(Job.id)
+            .execution_options(synchronize_session=False)
+        )
+        job_id = db.session.execute(statement).scalar()
+        if job_id is None:
+            db.session.rollback()
+            return None
+
+        job = db.session.get(Job, job_id, populate_existing=True)
+        spec = self.tasks.get(job.task)
+        if spec is not None and spec.timeout:
+            job.locked_until = now + timedelta(seconds=spec.timeout)
+        db.session.commit()
+        return job
+
+    def run_job(self, job):
+        """Run a claimed job and record its result, retry or failure"""
+        job_id, attempts, worker_name = job.id, job.attempts, job.locked_by
+        spec = self.tasks.get(job.task)
+
+        if spec is None:
+            self._fail(job_id, attempts, worker_name, f"Unknown task {job.task}", retry=False)
+            return
+        if attempts > job.max_attempts:
+            # Reclaimed after its last attempt timed out
+            self._fail(job_id, attempts, worker_name, 'Visibility timeout expired on final attempt', retry=False)
+            return
+
+        try:
+            result = spec.func(**job.get_payload())
+        except Exception as e:
+            print(f"Job {job_id} ({job.task}) failed on attempt {attempts}: {e}")
+            traceback.print_exc()
+            db.session.rollback()
+            self._fail(job_id, attempts, worker_name, f"{type(e).__name__}: {e}", retry=True)
+            return
+
+        self._finish(job_id, attempts, worker_name, result)
+
+    def run_pending(self, worker_name='inline', limit=None):
+        """Claim and run jobs in this process until none are runnable"""
+        processed = 0
+        while limit is None or processed < limit:
+            job = self.claim(worker_name)
+            if job is None:
+                break
+            self.run_job(job)
+            processed += 1
+        return processed
+
+    def schedule_periodic(self):
+        """Enqueue each periodic task that has no queued or running job"""
+        now = datetime.utcnow()
+        for task_name, interval in self.periodic_tasks.items():
+            pending = Job.query.filter(
+                Job.task == task_name, Job.status.in_(['queued', 'running'])
+            ).first()
+            if pending:
+                continue
+            last = Job.query.filter_by(task=task_name).order_by(Job.id.desc()).first()
+            delay = 0
+            if last is not None:
+                due = (last.finished_at or last.created_at) + timedelta(seconds=interval)
+                delay = max(0, (due - now).total_seconds())
+            self.enqueue(task_name, delay=delay)
+        db.session.commit()
+
+    def prune(self):
+        """Delete finished jobs older than the retention period"""
+        cutoff = datetime.utcnow() - timedelta(days=self.app.config['JOB_RETENTION_DAYS'])
+        deleted = Job.query.filter(
+            Job.status.in_(['done', 'failed']), Job.finished_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def counts(self):
+        """Number of jobs per status"""
+        rows = db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all()
+        return dict(rows)
+
+    def _owned(self, job_id, attempts, worker_name):
+        # Only the holder of the current claim may record its outcome
+        return Job.query.filter_by(id=job_id, attempts=attempts, locked_by=worker_name, status='running')
+
+    def _finish(self, job_id, attempts, worker_name, result):
+        job = db.session.get(Job, job_id)
+        updated = self._owned(job_id, attempts, worker_name).update({
+            'status': 'done',
+            'result': None if result is None else json.dumps(result),
+            'locked_until': None,
+            'finished_at': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if not updated:
+            print(f"Job {job_id} finished after its claim was lost; result discarded")
+        elif job is not None:
+            db.session.refresh(job)
+
+    def _fail(self, job_id, attempts, worker_name, error, retry):
+        job = db.session.get(Job, job_id)
+        values = {'last_error': error, 'locked_until': None}
+        if retry and attempts < job.max_attempts:
+            backoff = self.app.config['JOB_RETRY_BACKOFF'] * 2 ** (attempts - 1)
+            values.update(status='queued', locked_by=None,
+                          run_at=datetime.utcnow() + timedelta(seconds=backoff))
+        else:
+            values.update(status='failed', finished_at=datetime.utcnow())
+        self._owned(job_id, attempts, worker_name).update(values, synchronize_session=False)
+        db.session.commit()
+        db.session.refresh(job)
+
+
+# Shared registry; app.py registers the tasks and binds the app
+job_queue = JobQueue()
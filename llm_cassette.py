@@ -0,0 +1,171 @@
+"""
+Record/replay cassettes for LLM API calls
+CassetteTransport sits under the OpenAI client's HTTP client. In record mode it
+forwards each request to the real endpoint, passes the response through as it
+streams, and appends the exchange to a gzip-compressed JSON-lines cassette,
+keyed by a hash of the normalized request body. In replay mode it answers from
+the cassette without touching the network, with the recorded timing of every
+chunk or a fixed synthetic latency, so the generation pipeline can be
+benchmarked and regression-tested offline and deterministically.
+
+Select one with AI_CASSETTE=path (and AI_CASSETTE_MODE=record or replay), or
+pass transport=CassetteTransport(...) to AIQuestionGenerator.
+"""
+
+import codecs
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+import httpx
+
+MODES = ('record', 'replay')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_request(body):
+    """The request body with message whitespace collapsed, for matching"""
+    request = json.loads(body or b'{}')
+    for message in request.get('messages', []):
+        if isinstance(message.get('content'), str):
+            message['content'] = _WHITESPACE.sub(' ', message['content']).strip()
+    return request
+
+
+def request_key(body):
+    """Hash of a normalized request body; equal prompts and parameters share a key"""
+    return hashlib.sha256(json.dumps(normalize_request(body), sort_keys=True).encode()).hexdigest()
+
+
+class _ReplayStream(httpx.SyncByteStream):
+    """Yields recorded chunks, each after its recorded (or a synthetic) delay"""
+
+    def __init__(self, chunks, latency):
+        self.chunks = chunks
+        self.latency = latency
+
+    def __iter__(self):
+        start = time.monotonic()
+        if self.latency is not None:
+            time.sleep(self.latency)
+        for offset, text in self.chunks:
+            if self.latency is None:
+                wait = start + offset - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+            yield text.encode()
+
+
+class _RecordingStream(httpx.SyncByteStream):
+    """Passes a live response through, saving it once it has been read to the end"""
+
+    def __init__(self, response, started, on_complete):
+        self.response = response
+        self.started = started
+        self.on_complete = on_complete
+
+    def __iter__(self):
+        chunks = []
+        decoder = codecs.getincrementaldecoder('utf-8')()  # A chunk may end mid-character
+        for data in self.response.stream:
+            chunks.append([round(time.monotonic() - self.started, 4), decoder.decode(data)])
+            yield data
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            chunks.append([round(time.monotonic() - self.started, 4), tail])
+        # Streams closed early (a cancelled batch) are never recorded
+        self.on_complete(chunks)
+
+    def close(self):
+        self.response.close()
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """httpx transport that records LLM calls to, or replays them from, a cassette.
+
+    Identical requests recorded several times are replayed in recorded order,
+    wrapping around. latency=None replays the recorded timing; a number of
+    seconds replaces it with that delay before each response. A replay with no
+    recording answers 404 and counts a miss.
+    """
+
+    def __init__(self, path, mode='replay', latency=None, transport=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode {mode!r}; expected one of {MODES}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.misses = 0
+        self._transport = transport
+        self._interactions = defaultdict(list)  # key -> [interaction]
+        self._replayed = defaultdict(int)  # key -> interactions replayed
+        self._lock = threading.Lock()
+        if mode == 'replay':
+            self._load()
+        elif transport is None:
+            self._transport = httpx.HTTPTransport()
+
+    def __len__(self):
+        return sum(len(interactions) for interactions in self._interactions.values())
+
+    def handle_request(self, request):
+        body = request.read()
+        key = request_key(body)
+        if self.mode == 'record':
+            return self._record(request, key, body)
+
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                self.misses += 1
+            else:
+                interaction = interactions[self._replayed[key] % len(interactions)]
+                self._replayed[key] += 1
+        if not interactions:
+            message = f"No recorded response for request {key[:12]} in cassette {self.path}"
+            return httpx.Response(404, json={'error': {'message': message, 'type': 'cassette_miss'}})
+        return httpx.Response(interaction['status'], headers=interaction['headers'],
+                              stream=_ReplayStream(interaction['chunks'], self.latency))
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+
+    def _record(self, request, key, body):
+        # Uncompressed, so the cassette holds the text the client would decode
+        request.headers['Accept-Encoding'] = 'identity'
+        started = time.monotonic()
+        response = self._transport.handle_request(request)
+        headers = {'content-type': response.headers.get('content-type', 'application/json')}
+
+        def save(chunks):
+            if response.status_code >= 400:
+                return  # Replaying an outage or rate limit would only mislead
+            interaction = {'key': key, 'request': normalize_request(body), 'status': response.status_code,
+                           'headers': headers, 'chunks': chunks}
+            line = (json.dumps(interaction) + '\n').encode()
+            with self._lock:
+                self._interactions[key].append(interaction)
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                # Each append is its own gzip member; readers see one stream
+                with gzip.open(self.path, 'ab') as f:
+                    f.write(line)
+
+        return httpx.Response(response.status_code, headers=response.headers,
+                              stream=_RecordingStream(response, started, save),
+                              extensions=response.extensions)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"Cassette {self.path} not found; record it first with mode='record'")
+        with gzip.open(self.path, 'rt') as f:
+            for line in f:
+                if line.strip():
+                    interaction = json.loads(line)
+                    self._interactions[interaction['key']].append(interaction)
@@ -0,0 +1,225 @@
+"""
+In-process metrics registry
+Counters and histograms keyed by label values, rendered in the Prometheus text
+format or as JSON. Worker processes write their snapshot to a shared directory
+after each job, and the web process merges those files into what it serves,
+so /metrics covers generation wherever it ran. A worker removes its file when
+it stops; files left by workers that died are pruned when the web process
+collects, so their counts drop out like those of any restarted process.
+"""
+
+import bisect
+import json
+import os
+import tempfile
+import threading
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'metrics')
+
+
+def _running(pid):
+    """Whether a process with this pid exists; assumed so where it can't be checked"""
+    if os.name != 'posix':
+        return True  # os.kill would terminate it on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by another user
+    return True
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Monotonic total per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def merge(self, samples):
+        with self._lock:
+            for key, value in samples:
+                key = tuple(key)
+                self._values[key] = self._values.get(key, 0) + value
+
+    def render(self):
+        lines = []
+        for key, value in sorted(self.snapshot()):
+            lines.append(f'{self.name}{_label_text(self.labelnames, key)} {value}')
+        return lines
+
+
+class Histogram:
+    """Bucketed observations per label combination, with sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=(0.5, 1, 2, 5, 10, 30, 60)):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # key -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[bisect.bisect_left(self.buckets, value)] += 1
+            state[-1] += value
+
+    def count(self, **labels):
+        state = self._values.get(tuple(str(labels[name]) for name in self.labelnames))
+        return sum(state[:-1]) if state else 0
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), list(state)] for key, state in self._values.items()]
+
+    def merge(self, samples):
+        with self._lock:
+            for key, state in samples:
+                key = tuple(key)
+                current = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+                for i, value in enumerate(state):
+                    current[i] += value
+
+    def render(self):
+        lines = []
+        for key, state in sorted(self.snapshot()):
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ['+Inf'], state[:-1]):
+                cumulative += count
+                le = 'le="%s"' % (bound if bound == '+Inf' else f'{bound:g}')
+                lines.append(f'{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_text(self.labelnames, key)} {state[-1]:g}')
+            lines.append(f'{self.name}_count{_label_text(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of one process, plus snapshots shared by other processes"""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.getenv('METRICS_DIR', DEFAULT_DIRECTORY)
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames, **options):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **options)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=(0.5, 1, 2, 5, 10, 30, 60)):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        """{metric name: samples} of this process"""
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def write_snapshot(self):
+        """Save this process's snapshot for the web process to merge"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, os.path.join(self.directory, f'{os.getpid()}.json'))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def remove_snapshot(self):
+        """Delete this process's snapshot, when it stops"""
+        try:
+            os.unlink(os.path.join(self.directory, f'{os.getpid()}.json'))
+        except FileNotFoundError:
+            pass
+
+    def collect(self, include_shared=True):
+        """A registry merging this process with every other process's snapshot"""
+        merged = MetricsRegistry(self.directory)
+        for name, metric in self._metrics.items():
+            options = {'buckets': metric.buckets} if metric.kind == 'histogram' else {}
+            copy = merged._register(type(metric), name, metric.documentation, metric.labelnames, **options)
+            copy.merge(metric.snapshot())
+
+        if include_shared and os.path.isdir(self.directory):
+            own = f'{os.getpid()}.json'
+            for filename in sorted(os.listdir(self.directory)):
+                if not filename.endswith('.json') or filename == own:
+                    continue
+                path = os.path.join(self.directory, filename)
+                pid = filename[:-len('.json')]
+                if pid.isdigit() and not _running(int(pid)):
+                    try:
+                        os.unlink(path)  # Left by a worker that died
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    with open(path) as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue  # Being replaced or unreadable; next scrape gets it
+                for name, samples in snapshot.items():
+                    if name in merged._metrics:
+                        merged._metrics[name].merge(samples)
+        return merged
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = []
+        for name in sorted(self._metrics):
+            metric = self._metrics[name]
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self):
+        return {
+            name: {'type': metric.kind, 'labels': list(metric.labelnames), 'samples': metric.snapshot()}
+            for name, metric in sorted(self._metrics.items())
+        }
+
+
+# Process-wide registry
+registry = MetricsRegistry()
@@ -91,4 +91,72 @@ class Resource(db.Model):
     file_path = db.Column(db.String(500), nullable=False)
     stream = db.Column(db.String(10), nullable=False)  # NEET or JEE
     year = db.Column(db.Integer)  # for past papers
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class Job(db.Model):
+    """Background job stored in the app database (see job_queue.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    task = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, default='{}')  # JSON string of keyword arguments
+    priority = db.Column(db.Integer, default=0)  # Higher runs first
+    status = db.Column(db.String(20), default='queued')  # queued, running, done, failed
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow)  # Not claimable before this
+    locked_by = db.Column(db.String(100))
+    locked_until = db.Column(db.DateTime)  # Visibility timeout of the current claim
+    last_error = db.Column(db.Text)
+    result = db.Column(db.Text)  # JSON string
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('idx_job_claim', 'status', 'run_at'),
+    )
+    
+    def get_payload(self):
+        return json.loads(self.payload) if self.payload else {}
+    
+    def set_payload(self, payload_dict):
+        self.payload = json.dumps(payload_dict)
+    
+    def get_result(self):
+        return json.loads(self.result) if self.result else None
+
+class QuestionSource(db.Model):
+    """Provenance of a generated question; content_hash dedups inserts (see question_bank.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id', ondelete='CASCADE'), nullable=False, unique=True)
+    content_hash = db.Column(db.String(64), nullable=False, unique=True)  # Normalized text + options
+    model = db.Column(db.String(100))
+    prompt_hash = db.Column(db.String(64), index=True)
+    source_pdf = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    question = db.relationship('Question', backref=db.backref('source', uselist=False, cascade='all, delete-orphan'))
+
+class InventoryItem(db.Model):
+    """Generated question not yet served to any test (see question_inventory.py)"""
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id', ondelete='CASCADE'), primary_key=True)
+    stream = db.Column(db.String(10), nullable=False)
+    subject = db.Column(db.String(50), nullable=False)
+    difficulty = db.Column(db.String(20), nullable=False)
+    topic = db.Column(db.String(100), nullable=False, default='')  # '' for questions on any topic
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_inventory_bucket', 'stream', 'subject', 'difficulty', 'topic'),
+    )
+
+class GenerationLease(db.Model):
+    """Bucket being generated by one process; others wait for its questions (see generation_flights.py)"""
+    key = db.Column(db.String(200), primary_key=True)  # stream|subject|difficulty
+    flight = db.Column(db.String(32), nullable=False)  # New for every generation of the bucket
+    holder = db.Column(db.String(100))  # host-pid of the generating process
+    expires_at = db.Column(db.DateTime, nullable=False)  # Another process may take over after this
+    finished_at = db.Column(db.DateTime)
+    question_ids = db.Column(db.Text)  # JSON list, published when finished
+    
+    def get_question_ids(self):
+        return json.loads(self.question_ids) if self.question_ids else []
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible stub server
+Answers POST /v1/chat/completions with well-formed generated questions after
+an injected latency, and records how many requests were in flight at once.
+Streaming requests get server-sent event chunks, with an optional delay
+between question blocks, or a token rate, to mimic token-by-token generation.
+Completions longer than the request's max_tokens are cut off there with
+finish_reason 'length'; padding lengthens the explanations, per subject if
+given as a dict, to mimic subjects with longer questions. Prompts asking for
+a mix of difficulties get each question labelled with one, in the asked mix.
+Tests point AIQuestionGenerator at it with base_url; it can also run
+standalone for manual testing with OPENAI_BASE_URL=http://127.0.0.1:8001/v1
+"""
+
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_COUNT_PATTERN = re.compile(r'generate (\d+) NEW')
+_SUBJECT_PATTERN = re.compile(r'following \w+ (\w+) question bank')
+_MIX_PATTERN = re.compile(r'DIFFICULTY LEVEL: (\d+ \w+(?:, \d+ \w+)*)')
+
+
+def _filler(chars):
+    return ''.join(f' Detail {i}.' for i in range(chars // 10))
+
+
+def fake_questions(count, label='Stub', padding=0, difficulties=None):
+    """Response text in the format _create_generation_prompt asks for"""
+    blocks = []
+    for i in range(1, count + 1):
+        difficulty = f"DIFFICULTY: {difficulties[i - 1]}\n" if difficulties else ''
+        blocks.append(
+            f"QUESTION {i}:\n"
+            f"{label} question {i}: which option is correct?\n"
+            f"A) Option one\nB) Option two\nC) Option three\nD) Option four\n"
+            f"ANSWER: A\n"
+            f"{difficulty}"
+            f"EXPLANATION: Option one is correct.{_filler(padding)}\n"
+            f"TOPIC: Stub Topic\n"
+            f"CHAPTER: Stub Chapter"
+        )
+    return '---\n' + '\n---\n'.join(blocks) + '\n---'
+
+
+def fake_questions_json(count, label='Stub', padding=0, difficulties=None):
+    """Response text in the structured-output format of the json mode"""
+    questions = []
+    for i in range(1, count + 1):
+        question = {
+            'question': f"{label} question {i}: which option is correct?",
+            'options': {'A': 'Option one', 'B': 'Option two', 'C': 'Option three', 'D': 'Option four'},
+            'answer': 'A',
+            'explanation': 'Option one is correct.' + _filler(padding),
+            'topic': 'Stub Topic',
+            'chapter': 'Stub Chapter'
+        }
+        if difficulties:
+            question['difficulty'] = difficulties[i - 1]
+        questions.append(question)
+    return json.dumps({'questions': questions}, indent=1)
+
+
+class OpenAIStubServer:
+    """Threaded stub server; use as a context manager or start()/stop()"""
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0, stream_delay=0.0, padding=0, token_rate=None):
+        self.latency = latency
+        self.stream_delay = stream_delay
+        self.padding = padding
+        self.token_rate = token_rate  # Completion tokens streamed per second; None is instant
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='openai-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def complete(self, body, number=0):
+        """Build a chat completion response for the number-th request body"""
+        prompt = body['messages'][-1]['content']
+        match = _COUNT_PATTERN.search(prompt)
+        count = int(match.group(1)) if match else 1
+        padding = self.padding
+        if isinstance(padding, dict):
+            subject = _SUBJECT_PATTERN.search(prompt)
+            padding = padding.get(subject.group(1) if subject else None, 0)
+        mix = _MIX_PATTERN.search(prompt)
+        difficulties = None
+        if mix:
+            difficulties = [level for part in mix.group(1).split(', ')
+                            for level in [part.split()[1]] * int(part.split()[0])]
+            count = len(difficulties)
+        if (body.get('response_format') or {}).get('type') == 'json_object':
+            content = fake_questions_json(count, label=f"Stub {number}", padding=padding, difficulties=difficulties)
+        else:
+            content = fake_questions(count, label=f"Stub {number}", padding=padding, difficulties=difficulties)
+        finish_reason = 'stop'
+        max_tokens = body.get('max_tokens')
+        if max_tokens and len(content) // 4 > max_tokens:
+            content = content[:max_tokens * 4]  # About four characters a token
+            finish_reason = 'length'
+        return {
+            'id': f'chatcmpl-stub-{number}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': finish_reason
+            }],
+            'usage': {
+                'prompt_tokens': len(prompt) // 4,
+                'completion_tokens': len(content) // 4,
+                'total_tokens': (len(prompt) + len(content)) // 4
+            }
+        }
+
+    def stream_chunks(self, response, piece_chars=64, include_usage=False):
+        """Split a completion into chat.completion.chunk payloads.
+        
+        Content goes out in small pieces that ignore line and separator
+        boundaries; a None entry marks the end of each question block, where
+        the handler waits stream_delay. With include_usage a final chunk
+        without choices reports the token usage, as stream_options asks.
+        """
+        def chunk(delta, finish_reason=None):
+            return {
+                'id': response['id'],
+                'object': 'chat.completion.chunk',
+                'created': response['created'],
+                'model': response['model'],
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }
+
+        chunks = [chunk({'role': 'assistant', 'content': ''})]
+        for block in re.split(r'(?<=\n---)', response['choices'][0]['message']['content']):
+            chunks.extend(chunk({'content': block[i:i + piece_chars]}) for i in range(0, len(block), piece_chars))
+            chunks.append(None)
+        chunks.append(chunk({}, response['choices'][0]['finish_reason']))
+        if include_usage:
+            chunks.append(dict(chunk({}), choices=[], usage=response['usage']))
+        return chunks
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, so pooled connections are reused
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not self.path.endswith('/chat/completions'):
+                    self._send(404, {'error': {'message': f'Unknown path {self.path}'}})
+                    return
+
+                with stub._lock:
+                    stub.requests.append(body)
+                    number = len(stub.requests)
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.latency)
+                    response = stub.complete(body, number)
+                    if body.get('stream'):
+                        include_usage = (body.get('stream_options') or {}).get('include_usage', False)
+                        self._send_stream(stub.stream_chunks(response, include_usage=include_usage))
+                        return
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+                self._send(200, response)
+
+            def _send_stream(self, chunks):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for chunk in chunks:
+                        if chunk is None:
+                            time.sleep(stub.stream_delay)
+                        else:
+                            if stub.token_rate and chunk['choices']:
+                                time.sleep(len(chunk['choices'][0]['delta'].get('content') or '') / 4 / stub.token_rate)
+                            self._write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode())
+                    self._write_chunk(b'data: [DONE]\n\n')
+                    self._write_chunk(b'')
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # The client cancelled the stream
+
+            def _write_chunk(self, data):
+                self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+                self.wfile.flush()
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass  # Keep test output quiet
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local OpenAI-compatible stub server')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds added to every response')
+    parser.add_argument('--stream-delay', type=float, default=0.2, help='seconds between streamed questions')
+    args = parser.parse_args()
+
+    stub = OpenAIStubServer(latency=args.latency, port=args.port, stream_delay=args.stream_delay)
+    print(f"OpenAI stub listening on {stub.base_url} (latency {args.latency}s)")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
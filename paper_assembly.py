@@ -0,0 +1,93 @@
+"""
+Stratified paper assembly
+Fills a whole test blueprint - a list of (subject, difficulty, count) buckets -
+with a single SQL round trip instead of one query per bucket
+"""
+
+from functools import partial
+from sqlalchemy import and_, case, func, select
+from models import db, Question
+from question_pool import question_pool, load_sampled
+
+# Share of each difficulty used by the full paper and subject tests
+DEFAULT_DIFFICULTY_SPLIT = [('Easy', 0.25), ('Medium', 0.45), ('Hard', 0.30)]
+
+
+def split_by_difficulty(count, split=None):
+    """Split a question count across difficulties; the last level absorbs rounding"""
+    split = split or DEFAULT_DIFFICULTY_SPLIT
+    counts = []
+    remaining = count
+    for difficulty, weight in split[:-1]:
+        level_count = int(count * weight)
+        counts.append((difficulty, level_count))
+        remaining -= level_count
+    counts.append((split[-1][0], remaining))
+    return counts
+
+
+def build_blueprint(distribution, split=None):
+    """Turn {subject: count} into [(subject, difficulty, count), ...]"""
+    blueprint = []
+    for subject, count in distribution.items():
+        for difficulty, level_count in split_by_difficulty(count, split):
+            blueprint.append((subject, difficulty, level_count))
+    return blueprint
+
+
+def assemble_paper(stream, blueprint, exclude=None):
+    """Sample every bucket from the pool index and load all rows in one query.
+
+    Short buckets are topped up from neighboring difficulties of the same
+    subject, and ids deleted since the index loaded are replaced by fresh
+    draws. Returns questions grouped in blueprint order.
+    """
+    draws = [
+        (partial(question_pool.sample, stream, subject, difficulty), count)
+        for subject, difficulty, count in blueprint if count > 0
+    ]
+    return load_sampled(draws, exclude=exclude)
+
+
+def assemble_paper_windowed(stream, blueprint, exclude=None):
+    """Fetch the blueprint in one statement using per-bucket random ranking.
+
+    Ranks rows with ROW_NUMBER() OVER (PARTITION BY subject, difficulty ORDER BY
+    RANDOM()) and keeps each bucket's quota. Needs no in-memory index, but the
+    database ranks every row of the requested subjects, and buckets are filled
+    to their exact quota only (no neighboring difficulty top-up).
+    """
+    quotas = {}
+    for subject, difficulty, count in blueprint:
+        if count > 0:
+            quotas[(subject, difficulty)] = quotas.get((subject, difficulty), 0) + count
+    if not quotas:
+        return []
+
+    subjects = sorted({subject for subject, _ in quotas})
+    ranked = select(
+        Question.id,
+        Question.subject,
+        Question.difficulty,
+        func.row_number().over(
+            partition_by=(Question.subject, Question.difficulty),
+            order_by=func.random()
+        ).label('rank')
+    ).where(Question.stream == stream, Question.subject.in_(subjects))
+    if exclude:
+        ranked = ranked.where(Question.id.notin_(list(exclude)))
+    ranked = ranked.subquery()
+
+    quota = case(
+        *[
+            (and_(ranked.c.subject == subject, ranked.c.difficulty == difficulty), count)
+            for (subject, difficulty), count in quotas.items()
+        ],
+        else_=0
+    )
+    statement = select(Question).join(ranked, ranked.c.id == Question.id).where(ranked.c.rank <= quota)
+    questions = db.session.execute(statement).scalars().all()
+
+    order = {key: position for position, key in enumerate(quotas)}
+    questions.sort(key=lambda q: order[(q.subject, q.difficulty)])
+    return questions
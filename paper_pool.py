@@ -0,0 +1,101 @@
+"""
+Pre-generated paper pool
+Keeps a few ready-made papers per (stream, test_type, level) so starting a test
+only pops a paper; a background thread rebuilds papers whenever a pool drops
+below its low-water mark. Papers are kept as question ids and loaded in the
+popping request's session, since the refill thread's objects expire on commit
+"""
+
+import threading
+import traceback
+from collections import defaultdict, deque
+from question_pool import load_questions
+
+
+class PaperPool:
+    """Ready papers per key, refilled by a daemon thread inside an app context"""
+
+    def __init__(self, build_paper, app=None, load_paper=load_questions):
+        self.build_paper = build_paper
+        self.load_paper = load_paper
+        self._papers = defaultdict(deque)
+        self._wanted = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('PAPER_POOL_ENABLED', True)
+        app.config.setdefault('PAPER_POOL_LOW_WATER', 2)
+        app.config.setdefault('PAPER_POOL_TARGET', 4)
+        app.config.setdefault('PAPER_POOL_REFILL_INTERVAL', 60)  # seconds
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['PAPER_POOL_ENABLED']
+
+    def size(self, stream, test_type, level=None):
+        with self._lock:
+            return len(self._papers.get((stream, test_type, level), ()))
+
+    def pop(self, stream, test_type, level=None):
+        """Take a ready paper, building one inline only if the pool is empty"""
+        if not self.enabled:
+            return self.build_paper(stream, test_type, level)
+
+        key = (stream, test_type, level)
+        with self._lock:
+            self._wanted.add(key)
+            papers = self._papers[key]
+            paper_ids = papers.popleft() if papers else None
+            below_low_water = len(papers) < self.app.config['PAPER_POOL_LOW_WATER']
+
+        if below_low_water:
+            self._ensure_started()
+            self._wakeup.set()
+
+        if paper_ids is None:
+            print(f"Paper pool empty for {key}, building inline")
+            return self.build_paper(stream, test_type, level)
+        return self.load_paper(paper_ids)
+
+    def refill(self):
+        """Top every requested pool up to its target size"""
+        target = self.app.config['PAPER_POOL_TARGET']
+        with self._lock:
+            keys = list(self._wanted)
+
+        for key in keys:
+            while self.size(*key) < target:
+                paper = self.build_paper(*key)
+                if not paper:
+                    break  # Nothing to build from; try again later
+                with self._lock:
+                    self._papers[key].append([question.id for question in paper])
+
+    def clear(self):
+        with self._lock:
+            self._papers.clear()
+            self._wanted.clear()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='paper-pool-refill', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.app.config['PAPER_POOL_REFILL_INTERVAL'])
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    self.refill()
+            except Exception as e:
+                print(f"Paper pool refill failed: {e}")
+                traceback.print_exc()
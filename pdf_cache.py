@@ -0,0 +1,151 @@
+"""
+Two-tier cache for extracted PDF text
+A byte-bounded in-memory LRU sits in front of an on-disk store shared by every
+process. Entries are keyed by the PDF's content hash plus the extraction
+parameters, so an unchanged PDF is parsed once per deployment instead of once
+per worker restart, and a replaced PDF simply misses.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'pdf_cache')
+DEFAULT_MEMORY_BYTES = 32 * 1024 * 1024
+EXTRACTOR_VERSION = 1  # Bump when extraction output changes to orphan old entries
+PAGE_BREAK = '\f'  # Separates the pages of a page-window entry
+
+
+class PDFTextCache:
+    """Memory LRU over a content-addressed directory of .txt files"""
+
+    def __init__(self, directory=None, max_memory_bytes=None):
+        self.directory = directory or os.getenv('PDF_CACHE_DIR', DEFAULT_DIRECTORY)
+        if max_memory_bytes is None:
+            max_memory_bytes = int(os.getenv('PDF_CACHE_MEMORY_BYTES', DEFAULT_MEMORY_BYTES))
+        self.max_memory_bytes = max_memory_bytes
+        self.stats = {'memory': 0, 'disk': 0, 'miss': 0}
+        self._memory = OrderedDict()  # key -> (text, size in bytes)
+        self._memory_bytes = 0
+        self._file_hashes = {}  # (path, size, mtime_ns) -> sha256 of the file
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    @property
+    def memory_bytes(self):
+        return self._memory_bytes
+
+    def file_hash(self, path):
+        """SHA-256 of a file, recomputed only when its size or mtime changes"""
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._file_hashes.get(memo_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            self._file_hashes[memo_key] = digest
+        return digest
+
+    def cache_key(self, path, **params):
+        """Key from the PDF content and the extraction parameters"""
+        params['extractor_version'] = EXTRACTOR_VERSION
+        material = self.file_hash(path) + json.dumps(params, sort_keys=True)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def get(self, key):
+        """Cached text for a key from memory, then disk; None on a miss"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory'] += 1
+                return entry[0]
+
+        try:
+            with open(self._disk_path(key), encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        self.stats['disk'] += 1
+        self._remember(key, text)
+        return text
+
+    def put(self, key, text):
+        """Store text on disk (atomically) and in memory"""
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._remember(key, text)
+
+    def get_or_extract(self, path, extract, **params):
+        """Cached text for a PDF, calling extract() at most once per key"""
+        key = self.cache_key(path, **params)
+        text = self.get(key)
+        if text is not None:
+            return text
+
+        with self._lock_for(key):
+            # Another thread may have extracted it while we waited
+            text = self.get(key)
+            if text is None:
+                self.stats['miss'] += 1
+                text = extract()
+                self.put(key, text)
+        return text
+
+    def get_or_extract_pages(self, path, extract_pages, start_page=0, **params):
+        """Cached [(page_number, text)] for a window of a PDF's pages.
+
+        extract_pages() yields (page_number, text) for every page of the
+        window; the pages are stored as one entry, split on PAGE_BREAK.
+        """
+        def extract():
+            return PAGE_BREAK.join(text.replace(PAGE_BREAK, '\n') for _, text in extract_pages())
+
+        text = self.get_or_extract(path, extract, start_page=start_page, pages=True, **params)
+        return [(start_page + offset, page) for offset, page in enumerate(text.split(PAGE_BREAK))]
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+
+    def _remember(self, key, text):
+        size = sys.getsizeof(text)
+        if size > self.max_memory_bytes:
+            return  # Too big for the memory tier; served from disk
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = (text, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (_, evicted_size) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_size
+
+    def _lock_for(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.txt')
+
+
+# Process-wide cache shared by all question generators
+pdf_text_cache = PDFTextCache()
@@ -0,0 +1,95 @@
+"""
+Parallel, streaming PDF page extraction
+Pages are split into chunks that worker processes extract independently, each
+opening the PDF itself, since pdfplumber pages cannot be pickled. Texts are
+yielded in page order as soon as their chunk is done, with a bounded number of
+chunks in flight, so callers can start consuming early and memory stays flat
+for large windows.
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+CHUNK_PAGES = 8  # Pages per task sent to a worker
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def open_pdf(pdf_path):
+    """Open a PDF with pdfplumber, imported here so cached text never loads it"""
+    import pdfplumber
+    return pdfplumber.open(pdf_path)
+
+
+def page_count(pdf_path):
+    with open_pdf(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def extract_page_range(pdf_path, start, stop):
+    """Texts of pages [start, stop); runs inside a worker process"""
+    with open_pdf(pdf_path) as pdf:
+        return [_page_text(page) for page in pdf.pages[start:stop]]
+
+
+def _page_text(page):
+    text = page.extract_text() or ''
+    page.flush_cache()  # Drop parsed layout objects once the text is out
+    return text
+
+
+def iter_page_texts(pdf_path, start_page=0, max_pages=None, workers=None, chunk_pages=CHUNK_PAGES):
+    """Yield (page_number, text) for a window of pages, in order.
+
+    start_page is zero-based; max_pages=None runs to the end of the document.
+    With workers > 1 chunks are extracted by a shared process pool.
+    """
+    total = page_count(pdf_path)
+    stop = total if max_pages is None else min(total, start_page + max_pages)
+    if start_page >= stop:
+        return
+
+    workers = workers or int(os.getenv('PDF_EXTRACT_WORKERS', DEFAULT_WORKERS))
+    chunks = [(start, min(start + chunk_pages, stop)) for start in range(start_page, stop, chunk_pages)]
+
+    if workers <= 1 or len(chunks) == 1:
+        # Not worth a process hop; still streams page by page
+        with open_pdf(pdf_path) as pdf:
+            for number in range(start_page, stop):
+                yield number, _page_text(pdf.pages[number])
+        return
+
+    pool = _get_pool(workers)
+    pending = deque()
+    next_chunk = 0
+    # Keep two chunks per worker queued so workers never idle waiting on us
+    while next_chunk < len(chunks) or pending:
+        while next_chunk < len(chunks) and len(pending) < workers * 2:
+            start, end = chunks[next_chunk]
+            pending.append((start, pool.submit(extract_page_range, pdf_path, start, end)))
+            next_chunk += 1
+        start, future = pending.popleft()
+        for offset, text in enumerate(future.result()):
+            yield start + offset, text
+
+
+def extract_text(pdf_path, start_page=0, max_pages=None, workers=None):
+    """Non-empty page texts of a window joined by blank lines"""
+    return "\n\n".join(
+        text for _, text in iter_page_texts(pdf_path, start_page, max_pages, workers) if text
+    )
+
+
+def _get_pool(workers):
+    # One long-lived pool per size; spawn avoids forking a threaded web process
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pools[workers] = pool
+        return pool
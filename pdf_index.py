@@ -0,0 +1,228 @@
+"""
+BM25 retrieval over question-bank PDFs
+Pages extracted through the PDF text cache are split into paragraph-sized
+chunks and indexed once; the index is saved next to the text cache, keyed by
+the PDF content hash, so every process loads it instead of rebuilding, and a
+rebuild (new chunking or index version) reuses the cached text. The prompt
+builder asks for the chunks most relevant to a topic or chapter instead of
+sending the first few thousand characters of the PDF.
+"""
+
+import gzip
+import heapq
+import json
+import math
+import os
+import random
+import re
+import tempfile
+import threading
+from collections import Counter
+from pdf_cache import pdf_text_cache
+from pdf_extraction import iter_page_texts
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'pdf_index')
+CHUNK_CHARS = 600  # Target chunk size; paragraphs are merged or split to fit
+INDEX_VERSION = 1
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+STOPWORDS = frozenset(
+    'a an and are as at be by for from has in is it its of on or that the this to was were which with '
+    'what when where who why how than then these those into can will if not no'.split()
+)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+def split_chunks(pages, chunk_chars=CHUNK_CHARS):
+    """[(page_number, chunk_text), ...] from [(page_number, page_text), ...].
+
+    Paragraphs (blank-line separated, else single lines) are packed into
+    chunks of about chunk_chars without crossing page boundaries.
+    """
+    chunks = []
+    for page_number, text in pages:
+        paragraphs = _PARAGRAPH_BREAK.split(text)
+        if len(paragraphs) == 1:
+            paragraphs = text.split('\n')
+
+        current = []
+        size = 0
+        for paragraph in paragraphs:
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if current and size + len(paragraph) > chunk_chars:
+                chunks.append((page_number, '\n'.join(current)))
+                current, size = [], 0
+            current.append(paragraph)
+            size += len(paragraph) + 1
+        if current:
+            chunks.append((page_number, '\n'.join(current)))
+    return chunks
+
+
+class ChunkIndex:
+    """Okapi BM25 over a list of (page_number, text) chunks"""
+
+    def __init__(self, chunks, postings=None, lengths=None, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        if postings is None:
+            postings, lengths = {}, []
+            for chunk_id, (_, text) in enumerate(chunks):
+                counts = Counter(tokenize(text))
+                lengths.append(sum(counts.values()))
+                for term, tf in counts.items():
+                    postings.setdefault(term, []).append((chunk_id, tf))
+        self.postings = postings  # term -> [(chunk_id, term frequency), ...]
+        self.lengths = lengths
+        self.average_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query, k=5):
+        """Top k (score, chunk_id) for a free-text query"""
+        scores = Counter()
+        n = len(self.chunks)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / self.average_length)
+                scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, ((score, chunk_id) for chunk_id, score in scores.items()))
+
+    def reference_texts(self, query, batches, max_chars, rng=None):
+        """One reference text per batch of at most max_chars.
+
+        With a query, batches take the best matching chunks in turn so each
+        prompt gets different relevant material. Without one, or when nothing
+        matches, batches get random chunks for variety.
+        """
+        if not self.chunks:
+            return []
+        per_batch = max(1, max_chars // CHUNK_CHARS + 1)
+        ranked = [chunk_id for _, chunk_id in self.search(query, k=per_batch * batches)] if query else []
+        if not ranked:
+            rng = rng or random
+            ranked = rng.sample(range(len(self.chunks)), min(len(self.chunks), per_batch * batches))
+
+        texts = []
+        for batch in range(batches):
+            # Round-robin so the best chunk of each batch is as good as possible
+            chunk_ids = ranked[batch::batches] or ranked[:per_batch]
+            text = '\n\n'.join(self.chunks[chunk_id][1] for chunk_id in chunk_ids)
+            texts.append(text[:max_chars])
+        return texts
+
+    def to_dict(self):
+        return {
+            'version': INDEX_VERSION,
+            'chunks': self.chunks,
+            'postings': self.postings,
+            'lengths': self.lengths
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        chunks = [tuple(chunk) for chunk in data['chunks']]
+        postings = {term: [tuple(entry) for entry in entries] for term, entries in data['postings'].items()}
+        return cls(chunks, postings, data['lengths'])
+
+
+class ChunkIndexStore:
+    """Indexes per PDF, in memory and as gzipped JSON on disk"""
+
+    def __init__(self, directory=None, text_cache=None):
+        self.directory = directory or os.getenv('PDF_INDEX_DIR', DEFAULT_DIRECTORY)
+        self.text_cache = text_cache or pdf_text_cache
+        self._indexes = {}
+        self._warming = set()
+        self._lock = threading.Lock()  # Guards the dicts; each build holds only its key's lock
+        self._key_locks = {}
+
+    def get(self, pdf_path, max_pages=None, workers=None, wait=True):
+        """Index for a PDF's first max_pages pages, built at most once.
+
+        With wait False only an index already in memory is returned; otherwise
+        it is loaded or built on a background thread and None returned.
+        """
+        key = self.text_cache.cache_key(pdf_path, max_pages=max_pages, index_version=INDEX_VERSION,
+                                       chunk_chars=CHUNK_CHARS)
+        index = self._indexes.get(key)
+        if index is not None:
+            return index
+        if not wait:
+            self._warm(key, pdf_path, max_pages, workers)
+            return None
+
+        with self._lock_for(key):
+            index = self._indexes.get(key) or self._load(key)
+            if index is None:
+                pages = self.text_cache.get_or_extract_pages(
+                    pdf_path, lambda: iter_page_texts(pdf_path, max_pages=max_pages, workers=workers),
+                    max_pages=max_pages
+                )
+                index = ChunkIndex(split_chunks(pages))
+                self._save(key, index)
+                print(f"Indexed {pdf_path}: {len(index)} chunks")
+            with self._lock:
+                self._indexes[key] = index
+        return index
+
+    def _lock_for(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _warm(self, key, pdf_path, max_pages, workers):
+        with self._lock:
+            if key in self._warming:
+                return
+            self._warming.add(key)
+
+        def build():
+            try:
+                self.get(pdf_path, max_pages=max_pages, workers=workers)
+            except Exception as e:
+                print(f"Error indexing PDF {pdf_path}: {e}")
+            finally:
+                with self._lock:
+                    self._warming.discard(key)
+
+        threading.Thread(target=build, name='pdf-index-warm', daemon=True).start()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json.gz')
+
+    def _load(self, key):
+        try:
+            with gzip.open(self._path(key), 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        if data.get('version') != INDEX_VERSION:
+            return None
+        return ChunkIndex.from_dict(data)
+
+    def _save(self, key, index):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump(index.to_dict(), f)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+# Process-wide store shared by all question generators
+chunk_index_store = ChunkIndexStore()
@@ -0,0 +1,54 @@
+"""
+Keyed pseudo-random permutations
+A small Feistel network that maps 0..size-1 onto itself in a key-dependent order,
+so a position counter is all that is needed to walk a shuffled sequence
+"""
+
+MASK_64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+
+def _mix64(value):
+    """SplitMix64 finalizer"""
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & MASK_64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & MASK_64
+    return value ^ (value >> 31)
+
+
+class FeistelPermutation:
+    """Bijection on range(size) chosen by key; each lookup costs O(rounds)"""
+
+    def __init__(self, size, key, rounds=4):
+        if size < 0:
+            raise ValueError("size must be non-negative")
+        self.size = size
+        self.key = key & MASK_64
+        self.rounds = rounds
+
+        # Smallest even bit width covering size, split into two halves
+        bits = max(2, (size - 1).bit_length())
+        bits += bits % 2
+        self.half_bits = bits // 2
+        self.half_mask = (1 << self.half_bits) - 1
+
+    def _round(self, value, round_index):
+        return _mix64(value ^ (self.key + (round_index + 1) * GOLDEN_GAMMA & MASK_64)) & self.half_mask
+
+    def _encrypt(self, value):
+        left = value >> self.half_bits
+        right = value & self.half_mask
+        for round_index in range(self.rounds):
+            left, right = right, left ^ self._round(right, round_index)
+        return (left << self.half_bits) | right
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.size:
+            raise IndexError("permutation index out of range")
+        # Cycle-walk until the value lands inside the domain (domain <= 4 * size)
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
@@ -0,0 +1,323 @@
+"""
+Persisting generated questions
+AI output is written to the question bank in bulk with its provenance, so each
+paid generation is reused by later tests. Inserts are deduplicated on a hash of
+the normalized question text and options: a question already in the bank is
+returned instead of inserted again. Near-duplicates - the same question
+reworded, or with its options reordered - are caught by a MinHash/LSH index
+over the bank (question_dedup.py) and also resolve to the existing row.
+Hand-entered questions (seed scripts, admin uploads) are deduplicated the same
+way but carry no provenance row.
+
+The near-duplicate index covers the whole bank, so building it takes a while.
+Outside a request it is built when first needed; a request never waits for
+it: the first request starts building it in the background, and saves made
+before it is ready are checked for near-duplicates against their own batch
+only. Exact copies are still caught: through the provenance hash, or for
+hand-entered rows by matching their fields.
+"""
+
+import hashlib
+import re
+import threading
+import traceback
+from flask import has_request_context
+from sqlalchemy import event, func, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import db, Question, QuestionSource, InventoryItem
+from question_dedup import NearDuplicateIndex, THRESHOLD, find_duplicates
+from question_pool import load_questions
+
+QUESTION_FIELDS = [
+    'subject', 'chapter', 'topic', 'difficulty', 'question_text',
+    'option_a', 'option_b', 'option_c', 'option_d', 'correct_answer',
+    'explanation', 'stream'
+]
+DEDUP_FIELDS = ['stream', 'subject', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d']
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace so trivial variants hash the same"""
+    return _WHITESPACE.sub(' ', (text or '').strip().lower())
+
+
+def content_hash(q_data):
+    """Hash of a question's stream, subject, text and options"""
+    parts = [q_data['stream'], q_data['subject'], q_data['question_text'],
+             q_data['option_a'], q_data['option_b'], q_data['option_c'], q_data['option_d']]
+    return hashlib.sha256('\x1f'.join(normalize_text(part) for part in parts).encode()).hexdigest()
+
+
+class BankDuplicateIndex:
+    """Near-duplicate index over the whole question bank, built on first use.
+
+    refresh() loads questions added since the last call, including those
+    inserted by other processes, by the table's id high-water mark. warm()
+    builds it on a background thread instead.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._index = None
+        self._max_id = 0
+        self._thread = None
+
+    def init_app(self, app):
+        """Start building the index with the app's first request"""
+        self.app = app
+        app.config.setdefault('NEAR_DUPLICATE_WARM', True)
+
+        @app.before_request
+        def _warm_near_duplicates():
+            self.warm()
+
+    def ready(self):
+        return self._index is not None
+
+    def warm(self):
+        """Build the index on a background thread unless already built.
+
+        Returns True while the background build is running.
+        """
+        if self.app is None or not self.app.config['NEAR_DUPLICATE_WARM'] or self.ready():
+            return False
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._build, name='near-duplicate-warm', daemon=True)
+                self._thread.start()
+            return True
+
+    def _build(self):
+        try:
+            with self.app.app_context():
+                self.refresh()
+                db.session.remove()
+        except Exception as e:
+            print(f"Near-duplicate index build failed: {e}")
+            traceback.print_exc()
+
+    def invalidate(self):
+        """Drop the index; it is rebuilt on next use"""
+        with self._lock:
+            self._index = None
+            self._max_id = 0
+
+    def refresh(self):
+        with self._refresh_lock:
+            db_max_id = db.session.query(func.max(Question.id)).scalar() or 0
+            if self._index is None or db_max_id < self._max_id:
+                # First use, or the table was recreated. Built aside so lookups never wait on it
+                index = NearDuplicateIndex()
+                max_id = self._load(index, 0)
+                with self._lock:
+                    self._index, self._max_id = index, max_id
+            elif db_max_id > self._max_id:
+                with self._lock:
+                    self._max_id = self._load(self._index, self._max_id)
+
+    def _load(self, index, min_id):
+        """Add questions with id > min_id to index; returns the highest id added"""
+        columns = [getattr(Question, field) for field in DEDUP_FIELDS]
+        rows = db.session.query(Question.id, *columns).filter(Question.id > min_id).order_by(Question.id)
+        max_id = min_id
+        for row in rows.yield_per(5000):
+            index.add(row.id, row._asdict())
+            max_id = max(max_id, row.id)
+        return max_id
+
+    def find(self, q_data, fingerprint=None):
+        """Id of a near-duplicate of q_data in the bank, or None"""
+        with self._lock:
+            if self._index is None:
+                return None
+            match = self._index.find(q_data, fingerprint)
+            return match[0] if match else None
+
+    def add(self, question_id, q_data, fingerprint=None):
+        with self._lock:
+            if self._index is not None:
+                self._index.add(question_id, q_data, fingerprint)
+
+    def remove(self, question_id):
+        with self._lock:
+            if self._index is not None:
+                self._index.remove(question_id)
+
+
+# Process-wide near-duplicate index of the bank
+near_duplicates = BankDuplicateIndex()
+
+
+def save_generated_questions(questions_data, model=None):
+    """Write generated question dicts to the bank in one flush and commit.
+
+    Provenance comes from each dict's model, prompt_hash and source_pdf keys.
+    Returns a persisted Question for each input dict, in order; duplicates
+    and near-duplicates, within the batch or of questions already in the
+    bank, share one row.
+    """
+    return _save(questions_data, model, provenance=True)
+
+
+def save_questions(questions_data):
+    """Write hand-entered question dicts to the bank, without provenance.
+
+    Deduplicated like generated questions; returns a persisted Question for
+    each input dict, in order.
+    """
+    return _save(questions_data, None, provenance=False)
+
+
+def _save(questions_data, model, provenance):
+    hashes = [content_hash(q_data) for q_data in questions_data]
+    by_hash = {}
+    for digest, q_data in zip(hashes, questions_data):
+        by_hash.setdefault(digest, q_data)
+    if not by_hash:
+        return []
+
+    try:
+        question_ids = _insert_new(by_hash, model, provenance)
+    except IntegrityError:
+        # Another worker inserted some of the same questions first
+        db.session.rollback()
+        question_ids = _insert_new(by_hash, model, provenance)
+
+    questions = {question.id: question for question in load_questions(list(question_ids.values()))}
+    return [questions[question_ids[digest]] for digest in hashes if question_ids[digest] in questions]
+
+
+def _insert_new(by_hash, model, provenance):
+    existing = dict(
+        db.session.query(QuestionSource.content_hash, QuestionSource.question_id)
+        .filter(QuestionSource.content_hash.in_(list(by_hash)))
+        .all()
+    )
+
+    if not (has_request_context() and near_duplicates.warm()):
+        near_duplicates.refresh()
+    if not near_duplicates.ready():
+        # Hand-entered rows have no source hash; until the bank index is built
+        # only an exact match on their fields catches them
+        existing.update(_unsourced_matches(by_hash, existing))
+    batch = NearDuplicateIndex()
+    new_questions = {}
+    fingerprints = {}
+    similar = {}  # digest -> id of a near-duplicate in the bank, or digest of one earlier in the batch
+    for digest, q_data in by_hash.items():
+        if digest in existing:
+            continue
+        fingerprint = batch.fingerprint(q_data)
+        match = near_duplicates.find(q_data, fingerprint)
+        if match is None:
+            match = batch.find(q_data, fingerprint)
+            match = match and match[0]
+        if match is not None:
+            similar[digest] = match
+            continue
+        batch.add(digest, q_data, fingerprint)
+        fingerprints[digest] = fingerprint
+        question = Question(**{field: q_data.get(field) for field in QUESTION_FIELDS})
+        if provenance:
+            question.source = QuestionSource(
+                content_hash=digest,
+                model=q_data.get('model') or model,
+                prompt_hash=q_data.get('prompt_hash'),
+                source_pdf=q_data.get('source_pdf')
+            )
+        new_questions[digest] = question
+
+    db.session.add_all(new_questions.values())
+    db.session.flush()
+    # Read ids before the commit expires the rows, which would reload each one
+    question_ids = {digest: question.id for digest, question in new_questions.items()}
+    db.session.commit()
+
+    for digest, question_id in question_ids.items():
+        near_duplicates.add(question_id, by_hash[digest], fingerprints[digest])
+
+    print(f"✓ Saved {len(new_questions)} {'generated ' if provenance else ''}questions "
+          f"({len(existing)} already in the bank, {len(similar)} near-duplicates)")
+    question_ids.update(existing)
+    for digest, match in similar.items():
+        question_ids[digest] = question_ids.get(match, match)
+    return question_ids
+
+
+def _unsourced_matches(by_hash, existing):
+    """{digest: question id} of bank rows without provenance matching a question not in existing"""
+    pending = {digest: q_data for digest, q_data in by_hash.items() if digest not in existing}
+    if not pending:
+        return {}
+    texts = {q_data['question_text'] for q_data in pending.values()}
+    columns = [getattr(Question, field) for field in DEDUP_FIELDS]
+    rows = (
+        db.session.query(Question.id, *columns)
+        .outerjoin(QuestionSource, QuestionSource.question_id == Question.id)
+        .filter(QuestionSource.id.is_(None))
+        .filter(or_(Question.question_text.in_(list(texts)),
+                    func.lower(Question.question_text).in_([normalize_text(text) for text in texts])))
+    )
+    matches = {}
+    for row in rows:
+        digest = content_hash(row._asdict())
+        if digest in pending:
+            matches.setdefault(digest, row.id)
+    return matches
+
+
+def compact_question_bank(apply=False, threshold=THRESHOLD):
+    """Find near-duplicate questions across the bank, keeping the oldest of each.
+
+    Returns {duplicate id: kept id}. With apply the duplicates are deleted,
+    along with their provenance and inventory rows; past test attempts that
+    reference them skip them, as they do any missing question.
+    """
+    columns = [getattr(Question, field) for field in DEDUP_FIELDS]
+    rows = db.session.query(Question.id, *columns).order_by(Question.id).yield_per(5000)
+    duplicates = find_duplicates(((row.id, row._asdict()) for row in rows), threshold)
+    if not apply or not duplicates:
+        return duplicates
+
+    ids = list(duplicates)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        InventoryItem.query.filter(InventoryItem.question_id.in_(chunk)).delete(synchronize_session=False)
+        # ORM deletes keep the question pool index and provenance rows in step
+        for question in Question.query.filter(Question.id.in_(chunk)):
+            db.session.delete(question)
+    db.session.commit()
+    print(f"✓ Removed {len(ids)} near-duplicate questions")
+    return duplicates
+
+
+@event.listens_for(Question, 'after_delete')
+def _question_deleted(mapper, connection, target):
+    # Applied on commit, so a rolled-back delete leaves the row indexed
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('near_duplicates_removed', []).append(target.id)
+    else:
+        near_duplicates.remove(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _session_committed(session):
+    for question_id in session.info.pop('near_duplicates_removed', []):
+        near_duplicates.remove(question_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _session_rolled_back(session):
+    session.info.pop('near_duplicates_removed', None)
+
+
+@event.listens_for(Question.__table__, 'after_create')
+@event.listens_for(Question.__table__, 'after_drop')
+def _question_table_recreated(target, connection, **kw):
+    near_duplicates.invalidate()
@@ -0,0 +1,187 @@
+"""
+Near-duplicate question detection with MinHash and LSH
+A question is reduced to a set of features - character 5-grams of its
+normalized text plus each normalized option, so reordered options match -
+and summarized by a 64-value one-permutation MinHash signature. Signatures are banded into an LSH
+table, so a lookup only compares against questions sharing a band instead of
+scanning the bank. Questions are compared only within the same stream,
+subject and sequence of numbers in the text: '2 kg' and '3 kg' variants of a
+problem are different questions, not duplicates.
+
+Features are hashed with Python's string hash, which is seeded per process:
+signatures are never stored, each process indexes the bank it reads.
+"""
+
+import functools
+import operator
+import random
+import re
+
+NUM_HASHES = 64
+BANDS = 16  # 4 values per band: pairs at 0.7 similarity share a band with ~99% probability
+THRESHOLD = 0.7  # Estimated Jaccard similarity at which questions are duplicates
+SHINGLE_SIZE = 5
+
+_TOKEN = re.compile(r'\w+')
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+_MASK = (1 << 64) - 1
+_EMPTY = 1 << 64  # Larger than any bin value
+
+
+def normalize(text):
+    """Lowercase words separated by single spaces, punctuation dropped"""
+    return ' '.join(_TOKEN.findall((text or '').lower()))
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Character n-grams of normalized text; the whole text if it is shorter"""
+    text = normalize(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+@functools.lru_cache(maxsize=None)
+def _probe_orders(num_hashes):
+    """For each bin, the other bins in a fixed random order"""
+    rng = random.Random(num_hashes)
+    orders = []
+    for i in range(num_hashes):
+        order = [j for j in range(num_hashes) if j != i]
+        rng.shuffle(order)
+        orders.append(order)
+    return orders
+
+
+def minhash(features, num_hashes=NUM_HASHES):
+    """One-permutation MinHash signature of a feature set, or None if empty.
+
+    Each feature is hashed once into one of num_hashes bins, keeping the
+    minimum per bin; empty bins borrow the first filled bin in their own
+    random probe order, offset by the probe count, so short questions still
+    get comparable signatures. Probing the neighbouring bin instead copies one
+    value into runs of empty bins and overstates short questions' similarity.
+    """
+    bins = [_EMPTY] * num_hashes
+    for feature in features:
+        value = hash(feature) & _MASK
+        index = value % num_hashes
+        value //= num_hashes
+        if value < bins[index]:
+            bins[index] = value
+    if _EMPTY not in bins:
+        return bins
+    if all(value == _EMPTY for value in bins):
+        return None
+
+    signature = list(bins)
+    for i, order in enumerate(_probe_orders(num_hashes)):
+        if bins[i] == _EMPTY:
+            for step, j in enumerate(order, 1):
+                if bins[j] != _EMPTY:
+                    signature[i] = bins[j] + step * _EMPTY
+                    break
+    return signature
+
+
+def question_fingerprint(q_data, num_hashes=NUM_HASHES):
+    """(scope, signature) of a question dict; signature is None without text"""
+    text = q_data.get('question_text') or ''
+    features = shingles(text)
+    for letter in 'abcd':
+        option = normalize(q_data.get(f'option_{letter}'))
+        if option:
+            features.add(f'option:{option}')
+    numbers = tuple(_NUMBER.findall(text))
+    scope = ((q_data.get('stream') or '').upper(), (q_data.get('subject') or '').lower(), numbers)
+    return scope, minhash(features, num_hashes)
+
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(map(operator.eq, first, second)) / len(first)
+
+
+class NearDuplicateIndex:
+    """LSH table of question signatures.
+
+    find() returns the indexed key most similar to a question, if at least
+    threshold similar; add() indexes a question under a key. Keys are
+    whatever the caller uses to identify questions (ids, hashes).
+    """
+
+    def __init__(self, threshold=THRESHOLD, num_hashes=NUM_HASHES, bands=BANDS):
+        if num_hashes % bands:
+            raise ValueError(f"num_hashes ({num_hashes}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.num_hashes = num_hashes
+        self.bands = bands
+        self.rows = num_hashes // bands
+        self._buckets = {}  # (scope, band, band values) -> [key, ...]
+        self._entries = {}  # key -> (scope, signature)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def _band_keys(self, scope, signature):
+        rows = self.rows
+        return [(scope, band, tuple(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+
+    def fingerprint(self, q_data):
+        return question_fingerprint(q_data, self.num_hashes)
+
+    def find(self, q_data, fingerprint=None):
+        """(key, similarity) of the closest indexed near-duplicate, or None"""
+        scope, signature = fingerprint or self.fingerprint(q_data)
+        if signature is None:
+            return None
+        best = None
+        seen = set()
+        for band_key in self._band_keys(scope, signature):
+            for key in self._buckets.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                score = similarity(signature, self._entries[key][1])
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (key, score)
+        return best
+
+    def add(self, key, q_data, fingerprint=None):
+        scope, signature = fingerprint or self.fingerprint(q_data)
+        if signature is None or key in self._entries:
+            return
+        self._entries[key] = (scope, signature)
+        for band_key in self._band_keys(scope, signature):
+            self._buckets.setdefault(band_key, []).append(key)
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for band_key in self._band_keys(*entry):
+            bucket = self._buckets.get(band_key)
+            if bucket and key in bucket:
+                bucket.remove(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+
+def find_duplicates(items, threshold=THRESHOLD):
+    """{duplicate key: kept key} for (key, question dict) pairs, in keep order.
+
+    The first of each group of near-duplicates is kept; later ones map to it.
+    """
+    index = NearDuplicateIndex(threshold)
+    duplicates = {}
+    for key, q_data in items:
+        fingerprint = index.fingerprint(q_data)
+        match = index.find(q_data, fingerprint)
+        if match:
+            duplicates[key] = match[0]
+        else:
+            index.add(key, q_data, fingerprint)
+    return duplicates
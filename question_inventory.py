@@ -0,0 +1,186 @@
+"""
+Prewarmed AI question inventory
+Generated questions wait in the inventory table, one bucket per (stream,
+subject, difficulty, topic), until a test claims them. Claiming deletes the
+rows, so every inventory question is served once. A background job tops up
+buckets that fall below their low-water mark, so tests rarely wait on the
+AI API: they take what the inventory holds, generate what it lacks within
+the generator's deadline (QUESTION_INVENTORY_GENERATE_MISSES) and fill the
+rest from the bank.
+"""
+
+from collections import defaultdict
+from sqlalchemy import delete, func, select
+from job_queue import job_queue
+from models import db, InventoryItem, Job, Question
+from question_bank import save_generated_questions
+from question_pool import DIFFICULTIES, load_questions
+
+STREAM_SUBJECTS = {
+    'NEET': ['Physics', 'Chemistry', 'Biology'],
+    'JEE': ['Physics', 'Chemistry', 'Mathematics']
+}
+ANY_TOPIC = ''
+REFILL_TASK = 'refill_question_inventory'  # Registered in app.py
+
+
+class QuestionInventory:
+    """Claim and refill operations on the inventory table"""
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('QUESTION_INVENTORY_ENABLED', True)
+        app.config.setdefault('QUESTION_INVENTORY_LOW_WATER', 20)  # Refill buckets below this
+        app.config.setdefault('QUESTION_INVENTORY_TARGET', 60)  # Questions kept per bucket
+        app.config.setdefault('QUESTION_INVENTORY_GENERATE_MISSES', True)  # Generate what a take comes up short
+
+    @property
+    def enabled(self):
+        return self.app is not None and self.app.config['QUESTION_INVENTORY_ENABLED']
+
+    @property
+    def generate_misses(self):
+        return self.enabled and self.app.config['QUESTION_INVENTORY_GENERATE_MISSES']
+
+    def default_buckets(self):
+        """Every (stream, subject, difficulty) bucket on any topic"""
+        return [(stream, subject, difficulty, ANY_TOPIC)
+                for stream, subjects in STREAM_SUBJECTS.items()
+                for subject in subjects
+                for difficulty in DIFFICULTIES]
+
+    def counts(self):
+        """{(stream, subject, difficulty, topic): unserved questions} in one query"""
+        rows = db.session.execute(
+            select(InventoryItem.stream, InventoryItem.subject, InventoryItem.difficulty,
+                   InventoryItem.topic, func.count())
+            .group_by(InventoryItem.stream, InventoryItem.subject, InventoryItem.difficulty, InventoryItem.topic)
+        ).all()
+        return {tuple(row[:4]): row[4] for row in rows}
+
+    def take(self, stream, blueprint, topic=None, exclude=None):
+        """Claim up to count questions per (subject, difficulty, count) bucket.
+
+        Each bucket is claimed with one DELETE ... RETURNING, so concurrent
+        tests never get the same question. Returns {(subject, difficulty):
+        [Question]}; buckets left below the low-water mark get a refill job.
+        """
+        topic = topic or ANY_TOPIC
+        exclude = list(exclude or ())
+        claimed = {}
+        for subject, difficulty, count in blueprint:
+            if count <= 0:
+                continue
+            oldest = (
+                select(InventoryItem.question_id)
+                .where(InventoryItem.stream == stream,
+                       InventoryItem.subject == subject,
+                       InventoryItem.difficulty == difficulty,
+                       InventoryItem.topic == topic,
+                       InventoryItem.question_id.not_in(exclude))
+                .order_by(InventoryItem.created_at, InventoryItem.question_id)
+                .limit(count)
+            )
+            question_ids = db.session.execute(
+                delete(InventoryItem)
+                .where(InventoryItem.question_id.in_(oldest))
+                .returning(InventoryItem.question_id)
+                .execution_options(synchronize_session=False)
+            ).scalars().all()
+            claimed[(subject, difficulty)] = sorted(question_ids)
+
+        counts = self.counts()
+        low_water = self.app.config['QUESTION_INVENTORY_LOW_WATER']
+        low = [[stream, subject, difficulty, topic] for subject, difficulty in claimed
+               if counts.get((stream, subject, difficulty, topic), 0) < low_water]
+        db.session.commit()
+        if low:
+            self.request_refill(low)
+
+        return {key: load_questions(question_ids) for key, question_ids in claimed.items()}
+
+    def request_refill(self, buckets):
+        """Enqueue a refill job for these buckets unless one is already waiting"""
+        pending = db.session.query(Job.id).filter(Job.task == REFILL_TASK, Job.status == 'queued').first()
+        if pending is not None:
+            # A queued refill tops up every watched bucket; topic buckets
+            # are watched once they hold questions or are asked for here
+            job = db.session.get(Job, pending.id)
+            payload = job.get_payload()
+            requested = payload.get('buckets', [])
+            requested.extend(bucket for bucket in buckets if bucket not in requested)
+            job.set_payload({'buckets': requested})
+            db.session.commit()
+            return job
+
+        job = job_queue.enqueue(REFILL_TASK, {'buckets': buckets})
+        db.session.commit()
+        return job
+
+    def refill(self, generator, buckets=None):
+        """Generate questions for every watched bucket below the low-water mark.
+
+        Watched buckets are the default ones, those already holding questions
+        and any passed in. Each bucket short of the low-water mark is topped up
+        to the target, one concurrent fan-out per (stream, topic).
+        Returns {'generated': n, 'buckets': m}.
+        """
+        low_water = self.app.config['QUESTION_INVENTORY_LOW_WATER']
+        target = self.app.config['QUESTION_INVENTORY_TARGET']
+        counts = self.counts()
+        watched = set(self.default_buckets()) | set(counts) | {tuple(bucket) for bucket in buckets or ()}
+
+        wanted = defaultdict(list)
+        for stream, subject, difficulty, topic in sorted(watched):
+            have = counts.get((stream, subject, difficulty, topic), 0)
+            if have < low_water:
+                wanted[(stream, topic)].append((subject, difficulty, target - have))
+
+        generated = 0
+        for (stream, topic), stream_buckets in wanted.items():
+            results = generator.generate_questions_for_buckets(stream, stream_buckets, topic=topic or None)
+            questions_data = [q_data for questions in results.values() for q_data in questions]
+            if topic:
+                for q_data in questions_data:
+                    q_data['chapter'] = topic  # Keep topic questions in their chapter's catalog
+            generated += self._stock(stream, topic, questions_data)
+
+        return {'generated': generated, 'buckets': sum(len(b) for b in wanted.values())}
+
+    def _stock(self, stream, topic, questions_data):
+        """Save generated questions and add the ones new to the bank to the inventory"""
+        # Questions resolving to rows already in the bank may have been served
+        # or be stocked already; only rows inserted by this save are stocked
+        high_water = db.session.query(func.max(Question.id)).scalar() or 0
+        questions = save_generated_questions(questions_data)
+        new_ids = {question.id for question in questions if question.id > high_water}
+        stocked = set(
+            db.session.execute(
+                select(InventoryItem.question_id).where(InventoryItem.question_id.in_(new_ids))
+            ).scalars()
+        )
+
+        added = 0
+        for question in questions:
+            if question.id not in new_ids or question.id in stocked:
+                continue
+            stocked.add(question.id)
+            added += 1
+            db.session.add(InventoryItem(
+                question_id=question.id,
+                stream=stream,
+                subject=question.subject,
+                difficulty=question.difficulty,
+                topic=topic
+            ))
+        db.session.commit()
+        return added
+
+
+# Process-wide inventory shared by the test engine and the refill job
+question_inventory = QuestionInventory()
@@ -0,0 +1,311 @@
+"""
+Parsers for AI question responses
+TextQuestionParser reads the '---'-separated text format in one pass over the
+lines, with a single compiled pattern classifying each line, and keeps blocks
+that are usable even when the model drifts from the format: markdown
+emphasis, '(A)' or 'a.' option labels, answers given as 'Option C' or as the
+option text, missing separators, an answer stated only in the explanation.
+JSONQuestionParser reads the structured-output format and validates each
+question object as soon as it has streamed in. Both accept text in arbitrary
+pieces and yield the same question dicts. For calls that ask for several
+difficulties at once, a parser given difficulties= takes each question's
+difficulty from its DIFFICULTY label and drops questions without a known one.
+"""
+
+import json
+import re
+
+# Every line is one match: a separator, a question header, an option, a
+# labelled field, or none of these - a continuation of the previous part
+_LINE = re.compile(
+    r'^[ \t>#*_]*(?:'
+    r'(?P<separator>-{3,}[ \t\r]*$)'
+    r'|(?P<header>(?:question|q)[ \t]*(?:\d+[ \t]*[:.)\-]?|[:.)\-]))'
+    r'|(?P<number>\d+[.)](?=\s))'
+    r'|\(?(?P<option>[a-d])[ \t]*[).:]'
+    r'|(?P<field>answer|correct[ \t]+answer|correct[ \t]+option|explanation|solution|topic|chapter|difficulty)'
+    r'[ \t]*[*_]*[ \t]*[:\-]'
+    r'|)(?P<value>.*)$',
+    re.IGNORECASE | re.MULTILINE
+)
+_SEPARATOR = re.compile(r'^\s*-{3,}\s*$')
+_VALUE_STRIP = ' \t\r*_'
+_FIELDS = {
+    'answer': 'answer', 'correct answer': 'answer', 'correct option': 'answer',
+    'explanation': 'explanation', 'solution': 'explanation',
+    'topic': 'topic', 'chapter': 'chapter', 'difficulty': 'difficulty'
+}
+_LETTER = re.compile(r'(?<![A-Za-z])([A-D])(?![A-Za-z])')
+_LOWER_LETTER = re.compile(r'(?<![A-Za-z])([a-d])(?![A-Za-z])')
+_ANSWER_IN_TEXT = re.compile(r'(?i:answer|option)\s*(?:is\s*)?:?\s*\(?([A-D])\)?(?![A-Za-z])')
+_OPTION_PREFIX = re.compile(r'^\(?[A-Da-d]\s*[).:]\s+')
+_WHITESPACE = re.compile(r'\s+')
+_JSON_ARRAY_START = re.compile(r'"questions"\s*:\s*\[|^\s*\[')
+
+LETTERS = 'ABCD'
+
+
+def _normalize(text):
+    return _WHITESPACE.sub(' ', text).strip().lower()
+
+
+def answer_letter(value, options):
+    """Correct option letter from an answer value, or None.
+
+    Accepts 'B', '(b)', 'Option B', 'B) 9.8 m/s' or the text of an option.
+    """
+    value = (value or '').strip()
+    if not value:
+        return None
+    if len(value) <= 3 and value.strip('()').upper() in LETTERS:
+        return value.strip('()').upper()  # 'B', 'b', '(B)'
+    normalized = _normalize(value)
+    for letter in LETTERS:
+        if options.get(letter) and _normalize(options[letter]) == normalized:
+            return letter
+    match = _LETTER.search(value) or (_LOWER_LETTER.search(value) if len(value) < 20 else None)
+    return match.group(1).upper() if match else None
+
+
+def difficulty_label(value, difficulties):
+    """The one of difficulties a label names ('medium', '**Hard**'), or None"""
+    value = _normalize(_string(value).strip(_VALUE_STRIP + '[]()'))
+    for difficulty in difficulties:
+        if difficulty.lower() == value:
+            return difficulty
+    return None
+
+
+def make_question(subject, stream, difficulty, text, options, answer, explanation='', topic='', chapter=''):
+    return {
+        'subject': subject,
+        'chapter': chapter or 'General',
+        'topic': topic or 'General',
+        'difficulty': difficulty,
+        'question_text': text,
+        'option_a': options['A'],
+        'option_b': options['B'],
+        'option_c': options['C'],
+        'option_d': options['D'],
+        'correct_answer': answer,
+        'explanation': explanation,
+        'stream': stream
+    }
+
+
+class TextQuestionParser:
+    """Streaming state machine over the text question format.
+
+    feed() takes text deltas and returns the questions completed by them;
+    a block ends at a '---' line or at the next question header. A bare
+    number ('3.' or '3)') only starts a block once the open one has reached
+    its options. close() finishes the last block.
+    """
+
+    def __init__(self, subject, stream, difficulty, difficulties=None):
+        self.subject = subject
+        self.stream = stream
+        self.difficulty = difficulty
+        self.difficulties = difficulties
+        self.partial = ''
+        self.blocks = 0
+        self._reset()
+
+    def _reset(self):
+        self.question = []
+        self.options = {}
+        self.fields = {}
+        self.current = 'question'  # Where continuation lines go
+
+    def feed(self, text):
+        text = self.partial + text
+        end = text.rfind('\n') + 1
+        self.partial = text[end:]
+        questions = []
+        if end:
+            self._scan(text, end, questions)
+        if _SEPARATOR.match(self.partial):
+            # Close the block without waiting for the separator's newline
+            self._finish(questions)
+        return questions
+
+    def close(self):
+        questions = []
+        if self.partial:
+            self._scan(self.partial, len(self.partial), questions)
+            self.partial = ''
+        self._finish(questions)
+        return questions
+
+    def _scan(self, text, end, questions):
+        """Run the state machine over the complete lines in text[:end]"""
+        for match in _LINE.finditer(text, 0, end):
+            separator, header, number, option, field, value = match.groups()
+            value = value.strip(_VALUE_STRIP)
+            if separator is not None:
+                self._finish(questions)
+            elif header is not None or number is not None:
+                if number is not None and (self.current == 'explanation'
+                                           or (self.current == 'question' and self.question)):
+                    # Numbered steps of an explanation, or numbered statements
+                    # in a question before its options: not a new question
+                    self._continue(match.group().strip())
+                    continue
+                if self.question or self.options:
+                    self._finish(questions)
+                if value:
+                    self.question.append(value)
+                self.current = 'question'
+            elif option is not None:
+                letter = option.upper()
+                if letter in self.options:
+                    self._continue(match.group().strip())
+                    continue
+                self.options[letter] = value
+                self.current = letter
+            elif field is not None:
+                name = _FIELDS.get(field.lower()) or _FIELDS[_normalize(field)]
+                self.fields[name] = value
+                self.current = 'explanation' if name == 'explanation' else None
+            elif value:
+                self._continue(value)
+
+    def _continue(self, line):
+        if self.current == 'question':
+            self.question.append(line)
+        elif self.current == 'explanation':
+            self.fields['explanation'] = f"{self.fields['explanation']} {line}".strip()
+        elif self.current is not None:
+            self.options[self.current] = f'{self.options[self.current]} {line}'.strip()
+
+    def _finish(self, questions):
+        if self.question or self.options or self.fields:
+            self.blocks += 1
+            question = self._build()
+            if question:
+                questions.append(question)
+        self._reset()
+
+    def _build(self):
+        text = ' '.join(self.question).strip()
+        if not text or not all(self.options.get(letter) for letter in LETTERS):
+            return None
+        explanation = self.fields.get('explanation', '')
+        answer = answer_letter(self.fields.get('answer'), self.options)
+        if answer is None:
+            # Salvage "the correct answer is B" from the explanation
+            match = _ANSWER_IN_TEXT.search(explanation)
+            answer = match.group(1) if match else None
+        if answer is None:
+            return None
+        difficulty = self.difficulty
+        if self.difficulties:
+            difficulty = difficulty_label(self.fields.get('difficulty'), self.difficulties) or difficulty
+            if difficulty is None:
+                return None
+        return make_question(
+            self.subject, self.stream, difficulty, text, self.options, answer,
+            explanation, self.fields.get('topic'), self.fields.get('chapter')
+        )
+
+
+def _string(value):
+    return str(value).strip() if value is not None else ''
+
+
+def validate_question(item, subject, stream, difficulty, difficulties=None):
+    """Question dict from one structured-output item, or None if unusable"""
+    if not isinstance(item, dict):
+        return None
+    if difficulties:
+        difficulty = difficulty_label(item.get('difficulty'), difficulties) or difficulty
+        if difficulty is None:
+            return None
+    text = _string(item.get('question') or item.get('question_text'))
+    if not text:
+        return None
+
+    raw = item.get('options')
+    if isinstance(raw, dict):
+        options = {_string(key).strip('()').upper()[:1]: _string(value) for key, value in raw.items()}
+    elif isinstance(raw, list) and len(raw) == 4:
+        options = {letter: _OPTION_PREFIX.sub('', _string(value)) for letter, value in zip(LETTERS, raw)}
+    else:
+        options = {letter: _string(item.get(f'option_{letter.lower()}')) for letter in LETTERS}
+    if not all(options.get(letter) for letter in LETTERS):
+        return None
+
+    answer = answer_letter(_string(item.get('answer') or item.get('correct_answer')), options)
+    if answer is None:
+        return None
+    return make_question(
+        subject, stream, difficulty, text, options, answer,
+        _string(item.get('explanation')), _string(item.get('topic')), _string(item.get('chapter'))
+    )
+
+
+class JSONQuestionParser:
+    """Streaming parser for {"questions": [{...}, ...]} responses.
+
+    Each object of the questions array is decoded and validated as soon as
+    its closing brace arrives; invalid objects are skipped, not fatal.
+    """
+
+    def __init__(self, subject, stream, difficulty, difficulties=None):
+        self.subject = subject
+        self.stream = stream
+        self.difficulty = difficulty
+        self.difficulties = difficulties
+        self.buffer = ''
+        self.position = None  # Next unread index inside the questions array
+        self.done = False
+        self.blocks = 0
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, text):
+        self.buffer += text
+        if self.done:
+            return []
+        if self.position is None:
+            match = _JSON_ARRAY_START.search(self.buffer)
+            if match is None:
+                return []
+            self.position = match.end()
+        elif '}' not in text and ']' not in text:
+            return []  # No object can have completed
+        return self._decode()
+
+    def close(self):
+        return [] if self.done or self.position is None else self._decode()
+
+    def _decode(self):
+        questions = []
+        buffer, position = self.buffer, self.position
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position >= len(buffer):
+                break
+            if buffer[position] == ']':
+                self.done = True
+                break
+            try:
+                item, position = self._decoder.raw_decode(buffer, position)
+            except ValueError:
+                break  # Object still streaming, or broken past repair
+            self.blocks += 1
+            question = validate_question(item, self.subject, self.stream, self.difficulty, self.difficulties)
+            if question:
+                questions.append(question)
+        # Drop decoded text so long responses are not rescanned
+        self.buffer, self.position = buffer[position:], 0
+        return questions
+
+
+PARSERS = {'text': TextQuestionParser, 'json': JSONQuestionParser}
+
+
+def parse_response(text, subject, stream, difficulty, mode='text', difficulties=None):
+    """Parse a whole response in the given output mode"""
+    parser = PARSERS[mode](subject, stream, difficulty, difficulties)
+    return parser.feed(text) + parser.close()
@@ -0,0 +1,313 @@
+"""
+In-memory question pool index
+Keeps only question IDs per (stream, subject, difficulty) bucket, and per
+(stream, subject, chapter, difficulty) for chapter tests, so tests can be
+sampled without loading whole buckets of Question objects from the database
+"""
+
+import random
+import threading
+import time
+from array import array
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from models import db, Question
+
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+STALE_RETRIES = 3  # Draws per load_sampled call while deleted ids keep turning up
+
+# Order in which buckets are tried when the requested difficulty runs short
+NEIGHBOR_DIFFICULTIES = {
+    'Easy': ['Easy', 'Medium', 'Hard'],
+    'Medium': ['Medium', 'Easy', 'Hard'],
+    'Hard': ['Hard', 'Medium', 'Easy']
+}
+
+
+def _draw(ids, k, exclude):
+    """Pick up to k ids from a bucket without replacement, skipping excluded ids"""
+    n = len(ids)
+    if k <= 0 or n == 0:
+        return []
+
+    # Small or nearly exhausted buckets: filtering the whole bucket is cheaper
+    if 2 * (k + len(exclude)) >= n:
+        candidates = [qid for qid in ids if qid not in exclude]
+        return random.sample(candidates, min(k, len(candidates)))
+
+    # Large buckets: draw random positions, O(k) expected work
+    picked = []
+    seen_positions = set()
+    while len(picked) < k:
+        pos = random.randrange(n)
+        if pos in seen_positions:
+            continue
+        seen_positions.add(pos)
+        qid = ids[pos]
+        if qid not in exclude:
+            picked.append(qid)
+    return picked
+
+
+class _ConcatenatedBuckets:
+    """Read-only view over several id arrays, indexed as if they were one"""
+
+    def __init__(self, buckets):
+        self.buckets = [bucket for bucket in buckets if bucket]
+        self.length = sum(len(bucket) for bucket in self.buckets)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, position):
+        for bucket in self.buckets:
+            if position < len(bucket):
+                return bucket[position]
+            position -= len(bucket)
+        raise IndexError(position)
+
+    def __iter__(self):
+        for bucket in self.buckets:
+            yield from bucket
+
+
+class QuestionPoolIndex:
+    """Process-wide index of question IDs grouped by (stream, subject, difficulty)"""
+
+    def __init__(self, refresh_interval=30.0):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._buckets = {}
+        self._chapter_buckets = {}
+        self._loaded = False
+        self._max_id = 0
+        self._patched_ids = set()
+        self._last_check = 0.0
+
+    def invalidate(self):
+        """Drop the index; it is rebuilt on next use"""
+        with self._lock:
+            self._buckets = {}
+            self._chapter_buckets = {}
+            self._loaded = False
+            self._max_id = 0
+            self._patched_ids = set()
+            self._last_check = 0.0
+
+    def _append(self, question_id, stream, subject, chapter, difficulty):
+        self._buckets.setdefault((stream, subject, difficulty), array('q')).append(question_id)
+        self._chapter_buckets.setdefault((stream, subject, chapter, difficulty), array('q')).append(question_id)
+
+    def add(self, question_id, stream, subject, chapter, difficulty):
+        """Patch a newly inserted question into the index"""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._append(question_id, stream, subject, chapter, difficulty)
+            # Remembered so the next high-water-mark scan does not add it twice
+            self._patched_ids.add(question_id)
+
+    def remove(self, rows):
+        """Drop deleted questions, (id, stream, subject, chapter, difficulty) rows, from the index.
+
+        Each affected bucket is rebuilt once, however many of its ids go.
+        """
+        removed = {}
+        chapter_removed = {}
+        for question_id, stream, subject, chapter, difficulty in rows:
+            removed.setdefault((stream, subject, difficulty), set()).add(question_id)
+            chapter_removed.setdefault((stream, subject, chapter, difficulty), set()).add(question_id)
+        with self._lock:
+            for buckets, removed_ids in ((self._buckets, removed), (self._chapter_buckets, chapter_removed)):
+                for key, question_ids in removed_ids.items():
+                    bucket = buckets.get(key)
+                    if bucket is not None:
+                        buckets[key] = array('q', (qid for qid in bucket if qid not in question_ids))
+
+    def discard(self, question_ids):
+        """Drop ids found deleted by another process, wherever they are indexed"""
+        question_ids = set(question_ids)
+        with self._lock:
+            for buckets in (self._buckets, self._chapter_buckets):
+                for key, bucket in buckets.items():
+                    if any(qid in question_ids for qid in bucket):
+                        buckets[key] = array('q', (qid for qid in bucket if qid not in question_ids))
+
+    def _load_rows(self, min_id=0):
+        """Append (id, stream, subject, chapter, difficulty) rows with id > min_id"""
+        rows = db.session.query(
+            Question.id, Question.stream, Question.subject, Question.chapter, Question.difficulty
+        ).filter(Question.id > min_id).order_by(Question.id)
+
+        for question_id, stream, subject, chapter, difficulty in rows.yield_per(5000):
+            self._max_id = max(self._max_id, question_id)
+            if question_id in self._patched_ids:
+                continue
+            self._append(question_id, stream, subject, chapter, difficulty)
+        self._patched_ids = {qid for qid in self._patched_ids if qid > self._max_id}
+
+    def _ensure_fresh(self):
+        """Build the index on first use and pick up rows added by other processes"""
+        with self._lock:
+            if not self._loaded:
+                self._buckets = {}
+                self._chapter_buckets = {}
+                self._max_id = 0
+                self._patched_ids = set()
+                self._load_rows()
+                self._loaded = True
+                self._last_check = time.monotonic()
+                return
+
+            if time.monotonic() - self._last_check < self.refresh_interval:
+                return
+
+            # Questions inserted by admin.py, init_db.py, etc. run in other processes,
+            # so compare against the table's high-water mark and load only the tail
+            db_max_id = db.session.query(func.max(Question.id)).scalar() or 0
+            if db_max_id < self._max_id:
+                # Table was recreated; start over
+                self._loaded = False
+                self._ensure_fresh()
+                return
+            if db_max_id > self._max_id:
+                self._load_rows(self._max_id)
+            self._last_check = time.monotonic()
+
+    def count(self, stream, subject, difficulty=None):
+        """Number of questions in a bucket, or across all difficulties of a subject"""
+        self._ensure_fresh()
+        with self._lock:
+            if difficulty:
+                return len(self._buckets.get((stream, subject, difficulty), ()))
+            return sum(len(self._buckets.get((stream, subject, d), ())) for d in DIFFICULTIES)
+
+    def bucket_ids(self, stream, subject, difficulty):
+        """Snapshot of the ids held for one bucket"""
+        self._ensure_fresh()
+        with self._lock:
+            return array('q', self._buckets.get((stream, subject, difficulty), ()))
+
+    def sample(self, stream, subject, difficulty, k, exclude=None):
+        """Sample k question ids, topping up from neighboring difficulties if short"""
+        self._ensure_fresh()
+        exclude = set(exclude or ())
+        picked = []
+
+        with self._lock:
+            for level in NEIGHBOR_DIFFICULTIES.get(difficulty, DIFFICULTIES):
+                needed = k - len(picked)
+                if needed <= 0:
+                    break
+                bucket = self._buckets.get((stream, subject, level))
+                if not bucket:
+                    continue
+                drawn = _draw(bucket, needed, exclude)
+                picked.extend(drawn)
+                exclude.update(drawn)
+
+        return picked
+
+    def chapter_catalog(self, stream):
+        """Question counts as {subject: {chapter: {difficulty: count}}} for a stream"""
+        self._ensure_fresh()
+        catalog = {}
+        with self._lock:
+            for (bucket_stream, subject, chapter, difficulty), ids in self._chapter_buckets.items():
+                if bucket_stream == stream and ids:
+                    catalog.setdefault(subject, {}).setdefault(chapter, {})[difficulty] = len(ids)
+        return catalog
+
+    def sample_chapter(self, stream, subject, chapter, k, difficulty=None, exclude=None):
+        """Uniformly sample k question ids from a whole chapter, or one difficulty of it"""
+        self._ensure_fresh()
+        levels = [difficulty] if difficulty else DIFFICULTIES
+        with self._lock:
+            chapter_ids = _ConcatenatedBuckets(
+                self._chapter_buckets.get((stream, subject, chapter, level)) for level in levels
+            )
+            return _draw(chapter_ids, k, set(exclude or ()))
+
+
+def load_questions(question_ids):
+    """Fetch questions by id in one query, preserving the given order"""
+    if not question_ids:
+        return []
+    questions = Question.query.filter(Question.id.in_(list(question_ids))).all()
+    question_dict = {q.id: q for q in questions}
+    return [question_dict[q_id] for q_id in question_ids if q_id in question_dict]
+
+
+def load_sampled(draws, exclude=None):
+    """Load the questions of several draws in one query, replacing stale ids.
+
+    draws is [(draw, k)], where draw(k, exclude=...) returns up to k question ids.
+    The index only tracks inserts by other processes, so ids they deleted are
+    found missing here: they are dropped from the index and drawn again.
+    Returns questions in draw order.
+    """
+    exclude = set(exclude or ())
+    picked = [[] for _ in draws]
+    loaded = {}
+    for _ in range(STALE_RETRIES):
+        fresh = []
+        for (draw, k), ids in zip(draws, picked):
+            if k > len(ids):
+                drawn = draw(k - len(ids), exclude=exclude)
+                ids.extend(drawn)
+                exclude.update(drawn)
+                fresh.extend(drawn)
+        if not fresh:
+            break
+        loaded.update((q.id, q) for q in Question.query.filter(Question.id.in_(fresh)).all())
+        stale = [qid for qid in fresh if qid not in loaded]
+        if not stale:
+            break
+        question_pool.discard(stale)
+        picked = [[qid for qid in ids if qid in loaded] for ids in picked]
+    return [loaded[qid] for ids in picked for qid in ids if qid in loaded]
+
+
+# Process-wide index shared by the test engine
+question_pool = QuestionPoolIndex()
+
+
+# Keep the index in sync with ORM writes. Inserts and deletes are applied only
+# once the transaction commits, so rolled back rows never become sampleable
+# and rolled back deletes stay sampleable.
+@event.listens_for(Question, 'after_insert')
+def _question_inserted(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('question_pool_added', []).append(
+            (target.id, target.stream, target.subject, target.chapter, target.difficulty)
+        )
+
+
+@event.listens_for(Question, 'after_delete')
+def _question_deleted(mapper, connection, target):
+    session = Session.object_session(target)
+    row = (target.id, target.stream, target.subject, target.chapter, target.difficulty)
+    if session is not None:
+        session.info.setdefault('question_pool_removed', []).append(row)
+    else:
+        question_pool.remove([row])
+
+
+@event.listens_for(Session, 'after_commit')
+def _session_committed(session):
+    for row in session.info.pop('question_pool_added', []):
+        question_pool.add(*row)
+    question_pool.remove(session.info.pop('question_pool_removed', []))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _session_rolled_back(session):
+    session.info.pop('question_pool_added', None)
+    session.info.pop('question_pool_removed', None)
+
+
+@event.listens_for(Question.__table__, 'after_create')
+@event.listens_for(Question.__table__, 'after_drop')
+def _question_table_recreated(target, connection, **kw):
+    question_pool.invalidate()
@@ -6,6 +6,7 @@ Production-ready runner for the NEET/JEE Learning App
 import os
 from app import app
 from models import db
+from worker import WorkerPool
 
 def create_app():
     """Create and configure the Flask application"""
@@ -30,6 +31,11 @@ if __name__ == '__main__':
     # Create app
     application = create_app()
     
+    # Background job workers; with the reloader only the serving child starts them
+    if (app.config['JOB_WORKERS'] and not app.config['JOB_QUEUE_EAGER']
+            and (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true')):
+        WorkerPool(app).start()
+    
     print(f"Starting NEET/JEE Learning App...")
     print(f"Environment: {os.environ.get('FLASK_ENV', 'development')}")
     print(f"Running on: http://{host}:{port}")
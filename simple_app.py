@@ -9,10 +9,12 @@ from flask import Flask, render_template, request, redirect, url_for, flash, ses
 import sqlite3
 import hashlib
 import json
-import random
 from datetime import datetime, timedelta
 import os
 import secrets
+import threading
+from array import array
+from permutation import FeistelPermutation
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
@@ -91,6 +93,19 @@ def init_db():
         )
     ''')
     
+    # Lets per-stream id lookups read the index instead of the table
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_stream_id ON questions (stream, id)')
+
+    # Gives INSERT OR IGNORE below a key to ignore on, so re-running init_db
+    # no longer duplicates the sample questions. Copies left by earlier runs
+    # are removed first, keeping the oldest.
+    conn.execute('''
+        DELETE FROM questions WHERE id NOT IN (
+            SELECT MIN(id) FROM questions GROUP BY stream, subject, question_text
+        )
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_unique ON questions (stream, subject, question_text)')
+
     conn.execute('''
         CREATE TABLE IF NOT EXISTS test_attempts (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -107,6 +122,20 @@ def init_db():
         )
     ''')
     
+    # One row per user per question bucket: a key for the bucket's permutation
+    # and how far along it the user is, so questions never repeat until exhausted
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS question_cursors (
+            user_id INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            perm_key INTEGER NOT NULL,
+            domain_size INTEGER NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, bucket),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
     # Add sample questions
     sample_questions = [
         # NEET Physics - Challenging Questions
@@ -269,6 +298,113 @@ def init_db():
     conn.close()
     print("Database initialized successfully!")
 
+# Cached question ids per stream: {stream: {'ids': array, 'max_id': int}}
+_stream_question_ids = {}
+_stream_question_ids_lock = threading.Lock()
+STALE_RETRIES = 3  # Top-ups of a test whose ids were deleted meanwhile
+
+def get_stream_question_ids(conn, stream):
+    """Get the cached id array for a stream, loading only rows added since last call.
+    
+    Row count and highest id come from the (stream, id) index; a count that no
+    longer matches the cache means rows were deleted, and the stream is reloaded.
+    """
+    count, max_id = conn.execute(
+        'SELECT COUNT(*), MAX(id) FROM questions WHERE stream = ?', (stream,)
+    ).fetchone()
+    max_id = max_id or 0
+    
+    with _stream_question_ids_lock:
+        cached = _stream_question_ids.get(stream)
+        if cached is None or max_id < cached['max_id']:
+            # First use, or the table was recreated
+            cached = {'ids': array('q'), 'max_id': 0}
+            _stream_question_ids[stream] = cached
+        
+        if max_id > cached['max_id']:
+            rows = conn.execute('''
+                SELECT id FROM questions WHERE stream = ? AND id > ? ORDER BY id
+            ''', (stream, cached['max_id']))
+            cached['ids'].extend(row[0] for row in rows)
+            cached['max_id'] = max_id
+        
+        if len(cached['ids']) != count:
+            rows = conn.execute('SELECT id FROM questions WHERE stream = ? ORDER BY id', (stream,))
+            cached = {'ids': array('q', (row[0] for row in rows)), 'max_id': max_id}
+            _stream_question_ids[stream] = cached
+        
+        return cached['ids']
+
+def next_question_ids_for_user(conn, user_id, stream, count):
+    """Take the next count questions from the user's private shuffle of a stream.
+    
+    Each user walks a keyed permutation of the stream's question ids, so nothing
+    repeats until the whole pool has been seen. When the walk runs out a new
+    permutation is started over the current pool (including questions added since).
+    """
+    ids = get_stream_question_ids(conn, stream)
+    cursor = conn.execute('''
+        SELECT perm_key, domain_size, position FROM question_cursors
+        WHERE user_id = ? AND bucket = ?
+    ''', (user_id, stream)).fetchone()
+    
+    if cursor and cursor['domain_size'] <= len(ids):
+        perm_key, domain_size, position = cursor['perm_key'], cursor['domain_size'], cursor['position']
+    else:
+        perm_key, domain_size, position = secrets.randbits(63), len(ids), 0
+    
+    picked = []
+    picked_set = set()
+    restarted = False
+    while len(picked) < count:
+        if position >= domain_size:
+            if restarted or not ids:
+                break  # Pool is smaller than the test
+            perm_key, domain_size, position = secrets.randbits(63), len(ids), 0
+            restarted = True
+        
+        permutation = FeistelPermutation(domain_size, perm_key)
+        while position < domain_size and len(picked) < count:
+            q_id = ids[permutation[position]]
+            position += 1
+            if q_id not in picked_set:
+                picked.append(q_id)
+                picked_set.add(q_id)
+    
+    conn.execute('''
+        INSERT INTO question_cursors (user_id, bucket, perm_key, domain_size, position)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, bucket) DO UPDATE SET
+            perm_key = excluded.perm_key,
+            domain_size = excluded.domain_size,
+            position = excluded.position
+    ''', (user_id, stream, perm_key, domain_size, position))
+    conn.commit()
+    
+    return picked
+
+def next_questions_for_user(conn, user_id, stream, count):
+    """Rows of the user's next count questions; ids deleted since they were
+    cached are replaced by the following ones on the user's walk"""
+    questions = []
+    for _ in range(STALE_RETRIES):
+        question_ids = next_question_ids_for_user(conn, user_id, stream, count - len(questions))
+        seen = {q['id'] for q in questions}
+        rows = [row for row in fetch_questions(conn, question_ids) if row['id'] not in seen]
+        questions.extend(rows)
+        if len(questions) >= count or len(rows) == len(question_ids):
+            break
+    return questions
+
+def fetch_questions(conn, question_ids):
+    """Fetch question rows by id, keeping the order of question_ids"""
+    if not question_ids:
+        return []
+    placeholders = ','.join(['?'] * len(question_ids))
+    rows = conn.execute(f'SELECT * FROM questions WHERE id IN ({placeholders})', list(question_ids)).fetchall()
+    rows_by_id = {row['id']: row for row in rows}
+    return [rows_by_id[q_id] for q_id in question_ids if q_id in rows_by_id]
+
 def hash_password(password):
     """Hash password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -445,10 +581,7 @@ def initial_test():
     
     # Get questions for initial test - ensure no repetition
     conn = get_db()
-    questions = conn.execute('''
-        SELECT * FROM questions WHERE stream = ? 
-        ORDER BY RANDOM() LIMIT 25
-    ''', (user['stream'],)).fetchall()
+    questions = next_questions_for_user(conn, user['id'], user['stream'], 25)
     conn.close()
     
     if len(questions) < 25:
@@ -529,32 +662,8 @@ def start_test(test_type):
     # Get questions
     conn = get_db()
     
-    # Get recently attempted question IDs to avoid repetition
-    recent_attempts = conn.execute('''
-        SELECT questions_attempted FROM test_attempts 
-        WHERE user_id = ? ORDER BY created_at DESC LIMIT 5
-    ''', (user['id'],)).fetchall()
-    
-    attempted_ids = set()
-    for attempt in recent_attempts:
-        try:
-            ids = json.loads(attempt['questions_attempted'])
-            attempted_ids.update(ids)
-        except:
-            pass
-    
-    # Get fresh questions
-    if attempted_ids:
-        placeholders = ','.join(['?'] * len(attempted_ids))
-        questions = conn.execute(f'''
-            SELECT * FROM questions WHERE stream = ? AND id NOT IN ({placeholders})
-            ORDER BY RANDOM() LIMIT ?
-        ''', [user['stream']] + list(attempted_ids) + [config['questions']]).fetchall()
-    else:
-        questions = conn.execute('''
-            SELECT * FROM questions WHERE stream = ? 
-            ORDER BY RANDOM() LIMIT ?
-        ''', (user['stream'], config['questions'])).fetchall()
+    # Continue the user's no-repeat walk through the stream's questions
+    questions = next_questions_for_user(conn, user['id'], user['stream'], config['questions'])
     
     conn.close()
     
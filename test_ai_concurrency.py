@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Tests for concurrent AI question generation against a local stub server
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+import unittest
+from app import app
+from models import db, Question
+from config import TestingConfig
+from ai_engine import AdaptiveTestEngine
+import ai_question_generator
+from ai_question_generator import AIQuestionGenerator
+from openai_stub import OpenAIStubServer, fake_questions
+from question_parser import TextQuestionParser, parse_response
+from paper_assembly import build_blueprint
+from pdf_cache import PDFTextCache
+from pdf_index import ChunkIndexStore
+from bench_pdf_extraction import write_sample_pdf
+
+LATENCY = 0.3
+
+
+def make_generator(stub, max_concurrency):
+    generator = AIQuestionGenerator(api_key='test-key', base_url=stub.base_url, max_concurrency=max_concurrency)
+    generator.get_reference_content = lambda pdf_path, topic, batches: [f'{pdf_path} reference content'] * batches
+    return generator
+
+
+class AIConcurrencyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Start a stub server that takes LATENCY seconds per call"""
+        self.stub = OpenAIStubServer(latency=LATENCY).start()
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_batches_run_concurrently(self):
+        """Test the batches of one bucket are in flight together"""
+        generator = make_generator(self.stub, max_concurrency=4)
+        start = time.monotonic()
+        questions = generator.generate_questions_with_ai('Physics', 'NEET', 'Easy', num_questions=40)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(len(questions), 40)
+        self.assertEqual(len(self.stub.requests), 4)
+        self.assertEqual(self.stub.max_in_flight, 4)
+        self.assertLess(elapsed, 2 * LATENCY)
+
+    def test_concurrency_cap(self):
+        """Test no more than max_concurrency calls are in flight"""
+        generator = make_generator(self.stub, max_concurrency=2)
+        buckets = [(subject, difficulty, 10)
+                   for subject in ['Physics', 'Chemistry', 'Biology']
+                   for difficulty in ['Easy', 'Hard']]
+        start = time.monotonic()
+        generated = generator.generate_questions_for_buckets('NEET', buckets)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(len(self.stub.requests), 6)
+        self.assertEqual(self.stub.max_in_flight, 2)
+        self.assertGreaterEqual(elapsed, 3 * LATENCY)
+        self.assertTrue(all(len(questions) == 10 for questions in generated.values()))
+        self.assertEqual(generated[('Chemistry', 'Hard')][0]['difficulty'], 'Hard')
+
+    def test_generate_test_questions(self):
+        """Test a whole test fans out across subjects and difficulties"""
+        generator = make_generator(self.stub, max_concurrency=8)
+        questions = generator.generate_test_questions('JEE', 'initial', num_questions=30)
+
+        self.assertEqual(len(questions), 30)
+        self.assertEqual(len(self.stub.requests), 9)
+        self.assertGreater(self.stub.max_in_flight, 1)
+
+    def test_engine_blueprint(self):
+        """Test the test engine fills a whole blueprint from one fan-out"""
+        engine = AdaptiveTestEngine()
+        engine.ai_generator = make_generator(self.stub, max_concurrency=16)
+        blueprint = build_blueprint({'Physics': 12, 'Chemistry': 12, 'Biology': 12})
+
+        app.config.from_object(TestingConfig)
+        with app.app_context():
+            db.create_all()
+            start = time.monotonic()
+            questions = engine._assemble_blueprint('NEET', blueprint)
+            elapsed = time.monotonic() - start
+            db.drop_all()
+
+        self.assertEqual(len(questions), 36)
+        self.assertEqual(len(self.stub.requests), len(blueprint))
+        self.assertLess(elapsed, 2 * LATENCY)
+
+
+class AIStreamingTestCase(unittest.TestCase):
+
+    def test_parser_any_split(self):
+        """Test feeding a response in arbitrary pieces parses like the whole text"""
+        text = fake_questions(6, label='Split')
+        whole = parse_response(text, 'Physics', 'NEET', 'Easy')
+        self.assertEqual(len(whole), 6)
+
+        rng = random.Random(0)
+        for _ in range(20):
+            parser = TextQuestionParser('Physics', 'NEET', 'Easy')
+            cuts = sorted(rng.sample(range(1, len(text)), 30))
+            questions = []
+            for start, end in zip([0] + cuts, cuts + [len(text)]):
+                questions.extend(parser.feed(text[start:end]))
+            self.assertEqual(questions + parser.close(), whole)
+
+    def test_first_question_before_last_token(self):
+        """Test questions are yielded as their blocks finish streaming"""
+        delay = 0.2
+        with OpenAIStubServer(stream_delay=delay) as stub:
+            generator = make_generator(stub, max_concurrency=2)
+            start = time.monotonic()
+            arrivals = []
+            for question in generator.stream_questions_with_ai('Chemistry', 'NEET', 'Medium', num_questions=5):
+                arrivals.append(time.monotonic() - start)
+                self.assertEqual(question['subject'], 'Chemistry')
+                self.assertTrue(question['prompt_hash'])
+
+        self.assertEqual(len(arrivals), 5)
+        self.assertLess(arrivals[0], delay)
+        self.assertGreaterEqual(arrivals[-1], 4 * delay)
+        self.assertTrue(stub.requests[0]['stream'])
+
+    def test_json_mode(self):
+        """Test structured output is requested and streamed question by question"""
+        with OpenAIStubServer() as stub:
+            generator = make_generator(stub, max_concurrency=2)
+            generator.output_mode = 'json'
+            questions = generator.generate_questions_with_ai('Biology', 'NEET', 'Hard', num_questions=12)
+
+        self.assertEqual(len(questions), 12)
+        self.assertEqual(stub.requests[0]['response_format'], {'type': 'json_object'})
+        self.assertEqual(questions[0]['chapter'], 'Stub Chapter')
+        self.assertEqual(questions[0]['correct_answer'], 'A')
+
+    def test_telemetry(self):
+        """Test each call records latency, token usage, yield and fallbacks"""
+        labels = {'stream': 'JEE', 'subject': 'Chemistry', 'difficulty': 'Medium'}
+        metrics = ai_question_generator
+        before = {
+            'calls': metrics.GENERATION_CALLS.value(outcome='ok', **labels),
+            'seconds': metrics.GENERATION_SECONDS.count(**labels),
+            'first': metrics.FIRST_QUESTION_SECONDS.count(**labels),
+            'prompt': metrics.PROMPT_TOKENS.value(**labels),
+            'completion': metrics.COMPLETION_TOKENS.value(**labels),
+            'requested': metrics.QUESTIONS_REQUESTED.value(**labels),
+            'parsed': metrics.QUESTIONS_PARSED.value(**labels),
+            'fallbacks': metrics.FALLBACKS.value(reason='low_yield', **labels),
+        }
+
+        # Every call answers with 3 questions: too few, so the bucket falls back
+        with OpenAIStubServer() as stub:
+            complete = stub.complete
+            stub.complete = lambda body, number=0: complete(
+                dict(body, messages=[{'role': 'user', 'content': 'generate 3 NEW questions'}]), number)
+            generator = make_generator(stub, max_concurrency=2)
+            generator.generate_questions_for_buckets('JEE', [('Chemistry', 'Medium', 20)])
+
+        self.assertTrue(stub.requests[0]['stream_options']['include_usage'])
+        self.assertEqual(metrics.GENERATION_CALLS.value(outcome='ok', **labels) - before['calls'], 2)
+        self.assertEqual(metrics.GENERATION_SECONDS.count(**labels) - before['seconds'], 2)
+        self.assertEqual(metrics.FIRST_QUESTION_SECONDS.count(**labels) - before['first'], 2)
+        self.assertGreater(metrics.PROMPT_TOKENS.value(**labels), before['prompt'])
+        self.assertGreater(metrics.COMPLETION_TOKENS.value(**labels), before['completion'])
+        self.assertEqual(metrics.QUESTIONS_REQUESTED.value(**labels) - before['requested'], 20)
+        self.assertEqual(metrics.QUESTIONS_PARSED.value(**labels) - before['parsed'], 6)
+        self.assertEqual(metrics.FALLBACKS.value(reason='low_yield', **labels) - before['fallbacks'], 1)
+
+
+
+class AITailLatencyTestCase(unittest.TestCase):
+
+    def slow_first_request(self, stub, seconds):
+        """Make the stub's first request a straggler"""
+        complete = stub.complete
+
+        def slow_complete(body, number=0):
+            if number == 1:
+                time.sleep(seconds)
+            return complete(body, number)
+        stub.complete = slow_complete
+
+    def test_hedged_straggler(self):
+        """Test a batch slower than the hedge percentile is answered by a duplicate request"""
+        labels = {'stream': 'NEET', 'subject': 'Physics', 'difficulty': 'Hard'}
+        won_before = ai_question_generator.HEDGES_WON.value(**labels)
+        with OpenAIStubServer() as stub:
+            self.slow_first_request(stub, 2.0)
+            generator = make_generator(stub, max_concurrency=4)
+            for _ in range(ai_question_generator.HEDGE_MIN_SAMPLES):
+                generator.first_question_latency.observe(0.1)
+            start = time.monotonic()
+            questions = generator.generate_questions_with_ai('Physics', 'NEET', 'Hard', num_questions=10)
+            elapsed = time.monotonic() - start
+
+        self.assertEqual(len(questions), 10)
+        self.assertEqual(len(stub.requests), 2)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(len({q['prompt_hash'] for q in questions}), 1)  # All from the winning attempt
+        self.assertEqual(ai_question_generator.HEDGES_WON.value(**labels) - won_before, 1)
+
+    def test_no_hedge_for_fast_batches(self):
+        """Test batches answering within the hedge delay are not duplicated"""
+        with OpenAIStubServer(latency=0.05) as stub:
+            generator = make_generator(stub, max_concurrency=4)
+            generator.generate_questions_with_ai('Biology', 'NEET', 'Easy', num_questions=30)
+        self.assertEqual(len(stub.requests), 3)
+
+    def test_deadline_returns_partial_results(self):
+        """Test a deadline returns the questions streamed so far, on time"""
+        with OpenAIStubServer(stream_delay=0.2) as stub:
+            generator = make_generator(stub, max_concurrency=4)
+            generator.hedge_percentile = 0
+            start = time.monotonic()
+            questions = generator.generate_questions_with_ai('Chemistry', 'JEE', 'Easy', num_questions=10, deadline=0.5)
+            elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.8)
+        self.assertTrue(0 < len(questions) < 7)
+
+    def test_deadline_off(self):
+        """Test a zero deadline means none, and background builds run without one"""
+        self.assertIsNone(AIQuestionGenerator(api_key='test-key', deadline=0).deadline)
+
+        class RecordingGenerator:
+            deadline = 15.0
+            deadlines = []
+
+            def iter_questions_for_buckets(self, stream, buckets, topic=None, deadline=None):
+                self.deadlines.append(deadline)
+                yield from ()
+
+        engine = AdaptiveTestEngine()
+        engine.ai_generator = RecordingGenerator()
+        app.config.from_object(TestingConfig)
+        app.config['SINGLE_FLIGHT_ENABLED'] = False
+        try:
+            with app.app_context():
+                engine._generate_ai_buckets('NEET', [('Physics', 'Easy', 5)])
+                with app.test_request_context():
+                    engine._generate_ai_buckets('NEET', [('Physics', 'Easy', 5)])
+        finally:
+            app.config.from_object(TestingConfig)
+        self.assertEqual(RecordingGenerator.deadlines, [None, 15.0])
+
+    def test_engine_fills_from_database_at_deadline(self):
+        """Test a stalled API cannot hold up a test beyond the deadline"""
+        engine = AdaptiveTestEngine()
+        with OpenAIStubServer(latency=3.0) as stub:
+            engine.ai_generator = make_generator(stub, max_concurrency=4)
+            engine.ai_generator.deadline = 0.3
+            app.config.from_object(TestingConfig)
+            with app.app_context():
+                db.create_all()
+                db.session.add_all([Question(
+                    subject='Physics', chapter='Optics', topic='Lenses', difficulty='Easy', stream='NEET',
+                    question_text=f'Database question {i}', option_a='One', option_b='Two', option_c='Three',
+                    option_d='Four', correct_answer='A'
+                ) for i in range(5)])
+                db.session.commit()
+                start = time.monotonic()
+                with app.test_request_context():
+                    questions = engine._assemble_blueprint('NEET', [('Physics', 'Easy', 5)])
+                elapsed = time.monotonic() - start
+                texts = [q.question_text for q in questions]
+                db.drop_all()
+
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(len(texts), 5)
+        self.assertTrue(all(text.startswith('Database question') for text in texts))
+
+
+class AIRateLimitTestCase(unittest.TestCase):
+
+    def test_rate_limiter_spaces_calls(self):
+        """Test calls beyond the burst wait for their slot, in order"""
+        clock = [0.0]
+        waits = []
+        limiter = ai_question_generator.RateLimiter(120, burst=2, clock=lambda: clock[0], sleep=waits.append)
+
+        self.assertEqual([limiter.acquire() for _ in range(4)], [0, 0, 0.5, 1.0])
+        clock[0] = 10.0  # Idle time refills the burst, but does not bank more
+        self.assertEqual([limiter.acquire() for _ in range(3)], [0, 0, 0.5])
+        self.assertEqual(waits, [0.5, 1.0, 0.5])
+
+    def test_rate_limiter_respects_deadline(self):
+        """Test a caller whose slot comes after its deadline neither waits nor takes the slot"""
+        clock = [0.0]
+        waits = []
+        limiter = ai_question_generator.RateLimiter(60, clock=lambda: clock[0], sleep=waits.append)
+
+        self.assertEqual(limiter.acquire(), 0)
+        self.assertIsNone(limiter.acquire(expires=0.5))
+        self.assertEqual(limiter.acquire(expires=2.0), 1.0)
+        self.assertEqual(waits, [1.0])
+
+    def test_generator_rate_limit(self):
+        """Test the generator starts no more API calls than requests_per_minute allows"""
+        with OpenAIStubServer() as stub:
+            generator = AIQuestionGenerator(api_key='test-key', base_url=stub.base_url, max_concurrency=4,
+                                            hedge_percentile=0, requests_per_minute=300)
+            generator.get_reference_content = lambda pdf_path, topic, batches: ['Reference text'] * batches
+            start = time.monotonic()
+            questions = generator.generate_questions_with_ai('Physics', 'NEET', 'Easy', num_questions=40)
+            elapsed = time.monotonic() - start
+
+        self.assertEqual(len(questions), 40)
+        self.assertGreaterEqual(elapsed, 0.6)  # Four calls 0.2 s apart
+
+    def test_generator_rate_limit_deadline(self):
+        """Test batches whose request slot falls after the deadline are not waited for"""
+        with OpenAIStubServer() as stub:
+            generator = AIQuestionGenerator(api_key='test-key', base_url=stub.base_url, max_concurrency=4,
+                                            hedge_percentile=0, requests_per_minute=30)
+            generator.get_reference_content = lambda pdf_path, topic, batches: ['Reference text'] * batches
+            start = time.monotonic()
+            generator.generate_questions_with_ai('Physics', 'NEET', 'Easy', num_questions=30, deadline=0.5)
+            elapsed = time.monotonic() - start
+            time.sleep(0.2)  # Give skipped batches time to finish
+
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(len(stub.requests), 1)
+
+    def test_deadline_skips_cold_index(self):
+        """Test a deadline-bound fan-out does not wait for a PDF index to build"""
+        tmp = tempfile.mkdtemp()
+        try:
+            pdf_path = write_sample_pdf(os.path.join(tmp, 'bank.pdf'), pages=4, lines_per_page=20)
+            store = ChunkIndexStore(os.path.join(tmp, 'index'), PDFTextCache(os.path.join(tmp, 'text')))
+            with OpenAIStubServer() as stub:
+                generator = AIQuestionGenerator(api_key='test-key', base_url=stub.base_url, max_concurrency=4)
+                generator.chunk_indexes = store
+                generator._get_pdf_path = lambda subject, stream: pdf_path
+                generator.generate_questions_with_ai('Physics', 'NEET', 'Easy', num_questions=5, deadline=5)
+
+                deadline = time.monotonic() + 5
+                while not generator.reference_loaded(pdf_path) and time.monotonic() < deadline:
+                    time.sleep(0.01)  # Built on a background thread meanwhile
+                generator.generate_questions_with_ai('Physics', 'NEET', 'Easy', num_questions=5, deadline=5)
+
+            prompts = [request['messages'][-1]['content'] for request in stub.requests]
+            self.assertNotIn('REFERENCE CONTENT', prompts[0])
+            self.assertIn('REFERENCE CONTENT', prompts[1])
+        finally:
+            shutil.rmtree(tmp)
+
+
+class AIMultiBucketTestCase(unittest.TestCase):
+
+    def test_subject_difficulties_share_calls(self):
+        """Test a subject's difficulties are asked for in one call and routed back to their buckets"""
+        buckets = [('Physics', 'Easy', 3), ('Physics', 'Medium', 4), ('Physics', 'Hard', 3), ('Biology', 'Easy', 5)]
+        with OpenAIStubServer() as stub:
+            generator = make_generator(stub, max_concurrency=4)
+            generator.multi_bucket = True
+            generated = generator.generate_questions_for_buckets('NEET', buckets)
+
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual({key: len(questions) for key, questions in generated.items()},
+                         {(subject, difficulty): count for subject, difficulty, count in buckets})
+        self.assertTrue(all(q['difficulty'] == difficulty
+                            for (_, difficulty), questions in generated.items() for q in questions))
+        prompts = sorted(request['messages'][-1]['content'] for request in stub.requests)
+        self.assertIn('DIFFICULTY LEVEL: 3 Easy, 4 Medium, 3 Hard', prompts[1])
+        self.assertIn('DIFFICULTY LEVEL: Easy', prompts[0])
+
+    def test_mixed_batches_split(self):
+        """Test a large mix is split into batches that each keep the proportions"""
+        with OpenAIStubServer() as stub:
+            generator = make_generator(stub, max_concurrency=4)
+            generator.multi_bucket = True
+            generated = generator.generate_questions_for_buckets('JEE', [('Physics', 'Easy', 10), ('Physics', 'Hard', 20)])
+
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual([len(generated[('Physics', 'Easy')]), len(generated[('Physics', 'Hard')])], [10, 20])
+        self.assertTrue(all('Easy, ' in request['messages'][-1]['content'] for request in stub.requests))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for adaptive batch sizing and max_tokens
+"""
+
+import unittest
+from batch_tuner import BatchTuner, BATCH_SIZE, MAX_TOKENS, WARMUP_CALLS
+from openai_stub import OpenAIStubServer
+from test_ai_concurrency import make_generator
+
+KEY = ('JEE', 'Mathematics', 'Hard')
+
+
+class BatchTunerTestCase(unittest.TestCase):
+
+    def observe(self, tuner, key, tokens_per_question, calls=WARMUP_CALLS, truncated=False, max_tokens=MAX_TOKENS):
+        for _ in range(calls):
+            tuner.observe(key, 10, max_tokens, 10, 10 * tokens_per_question, truncated,
+                          prompt_tokens=800, first_token_seconds=1.0, seconds=1.0 + 10 * tokens_per_question * 0.01)
+
+    def test_fixed_plan_until_observed(self):
+        """Test a bucket keeps the fixed batches until it has been seen"""
+        tuner = BatchTuner('gpt-3.5-turbo')
+        self.assertEqual(tuner.plan(KEY, 25), [(BATCH_SIZE, MAX_TOKENS), (BATCH_SIZE, MAX_TOKENS), (5, MAX_TOKENS)])
+        self.observe(tuner, KEY, 300, calls=WARMUP_CALLS - 1)
+        self.assertEqual(len(tuner.plan(KEY, 25)), 3)
+
+    def test_batches_follow_question_length(self):
+        """Test short questions get larger batches and long ones smaller, within the output limit"""
+        tuner = BatchTuner('gpt-3.5-turbo')
+        short, long = ('NEET', 'Biology', 'Easy'), KEY
+        self.observe(tuner, short, 80)
+        self.observe(tuner, long, 600)
+
+        short_plan = tuner.plan(short, 40)
+        long_plan = tuner.plan(long, 40)
+        self.assertEqual(short_plan, [(20, 20 * 96 + 60), (20, 20 * 96 + 60)])
+        self.assertGreater(len(long_plan), 4)
+        self.assertEqual(sum(questions for questions, _ in long_plan), 40)
+        self.assertTrue(all(max_tokens <= tuner.max_output for _, max_tokens in long_plan))
+        self.assertTrue(all(max_tokens >= questions * 600 for questions, max_tokens in long_plan))
+
+    def test_concurrency_splits_batches(self):
+        """Test spare concurrency splits a bucket into more, shorter calls"""
+        tuner = BatchTuner('gpt-3.5-turbo')
+        self.observe(tuner, KEY, 200)
+        self.assertEqual(len(tuner.plan(KEY, 20, concurrency=1)), 2)
+        self.assertGreater(len(tuner.plan(KEY, 20, concurrency=8)), 2)
+
+    def test_truncation_widens_headroom(self):
+        """Test calls cut off within a budget that covered the estimate get more room next time"""
+        tuner = BatchTuner('gpt-3.5-turbo')
+        self.observe(tuner, KEY, 300)
+        (questions, max_tokens), = tuner.plan(KEY, 10)
+        self.observe(tuner, KEY, 300, calls=1, truncated=True, max_tokens=max_tokens)
+        (more_questions, more_tokens), *_ = tuner.plan(KEY, 10)
+        self.assertGreater(more_tokens / more_questions, max_tokens / questions)
+        self.assertGreater(tuner.stats(KEY).truncation_rate, 0)
+
+        # Cut off by a budget known to be short: only the estimate is updated
+        headroom = tuner.stats(KEY).headroom
+        self.observe(tuner, KEY, 300, calls=1, truncated=True, max_tokens=1000)
+        self.assertEqual(tuner.stats(KEY).headroom, headroom)
+
+    def test_truncation_shrinks_batches(self):
+        """Test a bucket whose calls are often cut off is planned in smaller batches"""
+        clean, cut_off = BatchTuner('gpt-3.5-turbo'), BatchTuner('gpt-3.5-turbo')
+        for tuner, truncated in ((clean, False), (cut_off, True)):
+            self.observe(tuner, KEY, 200)
+            # A budget known to be short: headroom stays as it was, only the rate moves
+            self.observe(tuner, KEY, 200, calls=3, truncated=truncated, max_tokens=1000)
+
+        self.assertGreater(cut_off.stats(KEY).truncation_rate, 0.5)
+        clean_size = max(questions for questions, _ in clean.plan(KEY, 20))
+        cut_off_size = max(questions for questions, _ in cut_off.plan(KEY, 20))
+        self.assertLess(cut_off_size, clean_size)
+        self.assertEqual(clean.stats(KEY).headroom, cut_off.stats(KEY).headroom)
+
+    def test_generator_stops_truncating(self):
+        """Test long questions cut off by the fixed max_tokens come back whole once learned"""
+        with OpenAIStubServer(padding={'Mathematics': 1500}) as stub:
+            generator = make_generator(stub, max_concurrency=4)
+            first = generator.generate_questions_for_buckets('JEE', [('Mathematics', 'Hard', 20)])
+            truncated = [r['max_tokens'] for r in stub.requests]
+            del stub.requests[:]
+            second = generator.generate_questions_for_buckets('JEE', [('Mathematics', 'Hard', 20)])
+
+        self.assertEqual(truncated, [MAX_TOKENS, MAX_TOKENS])
+        self.assertLess(len(first[('Mathematics', 'Hard')]), 20)
+        self.assertEqual(len(second[('Mathematics', 'Hard')]), 20)
+        self.assertGreater(len(stub.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
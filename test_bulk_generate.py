@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for offline bulk question generation against a local stub server
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from app import app
+from models import db, Question
+from config import TestingConfig
+from ai_question_generator import AIQuestionGenerator
+from bulk_generate import Checkpoint, build_matrix, bulk_generate, load_matrix
+from openai_stub import OpenAIStubServer
+from test_question_bank import generated
+
+MATRIX = {('NEET', 'Physics', 'Easy', ''): 12, ('NEET', 'Physics', 'Hard', ''): 12, ('JEE', 'Mathematics', 'Easy', 'Calculus'): 5}
+
+
+class RepeatingGenerator:
+    """Streams the same question for every bucket, every time"""
+
+    def iter_questions_for_buckets(self, stream, buckets, topic=None):
+        for subject, difficulty, count in buckets:
+            for _ in range(count):
+                q_data = generated('The same question every time', difficulty, subject)
+                q_data['stream'] = stream
+                yield (subject, difficulty), q_data
+
+
+class BulkGenerateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config.from_object(TestingConfig)
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint_path = os.path.join(self.directory, 'checkpoint.json')
+        self.stub = OpenAIStubServer().start()
+        self.generator = AIQuestionGenerator(api_key='test-key', base_url=self.stub.base_url, max_concurrency=4,
+                                             hedge_percentile=0)
+        self.generator.get_reference_content = lambda pdf_path, topic, batches: ['Reference text'] * batches
+
+    def tearDown(self):
+        """Clean up after tests"""
+        self.stub.stop()
+        shutil.rmtree(self.directory)
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_fills_matrix(self):
+        """Test every cell gets its count of new questions, saved with its topic"""
+        result = bulk_generate(self.generator, MATRIX, Checkpoint(self.checkpoint_path))
+
+        self.assertEqual(result, {'saved': 29, 'duplicates': 0, 'unfinished': []})
+        self.assertEqual(Question.query.filter_by(stream='NEET', subject='Physics', difficulty='Hard').count(), 12)
+        self.assertEqual(Question.query.filter_by(stream='JEE', chapter='Calculus').count(), 5)
+        self.assertEqual(len(self.stub.requests), 5)  # Two batches per NEET cell, one for Calculus
+
+        with open(self.checkpoint_path) as f:
+            cells = json.load(f)['cells']
+        self.assertEqual(cells['NEET|Physics|Easy|'], {'requested': 12, 'saved': 12, 'duplicates': 0})
+
+    def test_resumes_from_checkpoint(self):
+        """Test a rerun asks only for what the checkpoint says is missing"""
+        checkpoint = Checkpoint(self.checkpoint_path)
+        checkpoint.cell(('NEET', 'Physics', 'Easy', ''))['saved'] = 12
+        checkpoint.cell(('NEET', 'Physics', 'Hard', ''))['saved'] = 7
+        checkpoint.save()
+
+        result = bulk_generate(self.generator, MATRIX, Checkpoint(self.checkpoint_path))
+        self.assertEqual(result['saved'], 10)
+        self.assertEqual(len(self.stub.requests), 2)
+
+        bulk_generate(self.generator, MATRIX, Checkpoint(self.checkpoint_path))
+        self.assertEqual(len(self.stub.requests), 2)  # Nothing left to do
+
+    def test_duplicates_do_not_count(self):
+        """Test duplicates are dropped and a run that only finds duplicates stops"""
+        matrix = {('NEET', 'Biology', 'Easy', ''): 5}
+        result = bulk_generate(RepeatingGenerator(), matrix, Checkpoint(self.checkpoint_path))
+
+        self.assertEqual(result['saved'], 1)
+        self.assertEqual(result['unfinished'], [('NEET', 'Biology', 'Easy', '')])
+        self.assertEqual(Question.query.count(), 1)
+
+    def test_matrix(self):
+        """Test the default matrix covers each stream's subjects, and JSON matrices load"""
+        matrix = build_matrix(count=50)
+        self.assertEqual(len(matrix), 18)
+        self.assertEqual(matrix[('JEE', 'Mathematics', 'Hard', '')], 50)
+        self.assertNotIn(('JEE', 'Biology', 'Hard', ''), matrix)
+
+        path = os.path.join(self.directory, 'matrix.json')
+        with open(path, 'w') as f:
+            json.dump([{'stream': 'NEET', 'subject': 'Biology', 'difficulty': 'Easy', 'count': 40},
+                       {'stream': 'NEET', 'subject': 'Biology', 'difficulty': 'Easy', 'topic': 'Genetics', 'count': 5}], f)
+        self.assertEqual(load_matrix(path), {('NEET', 'Biology', 'Easy', ''): 40,
+                                             ('NEET', 'Biology', 'Easy', 'Genetics'): 5})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the computerized adaptive testing engine
+"""
+
+import unittest
+from app import app
+from models import db, User, Question
+from models import TestAttempt as Attempt
+from config import TestingConfig
+from cat_engine import CATSession, estimate_ability, level_for_ability, nearest_difficulty, selection_target
+from test_question_pool import make_question
+
+
+class CATEngineTestCase(unittest.TestCase):
+
+    def test_ability_moves_with_answers(self):
+        """Test correct answers raise the estimate and wrong answers lower it"""
+        prior, prior_se = estimate_ability([])
+        self.assertAlmostEqual(prior, 0.0, places=3)
+
+        high, high_se = estimate_ability([(0.0, True), (1.0, True), (1.0, True)])
+        low, _ = estimate_ability([(0.0, False), (-1.0, False), (-1.0, False)])
+        self.assertGreater(high, prior)
+        self.assertLess(low, prior)
+        self.assertLess(high_se, prior_se)
+
+    def test_nearest_difficulty(self):
+        """Test the bisected difficulty level matches the ability"""
+        self.assertEqual(nearest_difficulty(-3.0), 'Easy')
+        self.assertEqual(nearest_difficulty(0.2), 'Medium')
+        self.assertEqual(nearest_difficulty(0.7), 'Hard')
+        self.assertEqual(nearest_difficulty(5.0), 'Hard')
+
+    def test_selection_follows_ability(self):
+        """Test item targets sit between the estimate and the nearest cut, not on it"""
+        self.assertEqual(nearest_difficulty(selection_target(0.0)), 'Medium')
+        self.assertEqual(nearest_difficulty(selection_target(-2.5)), 'Easy')
+        self.assertEqual(nearest_difficulty(selection_target(2.5)), 'Hard')
+        self.assertAlmostEqual(selection_target(0.57), 0.57)
+
+    def test_stopping_rule(self):
+        """Test sessions respect the minimum and maximum length"""
+        cat = CATSession('NEET', ['Physics'], min_questions=4, max_questions=6)
+        cat.responses = [[i, 'Physics', 'Hard', True] for i in range(3)]
+        self.assertFalse(cat.is_finished())
+        cat.responses = [[i, 'Physics', 'Hard', i % 2 == 0] for i in range(6)]
+        self.assertTrue(cat.is_finished())
+
+    def test_levels(self):
+        """Test ability cut points"""
+        self.assertEqual(level_for_ability(-1.0), 'Beginner')
+        self.assertEqual(level_for_ability(1.0), 'Intermediate')
+        self.assertEqual(level_for_ability(2.0), 'Advanced')
+
+
+class CATRouteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a user and a small bank"""
+        app.config.from_object(TestingConfig)
+        self.client = app.test_client()
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        user = User(name='Test User', email='cat@example.com', password='hashed_password',
+                    class_level='PUC2', stream='NEET')
+        db.session.add(user)
+        for subject in ['Physics', 'Chemistry', 'Biology']:
+            for difficulty in ['Easy', 'Medium', 'Hard']:
+                for i in range(5):
+                    db.session.add(make_question(subject, difficulty, text=f'{subject} {difficulty} {i}'))
+        db.session.commit()
+        self.user_id = user.id
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(self.user_id)
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_low_ability_gets_easier_items(self):
+        """Test a session answering wrong is served Easy and Medium items, not Hard ones"""
+        cat = CATSession('NEET', ['Physics', 'Chemistry', 'Biology'])
+        served = []
+        for _ in range(8):
+            question = db.session.get(Question, cat.next_question_id())
+            served.append(question.difficulty)
+            cat.record_answer(question, 'B')
+
+        self.assertTrue(all(difficulty in ('Easy', 'Medium') for difficulty in served))
+
+    def test_full_session(self):
+        """Test answering every question until the session records an attempt"""
+        response = self.client.get('/cat_test', follow_redirects=True)
+        for _ in range(app.config['CAT_MAX_QUESTIONS'] + 1):
+            if b'Next Question' not in response.data:
+                break
+            with self.client.session_transaction() as sess:
+                question_id = sess['cat_session']['current']
+            response = self.client.post('/cat_test/question', data={f'question_{question_id}': 'A'})
+
+        self.assertEqual(response.status_code, 200)
+        attempt = Attempt.query.filter_by(user_id=self.user_id, test_type='level_check').one()
+        self.assertGreaterEqual(attempt.total_questions, app.config['CAT_MIN_QUESTIONS'])
+        self.assertLessEqual(attempt.total_questions, app.config['CAT_MAX_QUESTIONS'])
+        self.assertEqual(len(set(attempt.get_questions_attempted())), attempt.total_questions)
+        self.assertEqual(db.session.get(User, self.user_id).level, 'Advanced')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Tests for single-flight AI generation within and across processes
+"""
+
+import threading
+import time
+import unittest
+from collections import defaultdict
+from datetime import datetime, timedelta
+from app import app
+from models import db, GenerationLease
+from config import TestingConfig
+from ai_engine import AdaptiveTestEngine
+from generation_flights import generation_flights
+from openai_stub import OpenAIStubServer
+from question_bank import save_generated_questions
+from test_ai_concurrency import make_generator
+from test_question_bank import generated
+
+
+class CountingGenerate:
+    """generate callback that saves unique questions and counts its calls"""
+
+    def __init__(self, stream='NEET', delay=0.0):
+        self.stream = stream
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, buckets):
+        self.calls.append(list(buckets))
+        time.sleep(self.delay)
+        questions_data = []
+        for subject, difficulty, count in buckets:
+            for i in range(count):
+                q_data = generated(f'Call {len(self.calls)} {subject} {difficulty} question {i}', difficulty, subject)
+                q_data['stream'] = self.stream
+                questions_data.append(q_data)
+        results = defaultdict(list)
+        for question in save_generated_questions(questions_data):
+            results[(question.subject, question.difficulty)].append(question)
+        return results
+
+
+class GenerationFlightsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config.from_object(TestingConfig)
+        app.config.update(SINGLE_FLIGHT_POLL_INTERVAL=0.01)
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        app.config.from_object(TestingConfig)
+
+    def other_process_lease(self, finished_at=None, expires_in=10, question_ids=None):
+        lease = GenerationLease(key='NEET|Physics|Easy', flight='other-flight', holder='other-host-1',
+                                expires_at=datetime.utcnow() + timedelta(seconds=expires_in),
+                                finished_at=finished_at, question_ids=question_ids)
+        db.session.add(lease)
+        db.session.commit()
+
+    def test_threads_share_one_flight(self):
+        """Test concurrent identical requests in one process make one call and get its questions"""
+        generate = CountingGenerate(delay=0.3)
+        results = []
+
+        def request():
+            with app.app_context():
+                buckets = generation_flights.run('NEET', [('Physics', 'Easy', 5)], generate, timeout=5)
+                results.append(sorted(question.id for question in buckets[('Physics', 'Easy')]))
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(generate.calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len(results[0]), 5)
+        self.assertTrue(all(ids == results[0] for ids in results))
+
+    def test_waits_for_other_process(self):
+        """Test a bucket leased by another process waits for the questions it publishes"""
+        other = CountingGenerate()
+        question_ids = [question.id for question in other([('Physics', 'Easy', 3)])[('Physics', 'Easy')]]
+        self.other_process_lease()
+
+        def publish():
+            time.sleep(0.2)
+            with app.app_context():
+                lease = db.session.get(GenerationLease, 'NEET|Physics|Easy')
+                lease.finished_at = datetime.utcnow()
+                lease.question_ids = str(question_ids)
+                db.session.commit()
+
+        publisher = threading.Thread(target=publish)
+        publisher.start()
+        generate = CountingGenerate()
+        buckets = generation_flights.run('NEET', [('Physics', 'Easy', 3), ('Physics', 'Hard', 2)], generate, timeout=5)
+        publisher.join()
+
+        self.assertEqual(generate.calls, [[('Physics', 'Hard', 2)]])
+        self.assertEqual([question.id for question in buckets[('Physics', 'Easy')]], question_ids)
+        self.assertEqual(len(buckets[('Physics', 'Hard')]), 2)
+
+    def test_gives_up_at_timeout(self):
+        """Test a caller waiting on a stalled process returns nothing for its bucket on time"""
+        self.other_process_lease()
+        generate = CountingGenerate()
+        start = time.monotonic()
+        buckets = generation_flights.run('NEET', [('Physics', 'Easy', 3)], generate, timeout=0.3)
+
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(buckets, {})
+        self.assertEqual(generate.calls, [])
+
+    def test_takes_over_expired_and_old_leases(self):
+        """Test a dead holder's lease, or one finished long ago, is taken over and generated afresh"""
+        self.other_process_lease(expires_in=-1)
+        generate = CountingGenerate()
+        generation_flights.run('NEET', [('Physics', 'Easy', 2)], generate, timeout=5)
+        self.assertEqual(len(generate.calls), 1)
+
+        lease = db.session.get(GenerationLease, 'NEET|Physics|Easy', populate_existing=True)
+        self.assertIsNotNone(lease.finished_at)
+        self.assertEqual(len(lease.get_question_ids()), 2)
+
+        # Within the grace period a late arrival shares the finished flight
+        generation_flights.run('NEET', [('Physics', 'Easy', 2)], generate, timeout=5)
+        self.assertEqual(len(generate.calls), 1)
+
+        lease.finished_at = datetime.utcnow() - timedelta(minutes=5)
+        db.session.commit()
+        generation_flights.run('NEET', [('Physics', 'Easy', 2)], generate, timeout=5)
+        self.assertEqual(len(generate.calls), 2)
+
+    def test_engine_coalesces_api_calls(self):
+        """Test simultaneous test starts send one API call per bucket"""
+        engine = AdaptiveTestEngine()
+        counts = []
+        with OpenAIStubServer(latency=0.3) as stub:
+            engine.ai_generator = make_generator(stub, max_concurrency=8)
+
+            def start_test():
+                with app.app_context():
+                    buckets = engine._generate_ai_buckets('NEET', [('Biology', 'Medium', 10)])
+                    counts.append(len(buckets[('Biology', 'Medium')]))
+
+            threads = [threading.Thread(target=start_test) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(counts, [10] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
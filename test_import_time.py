@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Import-time budget: importing the app must not load the AI stack
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import unittest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+AI_MODULES = ['ai_question_generator', 'openai', 'httpx', 'pydantic', 'pdfplumber', 'pdfminer']
+APP_IMPORT_BUDGET = 2.0  # seconds for a cold `import app`, generous for slow CI machines
+RUNS = 3
+
+
+def run_python(code):
+    """Last line printed by code in a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def import_seconds(code):
+    """Median wall time of running code in a fresh interpreter"""
+    script = f"import time; start = time.perf_counter(); {code}; print(time.perf_counter() - start)"
+    return statistics.median(float(run_python(script)) for _ in range(RUNS))
+
+
+class ImportTimeTestCase(unittest.TestCase):
+
+    def test_app_import_skips_ai_stack(self):
+        """Test importing the app loads none of the AI modules, and first use loads them"""
+        check = f"import sys; import app; {{}}; print(sorted(m for m in {AI_MODULES!r} if m in sys.modules))"
+        self.assertEqual(run_python(check.format('pass')), '[]')
+        self.assertIn('openai', run_python(check.format('app.ai_engine.ai_generator')))
+
+    def test_import_budget(self):
+        """Test cold-start import time of the app, with and without the AI path"""
+        cold = import_seconds('import app')
+        with_ai = import_seconds('import app; app.ai_engine.ai_generator')
+        print(f"\nimport app: {cold:.3f}s; with the AI generator loaded: {with_ai:.3f}s")
+
+        self.assertLess(cold, with_ai)
+        self.assertLess(cold, APP_IMPORT_BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tests for the database-backed job queue
+"""
+
+import unittest
+from datetime import datetime, timedelta
+from app import app
+from models import db, Job, User
+from config import TestingConfig
+from job_queue import job_queue
+
+calls = []
+
+
+@job_queue.task('test_record')
+def record(value):
+    calls.append(value)
+    return {'value': value}
+
+
+@job_queue.task('test_explode', max_attempts=3)
+def explode():
+    calls.append('explode')
+    raise ValueError('boom')
+
+
+class JobQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Run jobs through workers rather than eagerly"""
+        app.config.from_object(TestingConfig)
+        app.config.update(JOB_QUEUE_EAGER=False, JOB_RETRY_BACKOFF=0)
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        calls.clear()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        app.config.from_object(TestingConfig)
+
+    def test_priority_order(self):
+        """Test higher priority jobs run first, then in enqueue order"""
+        job_queue.enqueue('test_record', {'value': 'low'})
+        job_queue.enqueue('test_record', {'value': 'high'}, priority=5)
+        job_queue.enqueue('test_record', {'value': 'later'}, delay=60)
+        job_queue.enqueue('test_record', {'value': 'low2'})
+        db.session.commit()
+
+        self.assertEqual(job_queue.run_pending(), 3)
+        self.assertEqual(calls, ['high', 'low', 'low2'])
+        done = Job.query.filter_by(status='done').order_by(Job.id).first()
+        self.assertEqual(done.get_result(), {'value': 'low'})
+        self.assertEqual(job_queue.counts(), {'done': 3, 'queued': 1})
+
+    def test_retry_then_fail(self):
+        """Test failing jobs are retried up to max_attempts"""
+        job = job_queue.enqueue('test_explode')
+        db.session.commit()
+
+        job_queue.run_pending()
+        job = db.session.get(Job, job.id)
+        self.assertEqual(calls, ['explode'] * 3)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 3)
+        self.assertIn('boom', job.last_error)
+
+    def test_retry_backoff(self):
+        """Test a failed attempt is not retried before its backoff"""
+        app.config['JOB_RETRY_BACKOFF'] = 60
+        job = job_queue.enqueue('test_explode')
+        db.session.commit()
+
+        self.assertEqual(job_queue.run_pending(), 1)
+        job = db.session.get(Job, job.id)
+        self.assertEqual(job.status, 'queued')
+        self.assertGreater(job.run_at, datetime.utcnow() + timedelta(seconds=50))
+
+    def test_visibility_timeout(self):
+        """Test an expired lease is reclaimed and the old claim cannot finish it"""
+        job_queue.enqueue('test_record', {'value': 'x'})
+        db.session.commit()
+
+        job = job_queue.claim('worker-a')
+        self.assertIsNone(job_queue.claim('worker-b'))
+
+        job.locked_until = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        reclaimed = job_queue.claim('worker-b')
+        self.assertEqual(reclaimed.id, job.id)
+        self.assertEqual(reclaimed.attempts, 2)
+
+        job_queue._finish(job.id, 1, 'worker-a', None)
+        self.assertEqual(db.session.get(Job, job.id).status, 'running')
+        job_queue.run_job(reclaimed)
+        self.assertEqual(db.session.get(Job, job.id).status, 'done')
+
+    def test_schedule_periodic(self):
+        """Test each periodic task has at most one pending job"""
+        job_queue.schedule_periodic()
+        job_queue.schedule_periodic()
+        pending = Job.query.filter_by(status='queued').all()
+        self.assertEqual(sorted(job.task for job in pending), sorted(job_queue.periodic_tasks))
+
+        job_queue.run_pending()
+        job_queue.schedule_periodic()
+        sweep = Job.query.filter_by(task='sweep_expired_reset_tokens', status='queued').one()
+        self.assertGreater(sweep.run_at, datetime.utcnow() + timedelta(minutes=59))
+
+    def test_eager_mode(self):
+        """Test eager mode runs the job before enqueue returns"""
+        app.config['JOB_QUEUE_EAGER'] = True
+        job = job_queue.enqueue('test_record', {'value': 'now'})
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.get_result(), {'value': 'now'})
+
+    def test_sweep_expired_reset_tokens(self):
+        """Test the periodic sweep clears only expired reset tokens"""
+        for email, expiry in [('old@example.com', -1), ('new@example.com', 1)]:
+            db.session.add(User(name='User', email=email, password='x', class_level='PUC1', stream='NEET',
+                                reset_token=email, reset_token_expiry=datetime.utcnow() + timedelta(hours=expiry)))
+        job = job_queue.enqueue('sweep_expired_reset_tokens')
+        db.session.commit()
+
+        job_queue.run_pending()
+        self.assertEqual(db.session.get(Job, job.id).get_result(), {'cleared': 1})
+        self.assertIsNone(User.query.filter_by(email='old@example.com').one().reset_token)
+        self.assertIsNotNone(User.query.filter_by(email='new@example.com').one().reset_token)
+
+
+if __name__ == '__main__':
+    unittest.main()
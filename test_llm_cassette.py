@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for recording and replaying LLM calls with cassettes
+"""
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from ai_question_generator import AIQuestionGenerator
+from llm_cassette import CassetteTransport, request_key
+from openai_stub import OpenAIStubServer
+
+
+def make_generator(transport, base_url='http://127.0.0.1:9/v1'):
+    generator = AIQuestionGenerator(api_key='test-key', base_url=base_url, max_concurrency=4,
+                                    hedge_percentile=0, transport=transport)
+    generator.get_reference_content = lambda pdf_path, topic, batches: [
+        f'{pdf_path} reference {i}' for i in range(batches)
+    ]
+    return generator
+
+
+def texts(buckets):
+    return {key: sorted(q['question_text'] for q in questions) for key, questions in buckets.items()}
+
+
+class LLMCassetteTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cassettes', 'generation.jsonl.gz')
+        self.buckets = [('Physics', 'Easy', 20), ('Chemistry', 'Hard', 5)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, stream_delay=0.0):
+        with OpenAIStubServer(stream_delay=stream_delay) as stub:
+            generator = make_generator(CassetteTransport(self.path, mode='record'), stub.base_url)
+            recorded = generator.generate_questions_for_buckets('NEET', self.buckets)
+        return recorded, stub
+
+    def test_record_then_replay_offline(self):
+        """Test a replay returns the recorded questions with the stub gone"""
+        recorded, stub = self.record()
+        self.assertEqual(len(stub.requests), 3)
+        with gzip.open(self.path, 'rt') as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+        transport = CassetteTransport(self.path)
+        replayed = make_generator(transport).generate_questions_for_buckets('NEET', self.buckets)
+
+        self.assertEqual(texts(replayed), texts(recorded))
+        self.assertEqual(len(replayed[('Physics', 'Easy')]), 20)
+        self.assertEqual(transport.misses, 0)
+
+    def test_replay_latency(self):
+        """Test replays keep the recorded timing unless a synthetic latency is given"""
+        self.record(stream_delay=0.05)  # Six question blocks, 0.05 s apart, per call
+
+        start = time.monotonic()
+        make_generator(CassetteTransport(self.path)).generate_questions_for_buckets('NEET', self.buckets)
+        recorded_timing = time.monotonic() - start
+
+        start = time.monotonic()
+        make_generator(CassetteTransport(self.path, latency=0)).generate_questions_for_buckets('NEET', self.buckets)
+        instant = time.monotonic() - start
+
+        self.assertGreater(recorded_timing, 0.5)
+        self.assertLess(instant, recorded_timing / 2)
+
+    def test_miss(self):
+        """Test a request missing from the cassette fails fast instead of reaching the network"""
+        self.record()
+        transport = CassetteTransport(self.path)
+        questions = make_generator(transport).generate_questions_with_ai('Biology', 'NEET', 'Easy', num_questions=5)
+
+        self.assertEqual(questions, [])
+        self.assertEqual(transport.misses, 1)
+
+    def test_request_key_normalization(self):
+        """Test keys ignore message whitespace and key order but not parameters"""
+        body = {'model': 'm', 'temperature': 0.8, 'messages': [{'role': 'user', 'content': 'Generate  5\nquestions'}]}
+        same = {'messages': [{'role': 'user', 'content': ' Generate 5 questions '}], 'temperature': 0.8, 'model': 'm'}
+        other = dict(body, temperature=0.2)
+
+        self.assertEqual(request_key(json.dumps(body).encode()), request_key(json.dumps(same).encode()))
+        self.assertNotEqual(request_key(json.dumps(body).encode()), request_key(json.dumps(other).encode()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for the metrics registry and the /metrics endpoint
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from app import app
+from config import TestingConfig
+from metrics import MetricsRegistry
+
+
+class MetricsRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_render(self):
+        """Test counters and cumulative histogram buckets in the text format"""
+        registry = MetricsRegistry(self.directory)
+        calls = registry.counter('calls_total', 'Calls made', ('subject',))
+        latency = registry.histogram('latency_seconds', 'Latency', ('subject',), buckets=(1, 5))
+        calls.inc(subject='Physics')
+        calls.inc(2, subject='Physics')
+        latency.observe(0.5, subject='Physics')
+        latency.observe(3, subject='Physics')
+        latency.observe(9, subject='Physics')
+
+        text = registry.render()
+        self.assertIn('# TYPE calls_total counter', text)
+        self.assertIn('calls_total{subject="Physics"} 3', text)
+        self.assertIn('latency_seconds_bucket{subject="Physics",le="1"} 1', text)
+        self.assertIn('latency_seconds_bucket{subject="Physics",le="5"} 2', text)
+        self.assertIn('latency_seconds_bucket{subject="Physics",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_sum{subject="Physics"} 12.5', text)
+        self.assertIn('latency_seconds_count{subject="Physics"} 3', text)
+
+    def test_collect_merges_snapshots(self):
+        """Test snapshots written by other processes are added to this one's metrics"""
+        worker = MetricsRegistry(self.directory)
+        worker.counter('calls_total', 'Calls made', ('subject',)).inc(4, subject='Biology')
+        worker.histogram('latency_seconds', 'Latency', ('subject',), buckets=(1, 5)).observe(2, subject='Biology')
+        worker.write_snapshot()
+
+        web = MetricsRegistry(self.directory)
+        calls = web.counter('calls_total', 'Calls made', ('subject',))
+        latency = web.histogram('latency_seconds', 'Latency', ('subject',), buckets=(1, 5))
+        calls.inc(subject='Biology')
+        # Snapshot files are per pid; the worker's stands in for another, running process
+        os.replace(os.path.join(self.directory, f'{os.getpid()}.json'),
+                   os.path.join(self.directory, f'{os.getppid()}.json'))
+
+        collected = web.collect()
+        self.assertEqual(collected.counter('calls_total', '', ('subject',)).value(subject='Biology'), 5)
+        self.assertEqual(collected.histogram('latency_seconds', '', ('subject',)).count(subject='Biology'), 1)
+        self.assertEqual(calls.value(subject='Biology'), 1)  # The live registry is untouched
+        self.assertEqual(latency.count(subject='Biology'), 0)
+
+    def test_dead_workers_pruned(self):
+        """Test a stopped worker removes its snapshot and one that died is pruned on collect"""
+        worker = MetricsRegistry(self.directory)
+        worker.counter('calls_total', 'Calls made').inc(3)
+        worker.write_snapshot()
+        worker.remove_snapshot()
+        self.assertEqual(os.listdir(self.directory), [])
+
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        worker.write_snapshot()
+        os.replace(os.path.join(self.directory, f'{os.getpid()}.json'),
+                   os.path.join(self.directory, f'{dead.pid}.json'))
+
+        web = MetricsRegistry(self.directory)
+        self.assertEqual(web.counter('calls_total', 'Calls made').value(), 0)
+        self.assertEqual(web.collect().counter('calls_total', '').value(), 0)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class MetricsEndpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config.from_object(TestingConfig)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        app.config.from_object(TestingConfig)
+
+    def test_metrics_endpoint(self):
+        """Test /metrics serves the generation metrics, behind the token when one is set"""
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE ai_generation_seconds histogram', response.data)
+        self.assertIn('ai_generation_calls_total', self.client.get('/metrics?format=json').get_json())
+
+        app.config['METRICS_TOKEN'] = 'secret'
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        authorized = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(authorized.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
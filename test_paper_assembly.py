@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests for single round trip paper assembly
+"""
+
+import unittest
+from collections import Counter
+from app import app
+from models import db, Question
+from config import TestingConfig
+from paper_assembly import assemble_paper, assemble_paper_windowed, build_blueprint, split_by_difficulty
+from test_question_pool import make_question
+
+
+class PaperAssemblyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up 10 questions per (subject, difficulty) bucket"""
+        app.config.from_object(TestingConfig)
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        for subject in ['Physics', 'Chemistry', 'Biology']:
+            for difficulty in ['Easy', 'Medium', 'Hard']:
+                for i in range(10):
+                    db.session.add(make_question(subject, difficulty, text=f'{subject} {difficulty} {i}'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_split_by_difficulty(self):
+        """Test the last difficulty absorbs rounding"""
+        self.assertEqual(split_by_difficulty(45), [('Easy', 11), ('Medium', 20), ('Hard', 14)])
+        self.assertEqual(sum(n for _, n in split_by_difficulty(30)), 30)
+
+    def test_assemble_paper_fills_blueprint(self):
+        """Test every bucket gets its quota with no duplicates"""
+        blueprint = build_blueprint({'Physics': 9, 'Chemistry': 9, 'Biology': 18})
+        questions = assemble_paper('NEET', blueprint)
+        self.assertEqual(len(questions), 36)
+        self.assertEqual(len({q.id for q in questions}), 36)
+        self.assertEqual(Counter(q.subject for q in questions)['Biology'], 18)
+
+    def test_assemble_paper_windowed(self):
+        """Test the windowed statement returns exact bucket quotas"""
+        blueprint = [('Physics', 'Easy', 3), ('Physics', 'Hard', 4), ('Biology', 'Medium', 5)]
+        questions = assemble_paper_windowed('NEET', blueprint)
+        counts = Counter((q.subject, q.difficulty) for q in questions)
+        self.assertEqual(counts, {('Physics', 'Easy'): 3, ('Physics', 'Hard'): 4, ('Biology', 'Medium'): 5})
+
+    def test_engine_full_paper_uses_bank(self):
+        """Test the engine assembles a subject test from the bank"""
+        from ai_engine import AdaptiveTestEngine
+        engine = AdaptiveTestEngine()
+        engine.ai_generator = None
+        questions = engine.generate_subject_test('NEET', 'physics', num_questions=20)
+        self.assertEqual(len(questions), 20)
+        self.assertTrue(all(q.subject == 'Physics' for q in questions))
+
+    def test_engine_backfills_already_used_ai_questions(self):
+        """Test AI questions already used in the paper are replaced from the bank"""
+        from ai_engine import AdaptiveTestEngine
+        easy = Question.query.filter_by(subject='Physics', difficulty='Easy').order_by(Question.id).all()
+        engine = AdaptiveTestEngine()
+        engine._generate_ai_buckets = lambda stream, blueprint: {('Physics', 'Easy'): easy[:3]}
+        questions = engine._assemble_blueprint('NEET', [('Physics', 'Easy', 3)], exclude={easy[0].id})
+
+        self.assertEqual(len(questions), 3)
+        self.assertNotIn(easy[0].id, {q.id for q in questions})
+        self.assertTrue(all((q.subject, q.difficulty) == ('Physics', 'Easy') for q in questions))
+
+
+if __name__ == '__main__':
+    unittest.main()
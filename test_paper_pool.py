@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tests for the pre-generated paper pool
+"""
+
+import itertools
+import time
+import unittest
+from types import SimpleNamespace
+from flask import Flask
+from app import app
+from config import TestingConfig
+from models import db, Question
+from paper_pool import PaperPool
+
+
+class PaperPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Build numbered fake papers so pops can be told apart"""
+        self.counter = itertools.count(1)
+        self.builds = []
+        self.app = Flask(__name__)
+        self.app.config.update(PAPER_POOL_LOW_WATER=2, PAPER_POOL_TARGET=3, PAPER_POOL_REFILL_INTERVAL=0.05)
+        self.pool = PaperPool(self.build_paper, self.app, load_paper=self.load_paper)
+
+    def build_paper(self, stream, test_type, level):
+        self.builds.append((stream, test_type, level))
+        return [SimpleNamespace(id=f'{stream}-{test_type}-{level}-{next(self.counter)}')]
+
+    def load_paper(self, question_ids):
+        return [SimpleNamespace(id=question_id) for question_id in question_ids]
+
+    def paper_ids(self, paper):
+        return [question.id for question in paper]
+
+    def test_disabled_builds_inline(self):
+        """Test a disabled pool builds every paper on demand"""
+        self.app.config['PAPER_POOL_ENABLED'] = False
+        self.assertEqual(self.paper_ids(self.pool.pop('NEET', 'full_paper')), ['NEET-full_paper-None-1'])
+        self.assertEqual(self.pool.size('NEET', 'full_paper'), 0)
+
+    def test_refill_then_pop(self):
+        """Test pops are served from papers built by the refiller"""
+        self.pool._ensure_started = lambda: None
+        first = self.pool.pop('JEE', 'adaptive', 'Beginner')  # Cold miss registers the key
+        self.assertEqual(self.paper_ids(first), ['JEE-adaptive-Beginner-1'])
+
+        self.pool.refill()
+        self.assertEqual(self.pool.size('JEE', 'adaptive', 'Beginner'), 3)
+
+        builds_before = len(self.builds)
+        self.assertEqual(self.paper_ids(self.pool.pop('JEE', 'adaptive', 'Beginner')), ['JEE-adaptive-Beginner-2'])
+        self.assertEqual(len(self.builds), builds_before)
+
+    def test_background_refill(self):
+        """Test dropping below the low-water mark wakes the refill thread"""
+        self.pool.pop('NEET', 'full_paper')
+        deadline = time.monotonic() + 5
+        while self.pool.size('NEET', 'full_paper') < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.pool.size('NEET', 'full_paper'), 3)
+
+
+class PaperPoolDatabaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config.from_object(TestingConfig)
+        app.config['PAPER_POOL_ENABLED'] = True
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        db.session.add_all([Question(question_text=f'Pooled question {i}', option_a='1', option_b='2',
+                                     option_c='3', option_d='4', correct_answer='A', subject='Physics',
+                                     chapter='Mechanics', topic='Kinematics', difficulty='Easy',
+                                     stream='JEE') for i in range(3)])
+        db.session.commit()
+        self.pool = PaperPool(self.build_paper, app)
+        self.pool._ensure_started = lambda: None
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        app.config.from_object(TestingConfig)
+
+    def build_paper(self, stream, test_type, level):
+        return Question.query.filter_by(stream=stream).order_by(Question.id).all()
+
+    def test_pop_after_commit_in_new_context(self):
+        """Test a paper built by the refiller loads in the popping request's session"""
+        self.pool.pop('JEE', 'full_paper')  # Registers the key
+        with app.app_context():
+            self.pool.refill()
+            db.session.commit()
+
+        with app.app_context():
+            paper = self.pool.pop('JEE', 'full_paper')
+            self.assertEqual([q.question_text for q in paper],
+                             ['Pooled question 0', 'Pooled question 1', 'Pooled question 2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
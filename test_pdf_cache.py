@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for the two-tier PDF text cache
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pdf_cache import PDFTextCache
+
+
+class PDFTextCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Use a throwaway cache directory and fake PDF files"""
+        self.tmp = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tmp, 'cache')
+        self.extractions = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def make_pdf(self, name, content):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def extractor(self, text):
+        def extract():
+            self.extractions.append(text)
+            return text
+        return extract
+
+    def test_memory_then_disk(self):
+        """Test text is extracted once and survives a new process's cache"""
+        path = self.make_pdf('physics.pdf', b'%PDF physics')
+        cache = PDFTextCache(self.directory)
+        self.assertEqual(cache.get_or_extract(path, self.extractor('Physics text'), max_pages=50), 'Physics text')
+        self.assertEqual(cache.get_or_extract(path, self.extractor('unused'), max_pages=50), 'Physics text')
+        self.assertEqual(cache.stats, {'memory': 1, 'disk': 0, 'miss': 1})
+
+        restarted = PDFTextCache(self.directory)
+        self.assertEqual(restarted.get_or_extract(path, self.extractor('unused'), max_pages=50), 'Physics text')
+        self.assertEqual(restarted.stats['disk'], 1)
+        self.assertEqual(self.extractions, ['Physics text'])
+
+    def test_key_includes_content_and_parameters(self):
+        """Test a changed PDF or different parameters miss the cache"""
+        path = self.make_pdf('chemistry.pdf', b'%PDF v1')
+        cache = PDFTextCache(self.directory)
+        cache.get_or_extract(path, self.extractor('first 50'), max_pages=50)
+        self.assertEqual(cache.get_or_extract(path, self.extractor('first 10'), max_pages=10), 'first 10')
+
+        self.make_pdf('chemistry.pdf', b'%PDF version 2')
+        self.assertEqual(cache.get_or_extract(path, self.extractor('new edition'), max_pages=50), 'new edition')
+        self.assertEqual(len(self.extractions), 3)
+
+    def test_memory_is_bounded(self):
+        """Test the LRU evicts by bytes while disk keeps every entry"""
+        cache = PDFTextCache(self.directory, max_memory_bytes=5000)
+        paths = [self.make_pdf(f'bank{i}.pdf', f'%PDF {i}'.encode()) for i in range(6)]
+        for i, path in enumerate(paths):
+            cache.get_or_extract(path, self.extractor(str(i) * 2000))
+
+        self.assertLessEqual(cache.memory_bytes, 5000)
+        self.assertEqual(cache.get_or_extract(paths[0], self.extractor('unused')), '0' * 2000)
+        self.assertEqual(cache.stats['disk'], 1)
+        self.assertEqual(len(self.extractions), 6)
+
+    def test_page_windows(self):
+        """Test page windows come back numbered, with empty pages kept in place"""
+        path = self.make_pdf('biology.pdf', b'%PDF biology')
+        cache = PDFTextCache(self.directory)
+        pages = [(5, 'Cells'), (6, ''), (7, 'Tissues\fOrgans')]
+        self.assertEqual(cache.get_or_extract_pages(path, lambda: iter(pages), start_page=5, max_pages=3),
+                         [(5, 'Cells'), (6, ''), (7, 'Tissues\nOrgans')])
+
+        restarted = PDFTextCache(self.directory)
+        self.assertEqual(restarted.get_or_extract_pages(path, lambda: [], start_page=5, max_pages=3)[2],
+                         (7, 'Tissues\nOrgans'))
+        self.assertEqual(restarted.stats['disk'], 1)
+
+    def test_missing_pdf(self):
+        """Test a missing file raises instead of caching an empty entry"""
+        cache = PDFTextCache(self.directory)
+        with self.assertRaises(FileNotFoundError):
+            cache.get_or_extract(os.path.join(self.tmp, 'missing.pdf'), self.extractor('x'))
+
+
+if __name__ == '__main__':
+    unittest.main()
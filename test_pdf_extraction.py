@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for parallel, streaming PDF page extraction
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from bench_pdf_extraction import write_sample_pdf
+from pdf_extraction import extract_text, iter_page_texts, page_count
+
+
+class PDFExtractionTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        """Write one 40-page sample PDF for all tests"""
+        cls.tmp = tempfile.mkdtemp()
+        cls.pdf_path = write_sample_pdf(os.path.join(cls.tmp, 'bank.pdf'), pages=40, lines_per_page=5)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp)
+
+    def test_pages_in_order(self):
+        """Test parallel extraction yields the same pages, in order, as one process"""
+        serial = list(iter_page_texts(self.pdf_path, workers=1))
+        parallel = list(iter_page_texts(self.pdf_path, workers=2, chunk_pages=3))
+
+        self.assertEqual(page_count(self.pdf_path), 40)
+        self.assertEqual([number for number, _ in parallel], list(range(40)))
+        self.assertEqual(parallel, serial)
+        self.assertTrue(parallel[0][1].startswith('Q1.1 '))
+
+    def test_page_window(self):
+        """Test windows past the first pages and past the end of the document"""
+        window = list(iter_page_texts(self.pdf_path, start_page=30, max_pages=5, workers=2, chunk_pages=2))
+        self.assertEqual([number for number, _ in window], [30, 31, 32, 33, 34])
+        self.assertTrue(window[0][1].startswith('Q31.1 '))
+
+        self.assertEqual(len(list(iter_page_texts(self.pdf_path, start_page=35, max_pages=50))), 5)
+        self.assertEqual(list(iter_page_texts(self.pdf_path, start_page=45)), [])
+
+    def test_extract_text(self):
+        """Test the joined text matches the streamed pages"""
+        text = extract_text(self.pdf_path, max_pages=3, workers=1)
+        self.assertEqual(text.count('\n\n'), 2)
+        self.assertIn('Q3.5 ', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for the BM25 chunk index over question-bank PDFs
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from bench_pdf_extraction import write_sample_pdf
+from pdf_cache import PDFTextCache
+from pdf_index import ChunkIndex, ChunkIndexStore, split_chunks
+
+
+class ChunkIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_split_chunks(self):
+        """Test paragraphs are packed into bounded chunks within each page"""
+        pages = [(0, 'alpha ' * 20 + '\n\n' + 'beta ' * 20 + '\n\n' + 'gamma ' * 200), (1, 'one line\nanother line')]
+        chunks = split_chunks(pages, chunk_chars=300)
+
+        self.assertEqual([page for page, _ in chunks], [0, 0, 1])
+        self.assertIn('alpha', chunks[0][1])
+        self.assertIn('beta', chunks[0][1])
+        self.assertTrue(chunks[1][1].startswith('gamma'))
+        self.assertEqual(chunks[2][1], 'one line\nanother line')
+
+    def test_search_ranks_topic_chunks(self):
+        """Test chunks about the topic rank above unrelated ones"""
+        chunks = [
+            (0, 'Newton laws of motion and friction on an inclined plane'),
+            (1, 'Photosynthesis converts light energy in the chloroplast'),
+            (2, 'Mitosis and meiosis: cell division and chromosome behaviour'),
+            (3, 'Light reactions of photosynthesis happen in thylakoid membranes; photosynthesis needs chlorophyll'),
+        ]
+        index = ChunkIndex(chunks)
+        ranked = [chunk_id for _, chunk_id in index.search('Photosynthesis', k=5)]
+
+        self.assertEqual(ranked, [3, 1])
+        self.assertEqual(index.search('thermodynamics'), [])
+
+    def test_reference_texts(self):
+        """Test each batch gets different, bounded reference material"""
+        chunks = [(i, f'enzyme kinetics section {i} ' + 'filler ' * 60) for i in range(6)]
+        chunks += [(i, f'unrelated optics section {i} ' + 'filler ' * 60) for i in range(6, 20)]
+        index = ChunkIndex(chunks)
+
+        texts = index.reference_texts('enzyme kinetics', 3, max_chars=1000)
+        self.assertEqual(len(texts), 3)
+        self.assertEqual(len(set(texts)), 3)
+        for text in texts:
+            self.assertLessEqual(len(text), 1000)
+            self.assertTrue(text.startswith('enzyme kinetics'))
+
+        # No topic: random chunks, still one per batch
+        texts = index.reference_texts(None, 4, max_chars=500, rng=random.Random(1))
+        self.assertEqual(len(texts), 4)
+        self.assertEqual(ChunkIndex([]).reference_texts('enzyme', 2, 500), [])
+
+    def test_store_builds_once(self):
+        """Test an index is built from the PDF once and reloaded from disk"""
+        pdf_path = write_sample_pdf(os.path.join(self.tmp, 'bank.pdf'), pages=6, lines_per_page=30)
+        directory = os.path.join(self.tmp, 'index')
+        text_cache = PDFTextCache(os.path.join(self.tmp, 'text'))
+        index = ChunkIndexStore(directory, text_cache).get(pdf_path, workers=1)
+
+        self.assertGreater(len(index), 6)
+        self.assertEqual(index.chunks[0][0], 0)
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+        restarted = ChunkIndexStore(directory, text_cache).get(pdf_path, workers=1)
+        self.assertEqual(restarted.chunks, index.chunks)
+        self.assertEqual(restarted.search('genome'), index.search('genome'))
+
+        # A rebuild elsewhere reads the pages from the text cache, not the PDF
+        rebuilt = ChunkIndexStore(os.path.join(self.tmp, 'rebuilt'), text_cache).get(pdf_path, workers=1)
+        self.assertEqual(rebuilt.chunks, index.chunks)
+        self.assertEqual(text_cache.stats['miss'], 1)
+
+    def test_cold_build_does_not_block_other_pdfs(self):
+        """Test one PDF's index build leaves lookups of other PDFs free"""
+        release = threading.Event()
+
+        class SlowTextCache:
+            def cache_key(self, path, **params):
+                return os.path.basename(path)
+
+            def get_or_extract_pages(self, path, extract_pages, **params):
+                if path == 'slow.pdf':
+                    release.wait(5)
+                return [(0, f'{path} page text about optics')]
+
+        store = ChunkIndexStore(os.path.join(self.tmp, 'index'), SlowTextCache())
+        slow = threading.Thread(target=store.get, args=('slow.pdf',))
+        slow.start()
+        try:
+            time.sleep(0.05)  # The slow build now holds its key's lock
+            start = time.monotonic()
+            index = store.get('fast.pdf')
+            self.assertLess(time.monotonic() - start, 1)
+            self.assertEqual(len(index), 1)
+        finally:
+            release.set()
+            slow.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
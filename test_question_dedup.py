@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for MinHash/LSH near-duplicate question detection
+"""
+
+import unittest
+from question_dedup import NearDuplicateIndex, find_duplicates, minhash, question_fingerprint, similarity
+
+
+def question(text, options=('Newton', 'Joule', 'Watt', 'Pascal'), stream='NEET', subject='Physics'):
+    q_data = {'stream': stream, 'subject': subject, 'question_text': text}
+    q_data.update({f'option_{letter}': option for letter, option in zip('abcd', options)})
+    return q_data
+
+
+LENS = ('A convex lens of focal length 20 cm forms a real image at a distance of 60 cm from the lens. '
+        'What is the object distance?')
+
+
+class QuestionDedupTestCase(unittest.TestCase):
+
+    def test_signature_estimates_jaccard(self):
+        """Test signatures agree in proportion to feature overlap"""
+        features = {f'feature {i}' for i in range(200)}
+        half = {f'feature {i}' for i in range(100, 300)}
+        self.assertEqual(similarity(minhash(features), minhash(set(features))), 1.0)
+        self.assertAlmostEqual(similarity(minhash(features), minhash(half)), 1 / 3, delta=0.2)
+        self.assertIsNone(minhash(set()))
+
+    def test_finds_near_duplicates(self):
+        """Test rewordings, case changes and reordered options are caught"""
+        index = NearDuplicateIndex()
+        index.add(1, question(LENS))
+        index.add(2, question('Which of the following best describes the focal length of a thin convex lens?'))
+
+        self.assertEqual(index.find(question(LENS.upper().replace('?', ' ?')))[0], 1)
+        self.assertEqual(index.find(question(LENS, options=('Pascal', 'Watt', 'Joule', 'Newton')))[0], 1)
+        reworded = 'Which of the following best describes the focal length of thin convex lenses?'
+        self.assertEqual(index.find(question(reworded))[0], 2)
+
+    def test_keeps_distinct_questions(self):
+        """Test different questions, numeric variants and other subjects are not duplicates"""
+        index = NearDuplicateIndex()
+        index.add(1, question(LENS))
+
+        self.assertIsNone(index.find(question(LENS.replace('20 cm', '15 cm'))))
+        self.assertIsNone(index.find(question(LENS, subject='Chemistry')))
+        self.assertIsNone(index.find(question(LENS, stream='JEE')))
+        self.assertIsNone(index.find(question('Which gas do plants absorb in photosynthesis?')))
+
+    def test_remove(self):
+        """Test removed questions are no longer matched"""
+        index = NearDuplicateIndex()
+        index.add('a', question(LENS))
+        index.remove('a')
+        self.assertIsNone(index.find(question(LENS)))
+        self.assertEqual(len(index), 0)
+
+    def test_find_duplicates_keeps_first(self):
+        """Test compaction maps later copies to the first of each group"""
+        items = [(1, question(LENS)), (2, question('What is the SI unit of power?')),
+                 (3, question(LENS + ' ')), (4, question('what is the SI unit of power')), (5, question('Define work.'))]
+        self.assertEqual(find_duplicates(items), {3: 1, 4: 2})
+
+    def test_fingerprint_scope(self):
+        """Test the numbers of the text are part of the scope, in order"""
+        scope, signature = question_fingerprint(question('Mass 2 kg, speed 3 m/s'))
+        self.assertEqual(scope, ('NEET', 'physics', ('2', '3')))
+        self.assertEqual(len(signature), 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
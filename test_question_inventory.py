@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Tests for the prewarmed AI question inventory
+"""
+
+import itertools
+import unittest
+from app import app, ai_engine
+from models import db, InventoryItem, Job, Question
+from config import TestingConfig
+from job_queue import job_queue
+from question_inventory import question_inventory
+from test_question_bank import generated
+
+
+class FakeGenerator:
+    """Returns unique question dicts and records every fan-out"""
+
+    deadline = 5
+
+    def __init__(self):
+        self.calls = []
+        self.counter = itertools.count(1)
+
+    def generate_questions_for_buckets(self, stream, buckets, topic=None):
+        self.calls.append((stream, list(buckets), topic))
+        results = {}
+        for subject, difficulty, count in buckets:
+            questions = []
+            for _ in range(count):
+                q_data = generated(f'{stream} {subject} question {next(self.counter)}', difficulty, subject)
+                q_data['stream'] = stream
+                questions.append(q_data)
+            results[(subject, difficulty)] = questions
+        return results
+
+    def iter_questions_for_buckets(self, stream, buckets, topic=None, deadline=None):
+        for key, questions in self.generate_questions_for_buckets(stream, buckets, topic).items():
+            for q_data in questions:
+                yield key, q_data
+
+
+class QuestionInventoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        app.config.from_object(TestingConfig)
+        app.config.update(QUESTION_INVENTORY_ENABLED=True, QUESTION_INVENTORY_LOW_WATER=3,
+                          QUESTION_INVENTORY_TARGET=5, JOB_QUEUE_EAGER=False)
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+        self.generator = FakeGenerator()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+        app.config.from_object(TestingConfig)
+
+    def test_refill_to_target(self):
+        """Test every default bucket is filled to the target, once"""
+        result = question_inventory.refill(self.generator)
+
+        self.assertEqual(result, {'generated': 90, 'buckets': 18})
+        self.assertEqual(len(self.generator.calls), 2)  # One fan-out per stream
+        counts = question_inventory.counts()
+        self.assertEqual(counts[('JEE', 'Mathematics', 'Hard', '')], 5)
+        self.assertEqual(set(counts.values()), {5})
+
+        self.assertEqual(question_inventory.refill(self.generator), {'generated': 0, 'buckets': 0})
+
+    def test_take_serves_each_question_once(self):
+        """Test claimed questions leave the inventory and are not served again"""
+        question_inventory.refill(self.generator)
+        first = question_inventory.take('NEET', [('Physics', 'Easy', 2), ('Biology', 'Hard', 1)])
+        second = question_inventory.take('NEET', [('Physics', 'Easy', 10)])
+
+        self.assertEqual([len(first[('Physics', 'Easy')]), len(first[('Biology', 'Hard')])], [2, 1])
+        self.assertEqual(len(second[('Physics', 'Easy')]), 3)
+        served = {q.id for q in first[('Physics', 'Easy')] + second[('Physics', 'Easy')]}
+        self.assertEqual(len(served), 5)
+        self.assertEqual(question_inventory.counts().get(('NEET', 'Physics', 'Easy', '')), None)
+
+    def test_low_bucket_requests_one_refill(self):
+        """Test draining buckets queues a single refill job for them"""
+        question_inventory.refill(self.generator)
+        question_inventory.take('NEET', [('Physics', 'Easy', 3)])
+        question_inventory.take('JEE', [('Chemistry', 'Medium', 4)], topic=None)
+        question_inventory.take('NEET', [('Biology', 'Easy', 2)], topic='Genetics')
+
+        jobs = Job.query.filter_by(task='refill_question_inventory').all()
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(jobs[0].get_payload()['buckets'], [
+            ['NEET', 'Physics', 'Easy', ''],
+            ['JEE', 'Chemistry', 'Medium', ''],
+            ['NEET', 'Biology', 'Easy', 'Genetics'],
+        ])
+
+        # The job tops up the requested topic bucket along with the drained ones
+        ai_engine.ai_generator, original = self.generator, ai_engine.ai_generator
+        try:
+            self.assertEqual(job_queue.run_pending(), 1)
+        finally:
+            ai_engine.ai_generator = original
+        counts = question_inventory.counts()
+        self.assertEqual(counts[('NEET', 'Physics', 'Easy', '')], 5)
+        self.assertEqual(counts[('NEET', 'Biology', 'Easy', 'Genetics')], 5)
+        genetics = InventoryItem.query.filter_by(topic='Genetics').first()
+        self.assertEqual(db.session.get(Question, genetics.question_id).chapter, 'Genetics')
+
+    def test_stock_skips_near_duplicates(self):
+        """Test rewordings of served or stocked questions are not stocked again"""
+        served = generated('Which of the following best describes the focal length of a thin convex lens?')
+        kept = generated('Which option best explains how a concave mirror forms a virtual image?')
+        self.assertEqual(question_inventory._stock('NEET', '', [served, kept]), 2)
+        question_inventory.take('NEET', [('Physics', 'Easy', 1)])
+
+        rewordings = [generated(q_data['question_text'].rstrip('?') + ' ?') for q_data in (served, kept)]
+        fresh = generated('What is the power of a lens of focal length two metres?')
+        self.assertEqual(question_inventory._stock('NEET', '', rewordings + [fresh]), 1)
+        self.assertEqual(question_inventory.counts()[('NEET', 'Physics', 'Easy', '')], 2)
+
+    def test_engine_serves_from_inventory(self):
+        """Test tests are built from inventory and the bank without calling the AI"""
+        question_inventory.refill(self.generator)
+        calls_before = len(self.generator.calls)
+        ai_engine.ai_generator, original = self.generator, ai_engine.ai_generator
+        try:
+            questions = ai_engine._assemble_blueprint('JEE', [('Physics', 'Easy', 4), ('Mathematics', 'Hard', 2)])
+        finally:
+            ai_engine.ai_generator = original
+
+        self.assertEqual(len(self.generator.calls), calls_before)
+        self.assertEqual(len(questions), 6)
+        self.assertEqual(question_inventory.counts()[('JEE', 'Physics', 'Easy', '')], 1)
+
+    def test_engine_generates_inventory_misses(self):
+        """Test buckets the inventory cannot cover are generated for the shortfall only"""
+        question_inventory.refill(self.generator)
+        ai_engine.ai_generator, original = self.generator, ai_engine.ai_generator
+        try:
+            questions = ai_engine._assemble_blueprint('JEE', [('Physics', 'Easy', 8)])
+        finally:
+            ai_engine.ai_generator = original
+
+        self.assertEqual(self.generator.calls[-1], ('JEE', [('Physics', 'Easy', 3)], None))
+        self.assertEqual(len(questions), 8)
+        self.assertEqual(question_inventory.counts().get(('JEE', 'Physics', 'Easy', ''), 0), 0)
+
+        app.config['QUESTION_INVENTORY_GENERATE_MISSES'] = False
+        calls = len(self.generator.calls)
+        ai_engine.ai_generator = self.generator
+        try:
+            ai_engine._assemble_blueprint('JEE', [('Physics', 'Easy', 8)])
+        finally:
+            ai_engine.ai_generator = original
+        self.assertEqual(len(self.generator.calls), calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Tests for the text and structured-output question parsers
+"""
+
+import json
+import random
+import unittest
+from openai_stub import fake_questions, fake_questions_json
+from question_parser import JSONQuestionParser, TextQuestionParser, answer_letter, parse_response
+
+DRIFTED_RESPONSE = """Sure! Here are the questions.
+
+**Question 1:** What is the SI unit of force?
+(A) Newton
+(B) Joule
+(c) Watt
+(D) Pascal
+**Answer:** (A)
+**Explanation:** Force is measured in newtons.
+It equals one kg m/s^2.
+TOPIC: Units
+CHAPTER: Units and Measurement
+
+Question 2: Which quantity is a vector?
+A. Speed
+B. Velocity
+C. Mass
+D. Time
+Correct Answer: Velocity
+
+3) Which gas do plants absorb in photosynthesis?
+a) Oxygen
+b) Carbon dioxide
+c) Nitrogen
+d) Helium
+EXPLANATION: The correct answer is B because plants fix CO2.
+---
+QUESTION 4:
+What is 2 + 2?
+A) 3
+B) 4
+C) 5
+"""
+
+
+def parse_in_pieces(parser, text, rng):
+    cuts = sorted(rng.sample(range(1, len(text)), min(40, len(text) - 1)))
+    questions = []
+    for start, end in zip([0] + cuts, cuts + [len(text)]):
+        questions.extend(parser.feed(text[start:end]))
+    return questions + parser.close()
+
+
+class QuestionParserTestCase(unittest.TestCase):
+
+    def test_well_formed(self):
+        """Test the prompted format parses completely"""
+        questions = parse_response(fake_questions(5), 'Physics', 'NEET', 'Easy')
+        self.assertEqual(len(questions), 5)
+        self.assertEqual(questions[2]['question_text'], 'Stub question 3: which option is correct?')
+        self.assertEqual(questions[2]['chapter'], 'Stub Chapter')
+        self.assertEqual(questions[2]['option_d'], 'Option four')
+
+    def test_salvages_drifted_blocks(self):
+        """Test blocks that drift from the format are kept, incomplete ones dropped"""
+        parser = TextQuestionParser('Physics', 'NEET', 'Medium')
+        questions = parser.feed(DRIFTED_RESPONSE) + parser.close()
+
+        self.assertEqual([q['correct_answer'] for q in questions], ['A', 'B', 'B'])
+        self.assertEqual(questions[0]['question_text'], 'What is the SI unit of force?')
+        self.assertEqual(questions[0]['option_c'], 'Watt')
+        self.assertEqual(questions[0]['explanation'], 'Force is measured in newtons. It equals one kg m/s^2.')
+        self.assertEqual(questions[0]['chapter'], 'Units and Measurement')
+        self.assertEqual(questions[2]['option_b'], 'Carbon dioxide')
+        self.assertEqual(parser.blocks, 5)  # Preamble, three questions, truncated question 4
+
+    def test_numbered_statements(self):
+        """Test numbered lines inside a question's text stay in it"""
+        response = (
+            "Question 1: Consider the following statements:\n"
+            "1. Mitochondria produce ATP.\n"
+            "2. Ribosomes synthesise lipids.\n"
+            "Which of the above is correct?\n"
+            "A) 1 only\nB) 2 only\nC) Both 1 and 2\nD) Neither 1 nor 2\n"
+            "Answer: A\n"
+            "2. Which organelle holds chlorophyll?\n"
+            "A) Nucleus\nB) Chloroplast\nC) Vacuole\nD) Golgi body\n"
+            "Answer: B\n"
+        )
+        questions = parse_response(response, 'Biology', 'NEET', 'Medium')
+
+        self.assertEqual(len(questions), 2)
+        self.assertEqual(questions[0]['question_text'],
+                         'Consider the following statements: 1. Mitochondria produce ATP. '
+                         '2. Ribosomes synthesise lipids. Which of the above is correct?')
+        self.assertEqual(questions[0]['correct_answer'], 'A')
+        self.assertEqual(questions[1]['question_text'], 'Which organelle holds chlorophyll?')
+
+    def test_answer_letter(self):
+        """Test answer values are mapped to option letters"""
+        options = {'A': 'Newton', 'B': 'Joule', 'C': 'Watt', 'D': 'Pascal'}
+        self.assertEqual(answer_letter('Option C', options), 'C')
+        self.assertEqual(answer_letter('(b)', options), 'B')
+        self.assertEqual(answer_letter('joule', options), 'B')
+        self.assertEqual(answer_letter('D) Pascal', options), 'D')
+        self.assertIsNone(answer_letter('none of these', options))
+
+    def test_json_validation(self):
+        """Test structured items are validated one by one"""
+        response = json.dumps({'questions': [
+            {'question': 'Valid', 'options': {'A': 'w', 'B': 'x', 'C': 'y', 'D': 'z'}, 'answer': 'd'},
+            {'question': 'Three options', 'options': ['w', 'x', 'y'], 'answer': 'A'},
+            {'question': 'List options', 'options': ['A) w', 'B) x', 'C) y', 'D) z'], 'answer': 'x'},
+            'not an object',
+            {'question': 'No answer', 'options': {'A': 'w', 'B': 'x', 'C': 'y', 'D': 'z'}},
+        ]})
+        questions = parse_response(response, 'Chemistry', 'JEE', 'Hard', mode='json')
+
+        self.assertEqual([q['question_text'] for q in questions], ['Valid', 'List options'])
+        self.assertEqual([q['correct_answer'] for q in questions], ['D', 'B'])
+        self.assertEqual(questions[1]['option_a'], 'w')
+
+    def test_any_split(self):
+        """Test both parsers give the same questions for text fed in any pieces"""
+        rng = random.Random(0)
+        for mode, text in [('text', DRIFTED_RESPONSE), ('text', fake_questions(6)), ('json', fake_questions_json(6))]:
+            whole = parse_response(text, 'Biology', 'NEET', 'Easy', mode=mode)
+            parser_class = TextQuestionParser if mode == 'text' else JSONQuestionParser
+            for _ in range(10):
+                self.assertEqual(parse_in_pieces(parser_class('Biology', 'NEET', 'Easy'), text, rng), whole)
+
+    def test_json_streams_objects(self):
+        """Test a question object is returned as soon as it closes, and truncation keeps earlier ones"""
+        text = fake_questions_json(3)
+        parser = JSONQuestionParser('Physics', 'NEET', 'Easy')
+        first_end = text.index('\n  },') + 4  # After the first question object
+        self.assertEqual(len(parser.feed(text[:first_end])), 1)
+        self.assertEqual(len(parser.feed(text[first_end:-60])), 1)
+        self.assertEqual(parser.close(), [])
+
+    def test_difficulty_labels(self):
+        """Test a multi-difficulty response routes questions by label and drops unlabelled ones"""
+        levels = ['Easy', 'Hard', 'Medium', 'Hard']
+        for mode, text in [('text', fake_questions(4, difficulties=levels)),
+                           ('json', fake_questions_json(4, difficulties=levels))]:
+            text = text.replace('DIFFICULTY: Medium', 'DIFFICULTY: **medium**').replace('"Medium"', '"Expert"')
+            questions = parse_response(text, 'Physics', 'NEET', None, mode=mode, difficulties=('Easy', 'Medium', 'Hard'))
+            expected = ['Easy', 'Hard', 'Medium', 'Hard'] if mode == 'text' else ['Easy', 'Hard', 'Hard']
+            self.assertEqual([q['difficulty'] for q in questions], expected)
+
+        # Single-difficulty parsers keep their difficulty whatever the label says
+        questions = parse_response(fake_questions(2, difficulties=['Hard', 'Hard']), 'Physics', 'NEET', 'Easy')
+        self.assertEqual([q['difficulty'] for q in questions], ['Easy', 'Easy'])
+        self.assertEqual(questions[0]['explanation'], 'Option one is correct.')
+
+
+if __name__ == '__main__':
+    unittest.main()
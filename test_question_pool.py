@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory question pool index
+"""
+
+import unittest
+from app import app
+from models import db, Question
+from config import TestingConfig
+from functools import partial
+from question_pool import question_pool, load_questions, load_sampled, _draw
+
+
+def make_question(subject='Physics', difficulty='Easy', stream='NEET', text='Test question'):
+    return Question(
+        subject=subject,
+        chapter='Mechanics',
+        topic='Motion',
+        difficulty=difficulty,
+        question_text=text,
+        option_a='A',
+        option_b='B',
+        option_c='C',
+        option_d='D',
+        correct_answer='A',
+        stream=stream
+    )
+
+
+class QuestionPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a small bank of questions"""
+        app.config.from_object(TestingConfig)
+        self.app_context = app.app_context()
+        self.app_context.push()
+        db.create_all()
+
+        for i in range(20):
+            db.session.add(make_question(difficulty='Easy', text=f'Easy {i}'))
+        for i in range(5):
+            db.session.add(make_question(difficulty='Medium', text=f'Medium {i}'))
+        db.session.commit()
+
+    def tearDown(self):
+        """Clean up after tests"""
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def test_counts(self):
+        """Test bucket counts come from the index"""
+        self.assertEqual(question_pool.count('NEET', 'Physics', 'Easy'), 20)
+        self.assertEqual(question_pool.count('NEET', 'Physics', 'Medium'), 5)
+        self.assertEqual(question_pool.count('NEET', 'Physics'), 25)
+        self.assertEqual(question_pool.count('JEE', 'Physics', 'Easy'), 0)
+
+    def test_sample_without_replacement(self):
+        """Test sampled ids are unique and respect exclusions"""
+        excluded = set(question_pool.bucket_ids('NEET', 'Physics', 'Easy')[:5])
+        ids = question_pool.sample('NEET', 'Physics', 'Easy', 10, exclude=excluded)
+        self.assertEqual(len(ids), 10)
+        self.assertEqual(len(set(ids)), 10)
+        self.assertFalse(excluded & set(ids))
+
+    def test_neighbor_fallback(self):
+        """Test short buckets are topped up from neighboring difficulties"""
+        ids = question_pool.sample('NEET', 'Physics', 'Medium', 8)
+        questions = load_questions(ids)
+        self.assertEqual(len(questions), 8)
+        self.assertEqual(sum(1 for q in questions if q.difficulty == 'Medium'), 5)
+
+        hard = load_questions(question_pool.sample('NEET', 'Physics', 'Hard', 3))
+        self.assertEqual(len(hard), 3)
+        self.assertTrue(all(q.difficulty == 'Medium' for q in hard))
+
+    def test_insert_patches_index(self):
+        """Test committed inserts are visible and rolled back inserts are not"""
+        question_pool.count('NEET', 'Physics', 'Hard')
+
+        db.session.add(make_question(difficulty='Hard'))
+        db.session.commit()
+        self.assertEqual(question_pool.count('NEET', 'Physics', 'Hard'), 1)
+
+        db.session.add(make_question(difficulty='Hard'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(question_pool.count('NEET', 'Physics', 'Hard'), 1)
+
+    def test_delete_patches_index(self):
+        """Test committed deletes leave the index and rolled back deletes stay sampleable"""
+        question = Question.query.filter_by(difficulty='Medium').first()
+        db.session.delete(question)
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(question_pool.count('NEET', 'Physics', 'Medium'), 5)
+        self.assertIn(question.id, question_pool.bucket_ids('NEET', 'Physics', 'Medium'))
+
+        db.session.delete(question)
+        db.session.commit()
+        self.assertEqual(question_pool.count('NEET', 'Physics', 'Medium'), 4)
+
+    def test_bulk_delete_patches_index(self):
+        """Test many deletes in one commit leave every bucket they touch"""
+        deleted = Question.query.filter(Question.question_text.in_(['Easy 1', 'Easy 7', 'Medium 2'])).all()
+        kept = {q.id for q in Question.query.all()} - {q.id for q in deleted}
+        for question in deleted:
+            db.session.delete(question)
+        db.session.commit()
+
+        self.assertEqual(question_pool.count('NEET', 'Physics', 'Easy'), 18)
+        self.assertEqual(question_pool.count('NEET', 'Physics', 'Medium'), 4)
+        remaining = set(question_pool.bucket_ids('NEET', 'Physics', 'Easy'))
+        remaining |= set(question_pool.bucket_ids('NEET', 'Physics', 'Medium'))
+        self.assertEqual(remaining, kept)
+
+    def test_load_sampled_replaces_stale_ids(self):
+        """Test ids deleted behind the index's back are dropped and drawn again"""
+        question_pool.count('NEET', 'Physics', 'Easy')
+        stale = question_pool.bucket_ids('NEET', 'Physics', 'Easy')[:2]
+        # Another process deleting rows: no ORM events reach this index
+        db.session.execute(Question.__table__.delete().where(Question.id.in_(stale)))
+        db.session.commit()
+
+        questions = load_sampled([(partial(question_pool.sample, 'NEET', 'Physics', 'Easy'), 20)])
+        self.assertEqual(len({q.id for q in questions}), 20)
+        self.assertFalse(set(stale) & {q.id for q in questions})
+        self.assertEqual(question_pool.count('NEET', 'Physics', 'Easy'), 18)
+
+    def test_load_questions_preserves_order(self):
+        """Test questions come back in the order of the sampled ids"""
+        ids = question_pool.sample('NEET', 'Physics', 'Easy', 6)
+        self.assertEqual([q.id for q in load_questions(ids)], ids)
+
+    def test_chapter_catalog(self):
+        """Test chapter counts are grouped by subject and difficulty"""
+        question = make_question(difficulty='Hard')
+        question.chapter = 'Optics'
+        db.session.add(question)
+        db.session.commit()
+
+        catalog = question_pool.chapter_catalog('NEET')
+        self.assertEqual(catalog['Physics']['Mechanics'], {'Easy': 20, 'Medium': 5})
+        self.assertEqual(catalog['Physics']['Optics'], {'Hard': 1})
+        self.assertEqual(question_pool.chapter_catalog('JEE'), {})
+
+    def test_sample_chapter(self):
+        """Test chapter samples span every difficulty and stay in the chapter"""
+        question = make_question(difficulty='Hard')
+        question.chapter = 'Optics'
+        db.session.add(question)
+        db.session.commit()
+
+        ids = question_pool.sample_chapter('NEET', 'Physics', 'Mechanics', 25)
+        self.assertEqual(len(set(ids)), 25)
+        self.assertTrue(all(q.chapter == 'Mechanics' for q in load_questions(ids)))
+
+        medium = load_questions(question_pool.sample_chapter('NEET', 'Physics', 'Mechanics', 10, difficulty='Medium'))
+        self.assertEqual(len(medium), 5)
+        self.assertTrue(all(q.difficulty == 'Medium' for q in medium))
+        self.assertEqual(question_pool.sample_chapter('NEET', 'Physics', 'Optics', 5), [question.id])
+
+    def test_draw_large_bucket(self):
+        """Test sparse draws from a large bucket"""
+        ids = list(range(10000))
+        picked = _draw(ids, 50, {1, 2, 3})
+        self.assertEqual(len(set(picked)), 50)
+        self.assertFalse({1, 2, 3} & set(picked))
+
+
+if __name__ == '__main__':
+    unittest.main()
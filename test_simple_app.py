@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests for question sampling in the simplified SQLite app
+"""
+
+import os
+import tempfile
+import unittest
+from array import array
+from unittest.mock import patch
+import simple_app
+from permutation import FeistelPermutation
+
+
+class SimpleAppSamplingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        """Point the app at a fresh database file"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_database = simple_app.DATABASE
+        simple_app.DATABASE = os.path.join(self.tmp_dir.name, 'test.db')
+        simple_app._stream_question_ids.clear()
+        simple_app.init_db()
+        self.conn = simple_app.get_db()
+
+    def tearDown(self):
+        """Restore the original database path"""
+        self.conn.close()
+        simple_app.DATABASE = self.original_database
+        simple_app._stream_question_ids.clear()
+        self.tmp_dir.cleanup()
+
+    def add_questions(self, count, stream='NEET'):
+        self.conn.executemany('''
+            INSERT INTO questions
+            (subject, chapter, topic, difficulty, question_text, option_a, option_b, option_c, option_d, correct_answer, explanation, stream)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [('Physics', 'Mechanics', 'Motion', 'Easy', f'Extra question {i}', 'A', 'B', 'C', 'D', 'A', '', stream)
+              for i in range(count)])
+        self.conn.commit()
+
+    def test_init_db_does_not_duplicate(self):
+        """Test re-running init_db keeps one copy of each question, even in older databases"""
+        count = self.conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0]
+        # A database from before the unique index, with a duplicated sample question
+        self.conn.execute('DROP INDEX idx_questions_unique')
+        self.conn.execute('INSERT INTO questions (subject, chapter, topic, difficulty, question_text, option_a, option_b, '
+                          'option_c, option_d, correct_answer, explanation, stream) '
+                          'SELECT subject, chapter, topic, difficulty, question_text, option_a, option_b, '
+                          'option_c, option_d, correct_answer, explanation, stream FROM questions LIMIT 1')
+        self.conn.commit()
+
+        simple_app.init_db()
+        simple_app.init_db()
+        self.assertEqual(self.conn.execute('SELECT COUNT(*) FROM questions').fetchone()[0], count)
+
+    def test_sample_only_from_stream(self):
+        """Test a user's questions belong to the requested stream"""
+        ids = simple_app.next_question_ids_for_user(self.conn, 1, 'JEE', 5)
+        questions = simple_app.fetch_questions(self.conn, ids)
+        self.assertEqual([q['id'] for q in questions], ids)
+        self.assertTrue(all(q['stream'] == 'JEE' for q in questions))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_new_rows_picked_up(self):
+        """Test the cached id array picks up new rows"""
+        before = len(simple_app.get_stream_question_ids(self.conn, 'NEET'))
+        self.add_questions(500)
+        ids = simple_app.get_stream_question_ids(self.conn, 'NEET')
+        self.assertEqual(len(ids), before + 500)
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_deleted_rows_dropped(self):
+        """Test the cached id array is reloaded once rows are deleted"""
+        self.add_questions(50)
+        ids = list(simple_app.get_stream_question_ids(self.conn, 'NEET'))
+        self.conn.execute('DELETE FROM questions WHERE id IN (?, ?)', (ids[0], ids[1]))
+        self.conn.commit()
+        self.assertEqual(list(simple_app.get_stream_question_ids(self.conn, 'NEET')), ids[2:])
+
+    def test_deleted_ids_topped_up(self):
+        """Test a test whose ids are deleted while it is drawn still gets its full count"""
+        self.add_questions(50)
+        stale = array('q', simple_app.get_stream_question_ids(self.conn, 'NEET'))
+        self.conn.execute('DELETE FROM questions WHERE id IN ({})'.format(','.join('?' * 10)), list(stale[:10]))
+        self.conn.commit()
+
+        # Deleted by another process after this one's cache was checked
+        with patch.object(simple_app, 'get_stream_question_ids', return_value=stale):
+            questions = simple_app.next_questions_for_user(self.conn, 1, 'NEET', 30)
+        self.assertEqual(len(questions), 30)
+        self.assertEqual(len({q['id'] for q in questions}), 30)
+
+    def test_user_cursor_never_repeats_until_exhausted(self):
+        """Test consecutive tests walk the whole pool before repeating"""
+        self.add_questions(95)
+        pool_size = len(simple_app.get_stream_question_ids(self.conn, 'NEET'))
+
+        seen = []
+        while len(seen) + 20 <= pool_size:
+            seen.extend(simple_app.next_question_ids_for_user(self.conn, 1, 'NEET', 20))
+        self.assertEqual(len(seen), len(set(seen)))
+
+        # The next test finishes the old walk and starts a new one without internal repeats
+        next_test = simple_app.next_question_ids_for_user(self.conn, 1, 'NEET', 20)
+        self.assertEqual(len(set(next_test)), 20)
+        self.assertEqual(len(set(seen) | set(next_test)), pool_size)
+
+        cursors = self.conn.execute('SELECT COUNT(*) FROM question_cursors').fetchone()[0]
+        self.assertEqual(cursors, 1)
+
+
+class FeistelPermutationTestCase(unittest.TestCase):
+
+    def test_is_permutation(self):
+        """Test every size maps range(size) onto itself"""
+        for size in [1, 2, 3, 10, 257, 1000]:
+            permutation = FeistelPermutation(size, key=42)
+            self.assertEqual(sorted(permutation[i] for i in range(size)), list(range(size)))
+
+    def test_key_changes_order(self):
+        """Test different keys give different orders"""
+        first = [FeistelPermutation(50, key=1)[i] for i in range(50)]
+        second = [FeistelPermutation(50, key=2)[i] for i in range(50)]
+        self.assertNotEqual(first, second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Background job worker pool
+Starts N worker processes that claim jobs from the job table (job_queue.py).
+A supervisor thread in the parent restarts workers that die and enqueues
+periodic jobs. Run standalone with `python worker.py --workers 4`; run.py also
+starts a pool next to the web server.
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from job_queue import job_queue
+from metrics import registry
+from models import db
+
+SCHEDULE_INTERVAL = 5  # seconds between supervisor passes
+
+
+def work(stop_event):
+    """Worker process main loop: claim, run, repeat until stopped"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # The supervisor handles Ctrl-C
+    from app import app  # Registers the tasks
+
+    worker_name = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"Worker {worker_name} started")
+    with app.app_context():
+        poll_interval = app.config['JOB_POLL_INTERVAL']
+        while not stop_event.is_set():
+            try:
+                job = job_queue.claim(worker_name)
+                if job is None:
+                    stop_event.wait(poll_interval)
+                    continue
+                print(f"Worker {worker_name} running job {job.id} ({job.task})")
+                job_queue.run_job(job)
+                registry.write_snapshot()  # Picked up by /metrics in the web process
+            except Exception as e:
+                print(f"Worker {worker_name} error: {e}")
+                traceback.print_exc()
+                db.session.rollback()
+                stop_event.wait(poll_interval)
+            finally:
+                db.session.remove()
+    registry.remove_snapshot()
+    print(f"Worker {worker_name} stopped")
+
+
+class WorkerPool:
+    """Fixed-size pool of worker processes plus a supervisor thread"""
+
+    def __init__(self, app, workers=None):
+        self.app = app
+        self.workers = workers or app.config['JOB_WORKERS']
+        # Spawned children import a fresh app instead of inheriting open connections
+        self._context = multiprocessing.get_context('spawn')
+        self._stop = self._context.Event()
+        self._processes = []
+        self._supervisor = None
+
+    def start(self):
+        self._processes = [self._start_process() for _ in range(self.workers)]
+        self._supervisor = threading.Thread(target=self._supervise, name='job-supervisor', daemon=True)
+        self._supervisor.start()
+        print(f"Started {self.workers} job workers")
+
+    def stop(self, timeout=10):
+        """Ask workers to finish their current job, then terminate stragglers"""
+        self._stop.set()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+
+    def _start_process(self):
+        process = self._context.Process(target=work, args=(self._stop,), name='job-worker', daemon=True)
+        process.start()
+        return process
+
+    def _supervise(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    job_queue.schedule_periodic()
+            except Exception as e:
+                print(f"Job scheduler error: {e}")
+                traceback.print_exc()
+
+            for i, process in enumerate(self._processes):
+                if not process.is_alive() and not self._stop.is_set():
+                    print(f"Job worker {process.pid} exited with {process.exitcode}, restarting")
+                    self._processes[i] = self._start_process()
+
+            self._stop.wait(SCHEDULE_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run background job workers')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    args = parser.parse_args()
+
+    from app import app
+    with app.app_context():
+        db.create_all()
+
+    pool = WorkerPool(app, args.workers)
+    pool.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping job workers...")
+        pool.stop()
+
+
+if __name__ == '__main__':
+    main()